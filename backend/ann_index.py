@@ -0,0 +1,125 @@
+"""
+Приближённый поиск ближайших соседей (ANN) для этапа отбора кандидатов по описанию.
+
+Точный поиск (cosine_similarity со всей tfidf_matrix) линеен по размеру каталога.
+IVFIndex делает его приближённым:
+- TF-IDF сжимается через TruncatedSVD до dim измерений и нормируется
+- сжатые векторы делятся на n_lists кластеров (MiniBatchKMeans) — «инвертированные списки»
+- на запросе ищутся n_probe ближайших к пользователю кластеров, и только их фильмы
+  пересчитываются точным косинусом по исходной tfidf_matrix
+
+Ручки: n_probe (больше — выше полнота, медленнее), n_lists, dim.
+Индекс только отбирает кандидатов; точный пересчёт и откат на полный перебор
+(если кандидатов меньше k или каталог маленький) — в recommend_v3.retrieve_by_description.
+Полноту относительно точного поиска считает recall_at_k (и запуск python ann_index.py).
+"""
+
+import math
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+
+class IVFIndex:
+    """Кластерный (IVF) индекс поверх сжатого TF-IDF."""
+
+    MIN_ROWS = 1000   # на каталоге меньше этого точный поиск и так быстрый
+
+    def __init__(self, matrix: csr_matrix, n_lists: int | None = None, n_probe: int = 8,
+                 dim: int = 128, seed: int = 0):
+        n_rows, n_terms = matrix.shape
+        self.n_probe = n_probe
+        self.n_lists = n_lists or max(1, int(math.sqrt(n_rows)))
+        self.svd = TruncatedSVD(n_components=max(1, min(dim, n_terms - 1, n_rows - 1)), random_state=seed)
+        reduced = self._normalized(self.svd.fit_transform(matrix))
+        kmeans = MiniBatchKMeans(n_clusters=min(self.n_lists, n_rows), random_state=seed, n_init=3)
+        kmeans.fit(reduced)
+        self.centroids = self._normalized(kmeans.cluster_centers_)
+        self.n_lists = len(self.centroids)
+        self._set_assignment(self._assign(reduced))
+
+    @staticmethod
+    def _normalized(vectors: np.ndarray) -> np.ndarray:
+        return normalize(vectors).astype(np.float32)
+
+    def _assign(self, reduced: np.ndarray) -> np.ndarray:
+        """Номер ближайшего кластера для каждой строки."""
+        return np.argmax(reduced @ self.centroids.T, axis=1).astype(np.int32)
+
+    def _set_assignment(self, assignment: np.ndarray):
+        """Инвертированные списки: строки, отсортированные по кластеру, и смещения начала каждого кластера."""
+        self.assignment = assignment
+        self.list_rows = np.argsort(assignment, kind="stable").astype(np.int64)
+        self.list_offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=self.n_lists), out=self.list_offsets[1:])
+
+    def extended(self, new_rows: csr_matrix) -> "IVFIndex":
+        """Новый индекс, в котором строки new_rows дописаны в конец (кластеры не переобучаются)."""
+        new = IVFIndex.__new__(IVFIndex)
+        new.n_probe, new.n_lists, new.svd, new.centroids = self.n_probe, self.n_lists, self.svd, self.centroids
+        tail = new._assign(self._normalized(self.svd.transform(new_rows)))
+        new._set_assignment(np.concatenate([self.assignment, tail]))
+        return new
+
+    def candidates(self, user_vec: csr_matrix, n_probe: int | None = None) -> np.ndarray:
+        """Строки из n_probe ближайших к пользователю кластеров (по возрастанию номера)."""
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        query = self._normalized(self.svd.transform(user_vec))[0]
+        scores = self.centroids @ query
+        probe = np.argpartition(-scores, n_probe - 1)[:n_probe]
+        parts = [self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe.tolist()]
+        # по возрастанию номера — чтобы равные похожести упорядочивались как в точном поиске
+        return np.sort(np.concatenate(parts))
+
+
+def top_rows(user_vec: csr_matrix, matrix: csr_matrix, rows: np.ndarray, k: int) -> np.ndarray:
+    """Точный топ-k среди строк rows."""
+    sims = cosine_similarity(user_vec, matrix[rows]).ravel()
+    return rows[np.argsort(-sims, kind="stable")[:k]]
+
+
+def recall_at_k(index: IVFIndex, matrix: csr_matrix, user_vecs: list[csr_matrix], k: int,
+                n_probe: int | None = None) -> float:
+    """Средняя доля точного топ-k, которую находит индекс с данным n_probe."""
+    all_rows = np.arange(matrix.shape[0])
+    hits = 0
+    for user_vec in user_vecs:
+        exact = top_rows(user_vec, matrix, all_rows, k)
+        approx = top_rows(user_vec, matrix, index.candidates(user_vec, n_probe), k)
+        hits += len(np.intersect1d(exact, approx))
+    return hits / (k * len(user_vecs))
+
+
+if __name__ == "__main__":
+    # Полнота и задержка IVF относительно точного поиска на текущем каталоге
+    import recommend_v3
+
+    matrix = recommend_v3.tfidf_matrix
+    rng = np.random.default_rng(0)
+    user_vecs = [
+        recommend_v3.user_tfidf_vector(rng.choice(matrix.shape[0], size=rng.integers(1, 4), replace=False).tolist(), matrix)
+        for _ in range(100)
+    ]
+    index = IVFIndex(matrix)
+    k = recommend_v3.TOP_K
+    print(f"{matrix.shape[0]} фильмов, {index.n_lists} кластеров, k={k}")
+
+    start = time.perf_counter()
+    for user_vec in user_vecs:
+        top_rows(user_vec, matrix, np.arange(matrix.shape[0]), k)
+    print(f"точный поиск: {(time.perf_counter() - start) / len(user_vecs) * 1000:.2f} мс/запрос")
+
+    for n_probe in (1, 2, 4, 8, 16, 32):
+        if n_probe > index.n_lists:
+            break
+        start = time.perf_counter()
+        for user_vec in user_vecs:
+            top_rows(user_vec, matrix, index.candidates(user_vec, n_probe), k)
+        elapsed = (time.perf_counter() - start) / len(user_vecs) * 1000
+        recall = recall_at_k(index, matrix, user_vecs, k, n_probe)
+        print(f"n_probe={n_probe:>3}  recall@{k}={recall:.3f}  {elapsed:.2f} мс/запрос")
@@ -1,12 +1,49 @@
-from films_model import Film
-from recommend_v3 import recommend_films, films
-from fastapi import FastAPI, HTTPException
+from films_model import Film, FilmCatalog
+from film_filter import FilmFilter
+from title_search import TitleIndex, normalize_title, canonical_titles, resolve_titles
+import recommend_v3
+from recommend_v3 import recommend_films, recommend_films_batch, current_state, ModelState
+from result_cache import ResultCache, cache_key, shared_client_from_env
+from scoring_pool import ScoringPool, MicroBatcher, Overloaded, DeadlineExceeded, ModelChanged, score_titles
+import metrics
+from metrics import MetricsMiddleware, Sampled, StageTimer, STAGE_SECONDS, replay
+from fastapi import FastAPI, HTTPException, Depends, Header, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import numpy as np
+import asyncio
+import os
 import random
+from contextlib import asynccontextmanager
 from typing import List
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Movie Recommender API", version="0.1")
+# расчёт рекомендаций идёт в отдельном пуле фиксированного размера с ограниченной очередью
+scoring_pool = ScoringPool()
+
+# перезагрузка модели с диска без перезапуска: POST /admin/reload или, если задан
+# MODEL_WATCH_SECONDS, сама при изменении артефакта (CSV) — проверка раз в столько секунд
+MODEL_WATCH_SECONDS = float(os.environ.get("MODEL_WATCH_SECONDS", "0"))   # 0 — не следить
+
+def prepare_reload(new_state: ModelState):
+    # в режиме process новая модель нужна и процессам пула — поднимаем их до подмены
+    scoring_pool.restart(new_state.version)
+
+async def watch_model(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        if recommend_v3.source_changed():
+            recommend_v3.schedule_reload(prepare_reload)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    watcher = asyncio.create_task(watch_model(MODEL_WATCH_SECONDS)) if MODEL_WATCH_SECONDS > 0 else None
+    yield
+    if watcher is not None:
+        watcher.cancel()
+    scoring_pool.shutdown()
+
+app = FastAPI(title="Movie Recommender API", version="0.1", lifespan=lifespan)
 
 # разрешаем фронту стучаться к бэку (CORS)
 app.add_middleware(
@@ -16,11 +53,30 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# число запросов и время ответа по маршрутам (GET /metrics)
+app.add_middleware(MetricsMiddleware)
 
 #  Схемы данных для валидации
 class RecommendRequest(BaseModel):
     liked_titles: list[str]
     top_n: int = 10
+    # необязательные фильтры: границы включительные, countries — хотя бы одна из стран
+    year_from: int | None = None
+    year_to: int | None = None
+    rating_from: float | None = None
+    rating_to: float | None = None
+    countries: list[str] | None = None
+
+    def check(self):
+        # пустой профиль и top_n <= 0 — ошибка клиента (400), а не пустой ответ или 500
+        if not self.liked_titles:
+            raise HTTPException(status_code=400, detail="liked_titles is empty")
+        if self.top_n <= 0:
+            raise HTTPException(status_code=400, detail="top_n must be positive")
+
+    def film_filter(self) -> FilmFilter | None:
+        film_filter = FilmFilter(self.year_from, self.year_to, self.rating_from, self.rating_to, self.countries)
+        return None if film_filter.is_empty() else film_filter
 
 class FilmResponse(BaseModel):
     title: str
@@ -34,70 +90,443 @@ class FilmResponse(BaseModel):
 class RecommendResponse(BaseModel):
     recommendations: list[FilmResponse]
 
+class BatchRecommendRequest(BaseModel):
+    requests: list[RecommendRequest]
+
+class BatchRecommendLine(BaseModel):
+    index: int
+    recommendations: list[FilmResponse] | None = None
+    error: str | None = None
+
+class FilmPayload(BaseModel):
+    title: str
+    year: int | None = None
+    description: str = ""
+    director: str = ""
+    actors: list[str] = []
+    country: list[str] = []
+    rating: float | None = None
+
+    def to_film(self) -> Film:
+        return Film(
+            title=self.title.strip(),
+            year=self.year or 0,
+            country=self.country,
+            actors=self.actors,
+            rating=self.rating or 0.0,
+            director=self.director,
+            description=self.description,
+        )
+
+
+# мапа для быстрого поиска фильмов по названию (название -> номер в каталоге)
+# строится для каждой версии модели один раз, при первом запросе после её смены
+_title_index: tuple[ModelState, dict[str, int]] | None = None
+
+def title_index(state: ModelState) -> dict[str, int]:
+    global _title_index
+    cached = _title_index
+    if cached is None or cached[0] is not state:
+        cached = (state, {normalize_title(title): i for title, i in state.title_to_idx.items()})
+        _title_index = cached
+    return cached[1]
+
+# Поиск по названию (подсказки и названия с опечатками): индекс строится один раз на каталог,
+# при первом запросе, которому он нужен. Удалённые фильмы отсекаются маской alive
+TITLE_MATCH_MIN = float(os.environ.get("TITLE_MATCH_MIN", "0.6"))    # похожесть для исправления названий; 0 — только точные
+SEARCH_MIN_SCORE = float(os.environ.get("SEARCH_MIN_SCORE", "0.4"))  # похожесть для подсказок /films/search
+
+_title_search: TitleIndex | None = None
 
-def normalize_title(s: str) -> str:
-    return s.strip().lower()
+def title_search(state: ModelState) -> TitleIndex:
+    global _title_search
+    cached = _title_search
+    if cached is None or cached.films is not state.films:
+        cached = _title_search = TitleIndex(state.films)
+    return cached
 
-# мапа для быстрого поиска фильмов по названию
-title2film: dict[str, Film] = {
-    normalize_title(film.title): film
-    for film in films
-}
+def alive_rows(state: ModelState) -> np.ndarray | None:
+    return state.alive if state.has_removed else None
 
-# превращаем список названий в список объектов Film
-def select_films_by_titles(titles: list[str]) -> list[Film]:
-    not_found = [t for t in titles if normalize_title(t) not in title2film]
+# превращаем список названий в список объектов Film.
+# Название не нашлось как есть — берём единственный достаточно похожий фильм (опечатка, ё/е,
+# латиница); не нашлось и так — 404 с похожими названиями в тексте ошибки
+def select_films_by_titles(titles: list[str], state: ModelState) -> list[Film]:
+    resolve = None
+    if TITLE_MATCH_MIN > 0:
+        resolve = lambda title: title_search(state).resolve(title, TITLE_MATCH_MIN, alive_rows(state))
+    rows, not_found = resolve_titles(titles, title_index(state), resolve, state.films.titles)
     if not_found:
         raise HTTPException(
             status_code=404,
-            detail=f"Фильмы не найдены: {', '.join(not_found)}"
+            detail=f"Фильмы не найдены: {', '.join(not_found_hint(title, state) for title in not_found)}"
         )
-    return [title2film[normalize_title(title)] for title in titles]
+    return [state.films[i] for i in rows]
+
+def not_found_hint(title: str, state: ModelState) -> str:
+    similar = title_search(state).search(title, 3, SEARCH_MIN_SCORE, alive_rows(state))
+    if not similar:
+        return title
+    return f"{title} (похожие: {', '.join(state.films.titles[i] for i in similar)})"
+
+def film_response(film: Film) -> FilmResponse:
+    return FilmResponse(
+        title=film.title,
+        year=film.year,
+        description=film.description,
+        director=film.director,
+        actors=film.actors,
+        country=film.country,
+        rating=film.rating
+    )
+
+# Готовый JSON фильмов: каждый фильм каталога сериализуется один раз (на набор полей),
+# ответы собираются склейкой байт. Каталог сменился — фрагменты строятся заново по мере запросов.
+FILM_FIELDS = tuple(FilmResponse.model_fields)
+FRAGMENTS_MAX = int(os.environ.get("FRAGMENTS_MAX", "200000"))   # фильмов на набор полей; 0 — не запоминать
+
+class FilmFragments:
+    def __init__(self, films: FilmCatalog):
+        self.films = films
+        self._by_fields: dict[tuple[str, ...] | None, dict[int, bytes]] = {}
+
+    def get(self, i: int, fields: tuple[str, ...] | None = None) -> bytes:
+        cache = self._by_fields.get(fields)
+        if cache is None:
+            cache = self._by_fields.setdefault(fields, {})
+        fragment = cache.get(i)
+        if fragment is None:
+            response = film_response(self.films[i])
+            fragment = (response.model_dump_json() if fields is None
+                        else response.model_dump_json(include=set(fields))).encode("utf-8")
+            if len(cache) < FRAGMENTS_MAX:
+                cache[i] = fragment
+        return fragment
+
+    def join(self, rows: list[int], fields: tuple[str, ...] | None = None) -> bytes:
+        return b",".join([self.get(i, fields) for i in rows])
+
+_fragments: FilmFragments | None = None
+
+def film_fragments(state: ModelState) -> FilmFragments:
+    global _fragments
+    cached = _fragments
+    if cached is None or cached.films is not state.films:
+        cached = _fragments = FilmFragments(state.films)
+    return cached
+
+def rows_of(films: list[Film], state: ModelState) -> list[int]:
+    # рекомендации — всегда живые фильмы, их название однозначно задаёт строку
+    return [state.title_to_idx[film.title] for film in films]
+
+# fields=title,year,... — отдавать только эти поля фильмов (например, списки без description)
+def film_fields(fields: str | None = None) -> tuple[str, ...] | None:
+    if fields is None:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = names - set(FILM_FIELDS)
+    if unknown or not names:
+        raise HTTPException(status_code=400,
+                            detail=f"Неизвестные поля: {', '.join(sorted(unknown)) or '(пусто)'}; "
+                                   f"доступны: {', '.join(FILM_FIELDS)}")
+    selected = tuple(name for name in FILM_FIELDS if name in names)
+    return None if selected == FILM_FIELDS else selected
+
+# кэш готовых ответов: ключ — набор названий (без порядка и повторов) + top_n, версия модели
+result_cache = ResultCache(shared=shared_client_from_env())
 
 # Эндпоинты 
 @app.post("/recommend", response_model=RecommendResponse)
-def recommend(req: RecommendRequest):
+async def recommend(req: RecommendRequest, x_request_timeout: float | None = Header(default=None),
+                    fields: tuple[str, ...] | None = Depends(film_fields)):
+    # на event loop — только локальный кэш; расчёт уходит в scoring_pool.
+    # Очередь пула заполнена — сразу 503; не уложились в срок (X-Request-Timeout, секунд) — 504
+    req.check()
+    state = current_state()
+    timer = StageTimer(STAGE_SECONDS, "api")
+    film_filter = req.film_filter()
+    key = cache_key(req.liked_titles, req.top_n, fields, film_filter.key() if film_filter else "")
+    body = result_cache.get_local(state.version, key)
+    timer.mark("cache")
+    if body is None:
+        try:
+            if scoring_pool.kind == "process":
+                try:
+                    body = await recommend_in_process(req, state, key, fields, x_request_timeout)
+                except ModelChanged:
+                    # пока запрос ждал, модель перезагрузили: считаем заново по новой
+                    state = current_state()
+                    body = await recommend_in_process(req, state, key, fields, x_request_timeout)
+            elif micro_batcher.enabled:
+                body = await micro_batcher.submit((req, state, key, fields), timeout=x_request_timeout)
+            else:
+                body = await scoring_pool.run(recommend_body, req, state, key, fields, timeout=x_request_timeout)
+        except Overloaded:
+            raise HTTPException(status_code=503, detail="server is overloaded, retry later",
+                                headers={"Retry-After": "1"})
+        except DeadlineExceeded:
+            raise HTTPException(status_code=504, detail="recommendation deadline exceeded")
+        except ModelChanged:
+            raise HTTPException(status_code=503, detail="model is being reloaded, retry later",
+                                headers={"Retry-After": "1"})
+    return Response(content=body, media_type="application/json")
+
+
+def recommend_body(req: RecommendRequest, state: ModelState, key: str,
+                   fields: tuple[str, ...] | None = None) -> bytes:
+    # выполняется в потоке пула: общий кэш, расчёт и запись в кэш
+    body = result_cache.get(state.version, key)
+    if body is None:
+        body = recommend_response(req, state, fields)
+        result_cache.put(state.version, key, body)
+    return body
+
+
+def recommend_bodies(items: list[tuple[RecommendRequest, ModelState, str, tuple[str, ...] | None]]
+                     ) -> list[bytes | Exception]:
+    # пачка одновременных запросов (MicroBatcher), выполняется в потоке пула:
+    # всё, чего нет в кэше, считается одним recommend_films_batch на модель
+    results: list[bytes | Exception | None] = [None] * len(items)
+    groups: dict[int, tuple[ModelState, list[int], list[list[Film]], list[FilmFilter | None]]] = {}
+    for pos, (req, state, key, fields) in enumerate(items):
+        try:
+            body = result_cache.get(state.version, key)
+            if body is not None:
+                results[pos] = body
+            else:
+                liked_films = select_films_by_titles(canonical_titles(req.liked_titles), state)
+                group = groups.setdefault(id(state), (state, [], [], []))
+                group[1].append(pos)
+                group[2].append(liked_films)
+                group[3].append(req.film_filter())
+        except Exception as e:
+            results[pos] = e
+
+    for state, positions, profiles, film_filters in groups.values():
+        top_ns = [items[pos][0].top_n for pos in positions]
+        batch = recommend_films_batch(profiles, top_n=top_ns, state=state, film_filters=film_filters)
+        for pos, recommendations in zip(positions, batch):
+            results[pos] = response_body([film for film, _ in recommendations], state, items[pos][3])
+            result_cache.put(state.version, items[pos][2], results[pos])
+    return results
+
+
+# MICROBATCH_WINDOW_MS > 0: одновременные запросы склеиваются в пачки (только для SCORING_POOL=thread)
+micro_batcher = MicroBatcher(scoring_pool, recommend_bodies)
+
+
+async def recommend_in_process(req: RecommendRequest, state: ModelState, key: str,
+                               fields: tuple[str, ...] | None, timeout: float | None) -> bytes:
+    # SCORING_POOL=process: названия проверяем здесь, в процесс пула уходят только они,
+    # обратно приходят номера строк — фильмы берём из своего каталога (он тот же: админка выключена,
+    # а после перезагрузки модели процесс с другой версией ответит ModelChanged).
+    # Общий кэш (запрос по сети) и поиск названий (после смены модели строит индексы) — не на event loop
+    body, titles = await asyncio.to_thread(cached_or_titles, req, state, key)
+    if body is None:
+        scored, records = await scoring_pool.run(score_titles, titles, req.top_n,
+                                                 req.film_filter(), state.version, timeout=timeout)
+        replay(records)   # этапы расчёта из процесса пула — в метрики этого процесса
+        body = await asyncio.to_thread(store_rows, [i for i, _ in scored], state, key, fields)
+    return body
+
+
+def cached_or_titles(req: RecommendRequest, state: ModelState, key: str) -> tuple[bytes | None, list[str]]:
+    # в потоке: ответ из общего кэша или названия любимых фильмов из каталога (404 — если не нашлись)
+    body = result_cache.get(state.version, key)
+    if body is not None:
+        return body, []
+    return None, [film.title for film in select_films_by_titles(canonical_titles(req.liked_titles), state)]
+
+
+def store_rows(rows: list[int], state: ModelState, key: str, fields: tuple[str, ...] | None) -> bytes:
+    # в потоке: ответ по номерам строк и запись в кэш (в том числе общий)
+    body = response_body_rows(rows, state, fields)
+    result_cache.put(state.version, key, body)
+    return body
+
+
+def recommend_response(req: RecommendRequest, state: ModelState, fields: tuple[str, ...] | None = None) -> bytes:
     # берём фильмы по названиям и прогоняем через recommend_films
-    liked_films = select_films_by_titles(req.liked_titles)
-    recommendations = recommend_films(liked_films, films)
-
-    # топ-N фильмов
-    top_films = [film for film, _ in recommendations[:req.top_n]]
-
-    response = [
-        FilmResponse(
-            title=film.title,
-            year=film.year,
-            description=film.description,
-            director=film.director,
-            actors=film.actors,
-            country=film.country,
-            rating=film.rating
-        )
-        for film in top_films
-    ]
+    liked_films = select_films_by_titles(canonical_titles(req.liked_titles), state)
+    # топ-N фильмов: recommend_films отбирает их сам, не сортируя всех кандидатов
+    recommendations = recommend_films(liked_films, state.films, top_n=req.top_n, state=state,
+                                      film_filter=req.film_filter())
+    return response_body([film for film, _ in recommendations], state, fields)
 
-    return RecommendResponse(recommendations=response)
+
+def response_body(films: list[Film], state: ModelState, fields: tuple[str, ...] | None = None) -> bytes:
+    return response_body_rows(rows_of(films, state), state, fields)
+
+
+def response_body_rows(rows: list[int], state: ModelState, fields: tuple[str, ...] | None = None) -> bytes:
+    # готовый JSON ответа /recommend (как RecommendResponse); время сборки — этап serialize в /metrics
+    timer = StageTimer(STAGE_SECONDS, "api")
+    body = b'{"recommendations":[' + film_fragments(state).join(rows, fields) + b"]}"
+    timer.mark("serialize")
+    return body
+
+
+BATCH_CHUNK = int(os.environ.get("BATCH_CHUNK", "256"))   # сколько запросов считать одним recommend_films_batch
+
+@app.post("/recommend/batch")
+def recommend_batch(req: BatchRecommendRequest, fields: tuple[str, ...] | None = Depends(film_fields)):
+    # много запросов за один вызов; ответ — NDJSON, по строке на запрос в том же порядке:
+    # {"index": i, "recommendations": [...]} или {"index": i, "error": "..."}
+    state = current_state()
+    return StreamingResponse(batch_lines(req.requests, state, fields), media_type="application/x-ndjson")
+
+
+def batch_lines(requests: list[RecommendRequest], state: ModelState, fields: tuple[str, ...] | None = None):
+    # считаем кусками по BATCH_CHUNK и отдаём строки, как только кусок готов
+    for start in range(0, len(requests), BATCH_CHUNK):
+        chunk = requests[start:start + BATCH_CHUNK]
+        profiles, top_ns, film_filters, lines = [], [], [], []
+        for offset, item in enumerate(chunk):
+            line = BatchRecommendLine(index=start + offset)
+            try:
+                item.check()
+                profiles.append(select_films_by_titles(canonical_titles(item.liked_titles), state))
+                top_ns.append(item.top_n)
+                film_filters.append(item.film_filter())
+            except HTTPException as e:
+                line.error = e.detail
+            lines.append(line)
+
+        results = iter(recommend_films_batch(profiles, top_n=top_ns, state=state, film_filters=film_filters))
+        timer = StageTimer(STAGE_SECONDS, "api")
+        fragments = film_fragments(state)
+        out = []
+        for line in lines:
+            if line.error is None:
+                rows = rows_of([film for film, _ in next(results)], state)
+                out.append(b'{"index":%d,"recommendations":[%b]}\n' % (line.index, fragments.join(rows, fields)))
+            else:
+                out.append(line.model_dump_json(exclude_none=True).encode("utf-8") + b"\n")
+        timer.mark("serialize")
+        yield b"".join(out)
+
+
+@app.get("/films/search", response_model=List[FilmResponse])
+def search_films(q: str, limit: int = 10, fields: tuple[str, ...] | None = Depends(film_fields)):
+    # подсказки для поля ввода: сначала названия, начинающиеся с q (по рейтингу), затем похожие
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q is empty")
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+
+    state = current_state()
+    rows = title_search(state).search(q, limit, SEARCH_MIN_SCORE, alive_rows(state))
+    body = b"[" + film_fragments(state).join(rows, fields) + b"]"
+    return Response(content=body, media_type="application/json")
 
 
 @app.get("/films/random", response_model=List[FilmResponse])
-def get_random_films(limit: int = 30):
+def get_random_films(limit: int = 30, fields: tuple[str, ...] | None = Depends(film_fields)):
     # отдаём случайные фильмы для фронта
     if limit <= 0:
         raise HTTPException(status_code=400, detail="limit must be positive")
 
-    n = min(limit, len(films))
-    sample_films = random.sample(films, n)
-
-    return [
-        FilmResponse(
-            title=f.title,
-            year=f.year,
-            description=f.description,
-            director=f.director,
-            actors=f.actors,
-            country=f.country,
-            rating=f.rating
-        )
-        for f in sample_films
-    ]
+    state = current_state()
+    rows = np.flatnonzero(state.alive).tolist() if state.has_removed else range(len(state.films))
+    n = min(limit, len(rows))
+    body = b"[" + film_fragments(state).join(random.sample(rows, n), fields) + b"]"
+    return Response(content=body, media_type="application/json")
+
+
+# Админка: изменение каталога без перезапуска.
+# Доступна, только если задан ADMIN_TOKEN; токен передаётся в заголовке X-Admin-Token.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: str = Header(default="")):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="admin API disabled (ADMIN_TOKEN not set)")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="invalid admin token")
+
+# в режиме SCORING_POOL=process модель живёт в процессах пула, и менять её отсюда нельзя
+def require_local_model():
+    if scoring_pool.kind == "process":
+        raise HTTPException(status_code=409, detail="catalog updates are not supported with SCORING_POOL=process")
+
+
+def model_status(state: ModelState) -> dict:
+    return {**state.drift(), "version": state.version, "refit_running": recommend_v3.refit_running(),
+            "reload_running": recommend_v3.reload_running(), "reload_error": recommend_v3.reload_error}
+
+
+@app.get("/admin/model", dependencies=[Depends(require_admin)])
+def get_model_status():
+    return model_status(current_state())
+
+
+@app.post("/admin/films", dependencies=[Depends(require_admin), Depends(require_local_model)])
+def add_films(payload: list[FilmPayload]):
+    # фильм с уже существующим названием заменяет прежний
+    if not payload:
+        raise HTTPException(status_code=400, detail="no films given")
+    return model_status(recommend_v3.add_films([item.to_film() for item in payload]))
+
+
+@app.put("/admin/films/{title}", dependencies=[Depends(require_admin), Depends(require_local_model)])
+def update_film(title: str, payload: FilmPayload):
+    state = current_state()
+    idx = title_index(state).get(normalize_title(title))
+    if idx is None:
+        raise HTTPException(status_code=404, detail=f"Фильм не найден: {title}")
+    return model_status(recommend_v3.update_film(state.films.titles[idx], payload.to_film()))
+
+
+@app.delete("/admin/films/{title}", dependencies=[Depends(require_admin), Depends(require_local_model)])
+def delete_film(title: str):
+    state = current_state()
+    idx = title_index(state).get(normalize_title(title))
+    if idx is None:
+        raise HTTPException(status_code=404, detail=f"Фильм не найден: {title}")
+    return model_status(recommend_v3.remove_films([state.films.titles[idx]]))
+
+
+@app.get("/admin/cache", dependencies=[Depends(require_admin)])
+def get_cache_stats():
+    return result_cache.stats()
+
+
+@app.get("/admin/pool", dependencies=[Depends(require_admin)])
+def get_pool_stats():
+    return {**scoring_pool.stats(), "micro_batch": micro_batcher.stats() if micro_batcher.enabled else None}
+
+
+@app.post("/admin/refit", dependencies=[Depends(require_admin), Depends(require_local_model)])
+def start_refit():
+    return {"started": recommend_v3.schedule_refit()}
+
+
+# модель, пересобранная на диске (python model_store.py), — без перезапуска; изменения через
+# админку, которых нет на диске, при этом пропадают. Работает и с SCORING_POOL=process
+@app.post("/admin/reload", dependencies=[Depends(require_admin)])
+def start_reload():
+    return {"started": recommend_v3.schedule_reload(prepare_reload)}
+
+
+# Метрики в формате Prometheus. Кэш и пул уже ведут свои счётчики — они снимаются при запросе
+def cache_metric(name: str):
+    return lambda: result_cache.stats()[name]
+
+def pool_metric(name: str):
+    return lambda: scoring_pool.stats()[name]
+
+Sampled("recommend_cache_hits_total", "Попадания в кэш ответов", "counter",
+        lambda: {("local",): result_cache.hits, ("shared",): result_cache.shared_hits}, ("level",))
+Sampled("recommend_cache_misses_total", "Промахи кэша ответов", "counter", cache_metric("misses"))
+Sampled("recommend_cache_evictions_total", "Вытеснения из кэша ответов", "counter", cache_metric("evictions"))
+Sampled("recommend_cache_items", "Записей в кэше ответов", "gauge", cache_metric("items"))
+Sampled("recommend_cache_bytes", "Байт в кэше ответов", "gauge", cache_metric("bytes"))
+Sampled("scoring_pool_pending", "Задач в пуле (в очереди и в работе)", "gauge", pool_metric("pending"))
+Sampled("scoring_pool_rejected_total", "Отклонено из-за перегрузки (503)", "counter", pool_metric("rejected"))
+Sampled("scoring_pool_timeouts_total", "Не уложились в срок (504)", "counter", pool_metric("timeouts"))
+Sampled("scoring_pool_restarts_total", "Перезапусков процессов пула при перезагрузке модели", "counter", pool_metric("restarts"))
+Sampled("recommend_model_films", "Фильмов в каталоге модели", "gauge", lambda: len(current_state().title_to_idx))
+
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,374 @@
+"""
+Замеры v1, v2, v3 и HTTP-слоя на каталогах разного размера.
+
+    python benchmark.py run [--sizes 250,10000,100000,1000000] [--impl v1,v2,v3,http]
+                            [--requests 200] [--budget 30] [--concurrency 4] [--out results.json]
+    python benchmark.py compare old.json new.json [--threshold 0.1]
+
+Размер 250 — настоящий data/kinopoisk-top250.csv, остальные — синтетические каталоги
+(synth_catalog.py) в той же схеме; они создаются один раз и лежат в data/bench/.
+
+Каждый случай (реализация × размер) считается в отдельном процессе — так модели не делят
+память и пиковый RSS относится только к нему. Для каждого случая записываются:
+- build_seconds — загрузка каталога и построение модели (для http — до первого ответа сервера)
+- latency_ms — p50/p90/p99/mean/max одного запроса (1–3 любимых фильма, top_n=10)
+- throughput_rps — запросов в секунду (для http — с --concurrency одновременными клиентами)
+- peak_rss_mb — пиковая память процесса (для http — процесса сервера)
+Запросы одинаковые от прогона к прогону (--seed). Случай ограничен --budget секундами
+(но хотя бы один запрос), а весь процесс случая — --case-timeout секундами: не успел —
+в результате error. v1 и v2 на каждый запрос перебирают весь каталог в чистом Python,
+поэтому по умолчанию считаются только до --slow-max-rows строк, остальные помечаются skipped.
+HTTP-замер идёт без кэша ответов (RESULT_CACHE_SIZE=0): меряется расчёт, а не попадания.
+
+Результат — JSON с окружением (Python, CPU, коммит), параметрами и списком случаев.
+compare сравнивает два таких файла по каждому показателю и отмечает ухудшения больше threshold;
+если они есть, код выхода 1.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCH_DIR = "data/bench"
+REAL_CSV = "data/kinopoisk-top250.csv"
+IMPLEMENTATIONS = ("v1", "v2", "v3", "http")
+SLOW_IMPLEMENTATIONS = ("v1", "v2")
+MODEL_BUILDERS = {"v1": "bow_model_for", "v2": "tfidf_model_for"}
+CASE_TIMEOUT = 30 * 60   # секунд на один случай по умолчанию, включая построение модели
+
+
+def catalog_path(rows: int, seed: int) -> str:
+    """CSV каталога нужного размера; синтетический создаётся при первом обращении."""
+    if rows == 250:
+        return REAL_CSV
+    path = os.path.join(BENCH_DIR, f"catalog-{rows}-seed{seed}.csv")
+    if not os.path.exists(path):
+        from synth_catalog import generate
+
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        generate(rows, path + ".tmp", seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def sample_profiles(n_films: int, n_requests: int, seed: int) -> list[list[int]]:
+    """Профили запросов: по 1–3 случайных фильма из каталога (номера строк)."""
+    rng = random.Random(seed)
+    return [rng.sample(range(n_films), rng.randint(1, min(3, n_films))) for _ in range(n_requests)]
+
+
+def latency_summary(latencies: list[float], wall: float) -> dict:
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "latency_ms": {
+            "p50": float(np.percentile(ms, 50)),
+            "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)),
+            "mean": float(ms.mean()),
+            "max": float(ms.max()),
+        },
+        "throughput_rps": len(latencies) / wall if wall > 0 else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса (ru_maxrss — в КБ на Linux и в байтах на macOS)."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def process_peak_rss_mb(pid: int) -> float | None:
+    """Пиковый RSS другого процесса (VmHWM из /proc, только Linux)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# Один случай — в отдельном процессе (python benchmark.py _case ...), результат — JSON в stdout
+
+def run_module_case(impl: str, csv_path: str, n_requests: int, budget: float, seed: int) -> dict:
+    """v1 / v2 / v3: recommend_films в этом же процессе."""
+    started = time.perf_counter()
+    if impl == "v3":
+        os.environ["FILMS_CSV"] = csv_path
+        os.environ["MODEL_DIR"] = ""        # обучаем на этом каталоге, а не грузим артефакт
+        os.environ["NEIGHBORS_DIR"] = ""
+        import recommend_v3
+
+        state = recommend_v3.current_state()
+        films = state.films
+
+        def recommend(liked):
+            return recommend_v3.recommend_films(liked, films, top_n=10, state=state)
+    else:
+        from data_loader import load_catalog
+
+        module = __import__(f"recommend_{impl}")
+        films = load_catalog(csv_path)
+        # словарь и векторы каталога — часть сборки, а не первого запроса
+        getattr(module, MODEL_BUILDERS[impl])(films)
+
+        def recommend(liked):
+            return module.recommend_films(liked, films)[:10]
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    wall_started = time.perf_counter()
+    for profile in sample_profiles(len(films), n_requests, seed):
+        liked = [films[i] for i in profile]
+        t = time.perf_counter()
+        recommend(liked)
+        latencies.append(time.perf_counter() - t)
+        if time.perf_counter() - wall_started > budget:
+            break
+    wall = time.perf_counter() - wall_started
+    return {"build_seconds": build_seconds, **latency_summary(latencies, wall), "peak_rss_mb": peak_rss_mb()}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port: int, server: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/films/random?limit=1")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_http_case(csv_path: str, n_requests: int, budget: float, seed: int, concurrency: int) -> dict:
+    """POST /recommend к uvicorn с одним воркером; concurrency клиентов с keep-alive соединениями."""
+    from data_loader import read_csv
+
+    titles = read_csv(csv_path)["movie"].fillna("nan").str.strip().tolist()
+    bodies = [json.dumps({"liked_titles": [titles[i] for i in profile], "top_n": 10}).encode("utf-8")
+              for profile in sample_profiles(len(titles), n_requests, seed)]
+
+    port = _free_port()
+    env = dict(os.environ, FILMS_CSV=csv_path, MODEL_DIR="", NEIGHBORS_DIR="", RESULT_CACHE_SIZE="0",
+               RESULT_CACHE_URL="", SCORING_QUEUE=str(max(64, concurrency)))
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port),
+                               "--log-level", "warning"], env=env)
+    try:
+        if not _wait_ready(port, server, CASE_TIMEOUT):
+            return {"error": "server did not start"}
+        build_seconds = time.perf_counter() - started
+
+        latencies: list[float] = []
+        errors = 0
+        lock = threading.Lock()
+        pending = iter(bodies)
+        wall_started = time.perf_counter()
+
+        def client():
+            nonlocal errors
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+            while time.perf_counter() - wall_started <= budget:
+                with lock:
+                    body = next(pending, None)
+                if body is None:
+                    break
+                t = time.perf_counter()
+                conn.request("POST", "/recommend", body, {"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                with lock:
+                    latencies.append(time.perf_counter() - t)
+                    errors += response.status != 200
+            conn.close()
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_started
+        return {"build_seconds": build_seconds, **latency_summary(latencies, wall), "errors": errors,
+                "concurrency": concurrency, "peak_rss_mb": process_peak_rss_mb(server.pid)}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_case(impl: str, rows: int, args) -> dict:
+    """Запускает случай в отдельном процессе и возвращает его результат."""
+    case = {"impl": impl, "rows": rows}
+    if impl in SLOW_IMPLEMENTATIONS and rows > args.slow_max_rows:
+        return {**case, "skipped": f"rows > --slow-max-rows ({args.slow_max_rows})"}
+    csv_path = catalog_path(rows, args.seed)
+    command = [sys.executable, os.path.abspath(__file__), "_case", impl, csv_path, str(args.requests),
+               str(args.budget), str(args.seed), str(args.concurrency)]
+    # своя группа процессов: по таймауту убиваем и случай, и запущенный им сервер
+    child = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                             start_new_session=True)
+    try:
+        stdout, stderr = child.communicate(timeout=args.case_timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(child.pid, signal.SIGKILL)
+        child.communicate()
+        return {**case, "error": f"timeout after {args.case_timeout:g} s"}
+    if child.returncode != 0:
+        return {**case, "error": (stderr.strip().splitlines() or [f"exit code {child.returncode}"])[-1]}
+    return {**case, **json.loads(stdout.strip().splitlines()[-1])}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import scipy
+    import sklearn
+
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def run(args):
+    sizes = [int(size) for size in args.sizes.split(",")]
+    impls = [impl.strip() for impl in args.impl.split(",")]
+    unknown = set(impls) - set(IMPLEMENTATIONS)
+    if unknown:
+        raise SystemExit(f"Неизвестные реализации: {', '.join(sorted(unknown))}")
+
+    out = args.out or os.path.join(BENCH_DIR, f"results-{datetime.now():%Y%m%d-%H%M%S}.json")
+    result = {
+        "environment": environment(),
+        "params": {"sizes": sizes, "impl": impls, "requests": args.requests, "budget": args.budget,
+                   "seed": args.seed, "concurrency": args.concurrency, "slow_max_rows": args.slow_max_rows,
+                   "case_timeout": args.case_timeout},
+        "cases": [],
+    }
+    for rows in sizes:
+        for impl in impls:
+            case = run_case(impl, rows, args)
+            result["cases"].append(case)
+            print(format_case(case), flush=True)
+            # пишем после каждого случая: прогон на 1M строк долгий, частичный результат тоже полезен
+            os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+            with open(out, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {out}")
+
+
+def format_case(case: dict) -> str:
+    name = f"{case['impl']:>4} {case['rows']:>8}"
+    if "skipped" in case:
+        return f"{name}  пропущен: {case['skipped']}"
+    if "error" in case:
+        return f"{name}  ошибка: {case['error']}"
+    latency = case["latency_ms"]
+    return (f"{name}  сборка {case['build_seconds']:8.2f} с  p50 {latency['p50']:9.2f} мс  "
+            f"p99 {latency['p99']:9.2f} мс  {case['throughput_rps']:8.1f} запр/с  "
+            f"память {case['peak_rss_mb'] or 0:7.0f} МБ  ({case['requests']} запр.)")
+
+
+# показатель -> (как достать из случая, больше — лучше?)
+COMPARED = {
+    "build_seconds": (lambda c: c["build_seconds"], False),
+    "p50_ms": (lambda c: c["latency_ms"]["p50"], False),
+    "p99_ms": (lambda c: c["latency_ms"]["p99"], False),
+    "throughput_rps": (lambda c: c["throughput_rps"], True),
+    "peak_rss_mb": (lambda c: c["peak_rss_mb"], False),
+}
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Печатает изменения показателей по общим случаям; возвращает число ухудшений больше threshold."""
+    with open(old_path, encoding="utf-8") as f:
+        old = {(c["impl"], c["rows"]): c for c in json.load(f)["cases"] if "latency_ms" in c}
+    with open(new_path, encoding="utf-8") as f:
+        new = {(c["impl"], c["rows"]): c for c in json.load(f)["cases"] if "latency_ms" in c}
+
+    regressions = 0
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        parts = []
+        for name, (get, higher_is_better) in COMPARED.items():
+            before, after = get(old[key]), get(new[key])
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            worse = -change if higher_is_better else change
+            mark = "!" if worse > threshold else " "
+            regressions += worse > threshold
+            parts.append(f"{name} {before:.4g} -> {after:.4g} ({change:+.0%}){mark}")
+        print(f"{key[0]:>4} {key[1]:>8}  " + "  ".join(parts))
+    print(f"Ухудшений больше {threshold:.0%}: {regressions}")
+    return regressions
+
+
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "_case":
+        impl, csv_path, n_requests, budget, seed, concurrency = argv[1:7]
+        if impl == "http":
+            case = run_http_case(csv_path, int(n_requests), float(budget), int(seed), int(concurrency))
+        else:
+            case = run_module_case(impl, csv_path, int(n_requests), float(budget), int(seed))
+        print(json.dumps(case))
+        return
+
+    parser = argparse.ArgumentParser(description="Замеры реализаций рекомендаций на каталогах разного размера")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="прогнать замеры")
+    run_parser.add_argument("--sizes", default="250,10000,100000,1000000", help="размеры каталога через запятую")
+    run_parser.add_argument("--impl", default=",".join(IMPLEMENTATIONS), help="реализации через запятую")
+    run_parser.add_argument("--requests", type=int, default=200, help="запросов на случай")
+    run_parser.add_argument("--budget", type=float, default=30.0, help="секунд на запросы одного случая")
+    run_parser.add_argument("--concurrency", type=int, default=4, help="одновременных клиентов для http")
+    run_parser.add_argument("--case-timeout", type=float, default=CASE_TIMEOUT,
+                            help="секунд на один случай вместе с построением модели")
+    run_parser.add_argument("--slow-max-rows", type=int, default=10_000, help="до какого размера мерить v1 и v2")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--out", help="файл результата (по умолчанию data/bench/results-<время>.json)")
+    compare_parser = commands.add_parser("compare", help="сравнить два файла результатов")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="допустимое ухудшение (0.1 = 10%%)")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(1 if compare(args.old, args.new, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Офлайн-расчёт рекомендаций для большого числа пользователей (без FastAPI).
+
+    python bulk_recommend.py profiles.jsonl out_dir [--workers N] [--chunk 1000] [--top-n 10]
+
+Вход — JSONL ({"id": ..., "liked_titles": [...], "top_n": 10}; id и top_n необязательны)
+или CSV с колонками id, liked_titles (названия через "|": в самих названиях бывает ";"),
+top_n (необязательно).
+top_n проверяется, как в /recommend: не целое или не больше нуля — для профиля пишется ошибка.
+Выход — папка с кусками part-000000.jsonl, ... по --chunk входных строк в каждом:
+{"id": ..., "recommendations": [{"title": ..., "score": ...}, ...]} или {"id": ..., "error": ...}.
+
+Работа делится между процессами (multiprocessing, spawn). Модель воркеры не обучают и не читают
+из CSV: они отображают в память один и тот же артефакт модели (model_store), так что
+tfidf_matrix и колонки каталога лежат в общей памяти ОС, а не копируются в каждый процесс.
+Если артефакта в MODEL_DIR нет, модель один раз обучается здесь и сохраняется во временную
+папку в /dev/shm (или во временную папку системы), которая удаляется после расчёта.
+
+Каждый кусок пишется во временный файл и переименовывается, поэтому после падения
+повторный запуск с теми же аргументами пропускает готовые куски и досчитывает остальные.
+В out_dir/manifest.json записана версия модели: досчитывать другой моделью нельзя.
+"""
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+from model_store import has_model, read_manifest, save_model
+from title_search import TitleIndex, canonical_titles, normalize_title, resolve_titles
+
+MANIFEST = "manifest.json"
+TITLE_SEPARATOR = "|"   # разделитель названий в CSV
+TITLE_MATCH_MIN = float(os.environ.get("TITLE_MATCH_MIN", "0.6"))   # как в app.py: исправление названий
+
+
+def read_profiles(path: str) -> list[dict]:
+    """Профили пользователей из JSONL или CSV; id по умолчанию — номер строки."""
+    profiles = []
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                titles = [t.strip() for t in (row.get("liked_titles") or "").split(TITLE_SEPARATOR) if t.strip()]
+                top_n = (row.get("top_n") or "").strip()
+                profiles.append({"id": row.get("id") or len(profiles), "liked_titles": titles,
+                                 "top_n": top_n or None})
+        else:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                profiles.append({"id": item.get("id", len(profiles)), "liked_titles": item.get("liked_titles", []),
+                                 "top_n": item.get("top_n")})
+    return profiles
+
+
+def profile_top_n(value, default: int) -> int:
+    """
+    top_n профиля, как в /recommend: целое больше нуля; не задан — default.
+    Иначе ValueError с текстом ошибки для строки результата.
+    """
+    if value is None:
+        return default
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError("top_n must be an integer")
+    try:
+        top_n = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("top_n must be an integer") from None
+    if top_n <= 0:
+        raise ValueError("top_n must be positive")
+    return top_n
+
+
+def part_path(out_dir: str, chunk_no: int) -> str:
+    return os.path.join(out_dir, f"part-{chunk_no:06d}.jsonl")
+
+
+def prepare_model() -> tuple[str, str | None]:
+    """
+    Папка артефакта для воркеров и временная папка, которую надо удалить после расчёта (или None).
+    Если артефакта нет — обучаем модель один раз здесь и сохраняем её во временную папку.
+    """
+    model_dir = os.environ.get("MODEL_DIR", "data/model")
+    if has_model(model_dir):
+        return model_dir, None
+    os.environ["DESC_INDEX"] = "exact"
+    os.environ["NEIGHBORS_DIR"] = ""
+    import recommend_v3
+
+    tmp_root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    tmp_dir = tempfile.mkdtemp(prefix="movie-model-", dir=tmp_root)
+    model_dir = os.path.join(tmp_dir, "model")
+    state = recommend_v3.current_state()
+    save_model(model_dir, state.films, state.vectorizer, state.tfidf_matrix)
+    return model_dir, tmp_dir
+
+
+def check_manifest(out_dir: str, manifest: dict):
+    """Досчитывать можно только с той же моделью и тем же делением на куски."""
+    path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise SystemExit(f"{out_dir} посчитан с другими параметрами или моделью: {previous}. "
+                             "Укажите другую папку или удалите её.")
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+# Воркер: модель загружается один раз при старте процесса
+
+_state = None
+_title2idx: dict[str, int] = {}
+_title_search: TitleIndex | None = None
+
+
+def _init_worker(model_dir: str):
+    global _state, _title2idx, _title_search
+    os.environ["MODEL_DIR"] = model_dir
+    os.environ["DESC_INDEX"] = "exact"   # пакетный расчёт всегда точный, ANN-индекс не нужен
+    os.environ["NEIGHBORS_DIR"] = ""
+    import recommend_v3
+
+    _state = recommend_v3.current_state()
+    _title2idx = {normalize_title(title): i for title, i in _state.title_to_idx.items()}
+    _title_search = None
+
+
+def _resolve(title: str) -> int | None:
+    """Название с опечаткой -> строка каталога, как в /recommend; индекс строится при первой опечатке."""
+    global _title_search
+    if _title_search is None:
+        _title_search = TitleIndex(_state.films)
+    return _title_search.resolve(title, TITLE_MATCH_MIN, _state.alive if _state.has_removed else None)
+
+
+def _run_chunk(task: tuple[int, str, list[dict], int | None]) -> tuple[int, int, int]:
+    """Считает один кусок и пишет его в part-файл. Возвращает (номер куска, готово, ошибок)."""
+    import recommend_v3
+
+    chunk_no, out_dir, profiles, default_top_n = task
+    state, title2idx = _state, _title2idx
+
+    lines: list[dict | None] = []
+    batch, top_ns = [], []
+    resolve = _resolve if TITLE_MATCH_MIN > 0 else None
+    for profile in profiles:
+        # как в /recommend: названия без повторов и в одном порядке, опечатки исправляются
+        # ошибки — в том же порядке проверок, что у /recommend
+        titles = canonical_titles(profile["liked_titles"])
+        try:
+            if not titles:
+                raise ValueError("liked_titles is empty")
+            top_n = profile_top_n(profile["top_n"], default_top_n)
+            rows, missing = resolve_titles(titles, title2idx, resolve, state.films.titles)
+            if missing:
+                raise ValueError(f"Фильмы не найдены: {', '.join(missing)}")
+        except ValueError as e:
+            lines.append({"id": profile["id"], "error": str(e)})
+            continue
+        batch.append([state.films[i] for i in rows])
+        top_ns.append(top_n)
+        lines.append(None)
+
+    results = iter(recommend_v3.recommend_films_batch(batch, top_n=top_ns, state=state))
+    tmp = part_path(out_dir, chunk_no) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for profile, line in zip(profiles, lines):
+            if line is None:
+                line = {"id": profile["id"],
+                        "recommendations": [{"title": film.title, "score": score} for film, score in next(results)]}
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    os.replace(tmp, part_path(out_dir, chunk_no))
+    return chunk_no, len(batch), len(profiles) - len(batch)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Рекомендации для многих пользователей по файлу профилей")
+    parser.add_argument("profiles", help="JSONL или CSV с любимыми фильмами")
+    parser.add_argument("out_dir", help="папка для кусков результата")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=1000, help="профилей в одном куске")
+    parser.add_argument("--top-n", type=int, default=10, help="top_n для профилей без своего")
+    args = parser.parse_args(argv)
+    if args.top_n <= 0:
+        parser.error("--top-n должен быть больше нуля")
+
+    profiles = read_profiles(args.profiles)
+    model_dir, tmp_dir = prepare_model()
+    try:
+        os.makedirs(args.out_dir, exist_ok=True)
+        check_manifest(args.out_dir, {
+            "profiles": os.path.abspath(args.profiles),
+            "n_profiles": len(profiles),
+            "chunk": args.chunk,
+            "top_n": args.top_n,
+            "model_version": read_manifest(model_dir)["model_version"],
+        })
+
+        tasks = [
+            (chunk_no, args.out_dir, profiles[start:start + args.chunk], args.top_n)
+            for chunk_no, start in enumerate(range(0, len(profiles), args.chunk))
+            if not os.path.exists(part_path(args.out_dir, chunk_no))
+        ]
+        n_chunks = (len(profiles) + args.chunk - 1) // args.chunk
+        print(f"{len(profiles)} профилей, кусков {n_chunks}, осталось {len(tasks)}, воркеров {args.workers}")
+
+        started = time.perf_counter()
+        done = errors = 0
+        with get_context("spawn").Pool(args.workers, initializer=_init_worker, initargs=(model_dir,)) as pool:
+            for chunk_no, ok, failed in pool.imap_unordered(_run_chunk, tasks):
+                done += ok
+                errors += failed
+                print(f"кусок {chunk_no}: готово {ok}, ошибок {failed}", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+        print(f"Посчитано {done} профилей ({errors} с ошибкой) за {elapsed:.1f} с "
+              f"({done / elapsed if elapsed else 0:.0f} профилей/с)")
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
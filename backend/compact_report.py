@@ -0,0 +1,155 @@
+"""
+Отчёт о компактной модели v3: сколько памяти она экономит и насколько меняются рекомендации.
+
+    python compact_report.py [путь_к_csv] [--dtype float32] [--min-df 2] [--max-df 1.0]
+                             [--max-features N] [--top-terms T] [--lsa-dim D]
+                             [--profiles 200] [--top-n 10] [--json]
+
+На каталоге обучаются две модели: полная (float64, весь словарь — как по умолчанию)
+и компактная с заданными параметрами (те же, что TFIDF_* в recommend_v3); с --lsa-dim
+компактная модель отбирает по описанию через эмбеддинги LSA (DESC_SPACE=lsa, lsa.py) поверх
+своей TF-IDF. Печатается:
+- память матрицы для отбора по описанию — tfidf_matrix (data + indices + indptr) или эмбеддингов
+  LSA вместе с базисом SVD — и словаря векторайзера (оценка по sys.getsizeof)
+- overlap@k — средняя доля общих фильмов в топ-k полной и компактной модели на одних и тех же
+  профилях (1–3 любимых фильма, как в benchmark.py): для кандидатов по описанию (k = TOP_K)
+  и для итоговых рекомендаций (k = --top-n)
+- доля профилей, у которых итоговый топ совпал полностью, вместе с порядком
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from benchmark import sample_profiles
+from data_loader import load_catalog
+from lsa import fit_lsa
+
+FULL = {"dtype": "float64", "min_df": 1, "max_df": 1.0, "max_features": None, "top_terms": None}
+
+
+def matrix_bytes(matrix) -> int:
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def vocabulary_bytes(vectorizer) -> int:
+    """Словарь (dict слово -> столбец) вместе со строками слов и IDF."""
+    vocabulary = vectorizer.vocabulary_
+    return (sys.getsizeof(vocabulary) + sum(sys.getsizeof(term) for term in vocabulary)
+            + np.asarray(vectorizer.idf_).nbytes)
+
+
+def overlap(a: list, b: list, k: int) -> float:
+    return len(set(a[:k]) & set(b[:k])) / k if k else 1.0
+
+
+def model_report(films, params: dict, lsa_dim: int | None = None) -> tuple[dict, "recommend_v3.ModelState"]:
+    import recommend_v3
+
+    vectorizer, matrix = recommend_v3.fit_tfidf(films.descriptions(), **params)
+    embedding = fit_lsa(matrix, lsa_dim) if lsa_dim else None
+    state = recommend_v3.ModelState(films, vectorizer, matrix, embedding=embedding)
+    return {
+        "params": {**params, "lsa_dim": embedding.dim} if embedding is not None else params,
+        "terms": len(vectorizer.vocabulary_),
+        "nnz": int(matrix.nnz),
+        "matrix_mb": (matrix_bytes(matrix) if embedding is None
+                      else embedding.vectors.nbytes + embedding.components.nbytes) / 2 ** 20,
+        "vocabulary_mb": vocabulary_bytes(vectorizer) / 2 ** 20,
+    }, state
+
+
+def ranking_drift(full: "recommend_v3.ModelState", compact: "recommend_v3.ModelState", profiles: list[list[int]],
+                  top_n: int) -> dict:
+    """Сравнение рекомендаций двух моделей одного каталога на одних и тех же профилях."""
+    import recommend_v3
+
+    films = full.films
+    candidates = []
+    for profile in profiles:
+        top = [recommend_v3.top_k_by_description(profile, state.desc_matrix)[0].tolist()
+               for state in (full, compact)]
+        candidates.append(overlap(*top, recommend_v3.TOP_K))
+
+    liked = [[films[i] for i in profile] for profile in profiles]
+    full_top, compact_top = [
+        [[film.title for film, _ in result]
+         for result in recommend_v3.recommend_films_batch(liked, top_n=top_n, state=state)]
+        for state in (full, compact)
+    ]
+    return {
+        "profiles": len(profiles),
+        "candidates_overlap": float(np.mean(candidates)),
+        "top_n": top_n,
+        "top_n_overlap": float(np.mean([overlap(a, b, top_n) for a, b in zip(full_top, compact_top)])),
+        "top_n_same": float(np.mean([a == b for a, b in zip(full_top, compact_top)])),
+    }
+
+
+def report(csv_path: str, params: dict, n_profiles: int, top_n: int, seed: int,
+           lsa_dim: int | None = None) -> dict:
+    films = load_catalog(csv_path)
+    full, full_state = model_report(films, FULL)
+    compact, compact_state = model_report(films, params, lsa_dim)
+    return {
+        "catalog": csv_path,
+        "films": len(films),
+        "full": full,
+        "compact": compact,
+        "matrix_saved": 1 - compact["matrix_mb"] / full["matrix_mb"],
+        "drift": ranking_drift(full_state, compact_state, sample_profiles(len(films), n_profiles, seed), top_n),
+    }
+
+
+def format_report(result: dict) -> str:
+    import recommend_v3
+
+    full, compact, drift = result["full"], result["compact"], result["drift"]
+    lines = [f"{result['catalog']}: {result['films']} фильмов"]
+    for name, model in (("полная", full), ("компактная", compact)):
+        matrix = f"LSA {model['params']['lsa_dim']:>4}" if "lsa_dim" in model["params"] else "матрица "
+        lines.append(f"  {name:<10}  слов {model['terms']:>8}  ненулевых {model['nnz']:>10}  "
+                     f"{matrix} {model['matrix_mb']:8.1f} МБ  словарь {model['vocabulary_mb']:7.1f} МБ")
+    saved = result["matrix_saved"]
+    matrix = f"меньше на {saved:.0%}" if saved >= 0 else f"больше в {compact['matrix_mb'] / full['matrix_mb']:.1f} раза"
+    lines.append(f"  матрица {matrix}, "
+                 f"словарь — на {1 - compact['vocabulary_mb'] / full['vocabulary_mb']:.0%}")
+    lines.append(f"  overlap@{recommend_v3.TOP_K} кандидатов {drift['candidates_overlap']:.3f}  "
+                 f"overlap@{drift['top_n']} рекомендаций {drift['top_n_overlap']:.3f}  "
+                 f"топ совпал полностью {drift['top_n_same']:.0%}  ({drift['profiles']} профилей)")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # модель текущего артефакта и таблица соседей отчёту не нужны — не грузим их при импорте v3
+    os.environ["MODEL_DIR"] = ""
+    os.environ["NEIGHBORS_DIR"] = ""
+    os.environ["DESC_SPACE"] = "tfidf"
+    import recommend_v3
+
+    parser = argparse.ArgumentParser(description="Память и дрейф рекомендаций компактной модели v3")
+    parser.add_argument("csv", nargs="?", default="data/kinopoisk-top250.csv")
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--min-df", default="2", help="как TFIDF_MIN_DF: 2 — число описаний, 0.01 — доля")
+    parser.add_argument("--max-df", default="1.0", help="как TFIDF_MAX_DF")
+    parser.add_argument("--max-features", type=int, default=0, help="0 — без ограничения")
+    parser.add_argument("--top-terms", type=int, default=0, help="0 — все слова описания")
+    parser.add_argument("--lsa-dim", type=int, default=0, help="как LSA_DIM: отбор по эмбеддингам LSA; 0 — нет")
+    parser.add_argument("--profiles", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    params = {
+        "dtype": args.dtype,
+        "min_df": recommend_v3._df_value(args.min_df),
+        "max_df": recommend_v3._df_value(args.max_df),
+        "max_features": args.max_features or None,
+        "top_terms": args.top_terms or None,
+    }
+    result = report(args.csv, params, args.profiles, args.top_n, args.seed, args.lsa_dim or None)
+    print(json.dumps(result, ensure_ascii=False, indent=2) if args.json else format_report(result))
@@ -1,28 +1,270 @@
+import os
+import weakref
+import numpy as np
 import pandas as pd
-from films_model import Film
+from scipy.sparse import csr_matrix
+from films_model import Film, FilmCatalog, FilmCatalogBuilder
 
-def load_films_from_csv(path: str) -> list[Film]:
-    df = pd.read_csv(path)
+# Колонки CSV, которые нужны модели, и их типы: остальные (url_logo, screenwriter, ...)
+# pandas даже не читает в память
+CSV_COLUMNS = ["movie", "year", "country", "rating_ball", "overview", "director", "actors"]
+CSV_DTYPES = {
+    "movie": str,
+    "year": "float64",
+    "country": str,
+    "rating_ball": "float64",
+    "overview": str,
+    "director": str,
+    "actors": str,
+}
+CSV_CHUNK = 100_000
 
+
+def read_csv(path: str, chunksize: int | None = None):
+    """Читает только нужные колонки с заданными типами (или итератор кусков, если задан chunksize)."""
+    return pd.read_csv(path, usecols=CSV_COLUMNS, dtype=CSV_DTYPES, chunksize=chunksize)
+
+
+def split_column(column: pd.Series) -> tuple[list[str], np.ndarray]:
+    """
+    Колонка вида "а; б; в" -> плоский список очищенных элементов и число элементов у каждой строки.
+    Пустые значения (NaN) дают пустой список. Всё делается целыми колонками, без цикла по строкам.
+    """
+    parts = column.str.split(";")
+    counts = parts.str.len().fillna(0).to_numpy(dtype=np.int64)
+    flat = parts.explode().dropna().str.strip()
+    return flat.tolist(), counts
+
+
+def frame_columns(df: pd.DataFrame) -> dict:
+    """Приводит DataFrame из CSV к колонкам фильма (как раньше делалось построчно в цикле)."""
+    country_flat, country_counts = split_column(df["country"])
+    actor_flat, actor_counts = split_column(df["actors"])
+    return {
+        "titles": df["movie"].fillna("nan").str.strip().tolist(),
+        "years": df["year"].fillna(0).to_numpy(dtype=np.int64),
+        "ratings": df["rating_ball"].fillna(0.0).to_numpy(dtype=np.float64),
+        "directors": df["director"].fillna("").str.strip().tolist(),
+        "descriptions": df["overview"].fillna("").str.strip().tolist(),
+        "country_flat": country_flat,
+        "country_counts": country_counts,
+        "actor_flat": actor_flat,
+        "actor_counts": actor_counts,
+    }
+
+
+def iter_csv_columns(path: str, chunksize: int = CSV_CHUNK):
+    """Потоковое чтение большого CSV: по chunksize строк, каждый кусок — колонками фильма."""
+    for chunk in read_csv(path, chunksize=chunksize):
+        yield frame_columns(chunk)
+
+
+def films_from_columns(columns: dict) -> list[Film]:
+    """Колонки -> список объектов Film."""
+    def lists(flat: list[str], counts: np.ndarray):
+        start = 0
+        for count in counts.tolist():
+            yield flat[start:start + count]
+            start += count
+
+    return [
+        Film(title=title, year=year, country=country, actors=actors, rating=rating,
+             director=director, description=description)
+        for title, year, country, actors, rating, director, description in zip(
+            columns["titles"], columns["years"].tolist(),
+            lists(columns["country_flat"], columns["country_counts"]),
+            lists(columns["actor_flat"], columns["actor_counts"]),
+            columns["ratings"].tolist(), columns["directors"], columns["descriptions"])
+    ]
+
+
+def load_films_from_csv(path: str, chunksize: int | None = None) -> list[Film]:
+    if chunksize is None:
+        return films_from_columns(frame_columns(read_csv(path)))
     films: list[Film] = []
-    for _, row in df.iterrows():
-        title = str(row["movie"]).strip()
-        year = int(row["year"]) if not pd.isna(row["year"]) else 0
-        country = [c.strip() for c in str(row["country"]).split(";")] if not pd.isna(row["country"]) else []
-        actors = [a.strip() for a in str(row["actors"]).split(";")] if not pd.isna(row["actors"]) else []
-        rating = float(row["rating_ball"]) if not pd.isna(row["rating_ball"]) else 0.0
-        director = str(row["director"]).strip() if not pd.isna(row["director"]) else ""
-        description = str(row["overview"]).strip() if not pd.isna(row["overview"]) else ""
-
-        film = Film(
-            title=title,
-            year=year,
-            country=country,
-            actors=actors,
-            rating=rating,
-            director=director,
-            description=description
+    for columns in iter_csv_columns(path, chunksize):
+        films.extend(films_from_columns(columns))
+    return films
+
+
+_CATALOG_CACHE_SIZE = 2
+_catalogs: dict[str, tuple[tuple[int, int], weakref.ref]] = {}
+
+def _file_stamp(path: str) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load_catalog(path: str, chunksize: int | None = None, fresh: bool = False) -> FilmCatalog:
+    """
+    Загружает CSV в колоночный каталог FilmCatalog, минуя объекты Film.
+    chunksize — читать файл кусками (для файлов, которые целиком в память не влезают).
+    Каталог по одному пути строится один раз, так что v1, v2 и v3 делят одну копию;
+    файл изменился (время изменения или размер) или fresh=True — читается заново.
+    Помнится не больше _CATALOG_CACHE_SIZE путей (самые давние вытесняются), и только
+    пока каталог кому-то нужен: ссылка слабая, каталог, выведенный из работы, освобождается.
+    """
+    stamp = _file_stamp(path)
+    cached = _catalogs.pop(path, None)
+    catalog = cached[1]() if cached is not None and cached[0] == stamp and not fresh else None
+    if catalog is not None:
+        _catalogs[path] = cached
+        return catalog
+    builder = FilmCatalogBuilder()
+    chunks = iter_csv_columns(path, chunksize) if chunksize else [frame_columns(read_csv(path))]
+    for columns in chunks:
+        builder.add_columns(**columns)
+    catalog = builder.build()
+    while len(_catalogs) >= _CATALOG_CACHE_SIZE:
+        _catalogs.pop(next(iter(_catalogs)))
+    _catalogs[path] = (stamp, weakref.ref(catalog))
+    return catalog
+
+
+def ids_of(mapping: dict[str, int], values) -> np.ndarray:
+    """Номера известных значений из mapping (неизвестные просто пропускаются)."""
+    return np.array([mapping[v] for v in set(values) if v in mapping], dtype=np.int64)
+
+
+class PeopleIndex:
+    """
+    Индекс людей каталога, строится один раз при загрузке:
+    - actors_matrix — CSR матрица фильм×актёр (1.0, если актёр есть в фильме)
+    - actors_count — сколько разных актёров у фильма (сумма строки)
+    - director_ids — номер режиссёра каждого фильма
+    Нужен, чтобы не собирать множества актёров заново для каждого фильма.
+    """
+
+    def __init__(self, films: list[Film] | FilmCatalog):
+        if isinstance(films, FilmCatalog):
+            self._init_from_catalog(films)
+            return
+
+        self.actor_to_id: dict[str, int] = {}
+        indptr = [0]
+        indices: list[int] = []
+        for film in films:
+            # set — как в compare_actors: повторы актёра в одном фильме не считаются
+            for actor in set(film.actors):
+                indices.append(self.actor_to_id.setdefault(actor, len(self.actor_to_id)))
+            indptr.append(len(indices))
+        self.actors_matrix = csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+            shape=(len(films), max(len(self.actor_to_id), 1)),
         )
-        films.append(film)
+        self.actors_count = np.diff(self.actors_matrix.indptr).astype(np.float64)
 
-    return films
+        self.director_to_id: dict[str, int] = {}
+        self.director_ids = np.array(
+            [self.director_to_id.setdefault(film.director, len(self.director_to_id)) for film in films],
+            dtype=np.int64,
+        )
+
+    def _init_from_catalog(self, catalog: FilmCatalog):
+        """У каталога актёры и режиссёры уже закодированы номерами — матрица строится без циклов."""
+        self.actor_to_id = catalog.actors.ids
+        self.actors_matrix = csr_matrix(
+            (np.ones(len(catalog.actor_codes), dtype=np.float64), catalog.actor_codes, catalog.actor_offsets),
+            shape=(len(catalog), max(len(catalog.actors), 1)),
+            copy=True,   # колонки каталога могут быть отображены из файла только на чтение
+        )
+        # повторы актёра в одном фильме схлопываются в одну единицу — как set в compare_actors
+        self.actors_matrix.sum_duplicates()
+        self.actors_matrix.data[:] = 1.0
+        self.actors_count = np.diff(self.actors_matrix.indptr).astype(np.float64)
+
+        self.director_to_id = catalog.directors.ids
+        self.director_ids = catalog.director_codes.astype(np.int64)
+
+    def actors_jaccard(self, user_actors: list[str], rows: np.ndarray | None = None) -> np.ndarray:
+        """
+        Индекс Жаккара по актёрам для всех фильмов (или только для строк rows).
+        Пересечение — одно умножение матрицы на индикатор актёров пользователя,
+        объединение — |актёры фильма| + |актёры пользователя| - пересечение.
+        """
+        user_set = set(user_actors)
+        user_ids = ids_of(self.actor_to_id, user_set)
+        user_vec = np.zeros(self.actors_matrix.shape[1], dtype=np.float64)
+        # пул актёров мог пополниться после построения индекса — таких столбцов в матрице нет
+        user_vec[user_ids[user_ids < len(user_vec)]] = 1.0
+        matrix = self.actors_matrix if rows is None else self.actors_matrix[rows]
+        counts = self.actors_count if rows is None else self.actors_count[rows]
+        intersection = matrix @ user_vec
+        union = counts + len(user_set) - intersection
+        return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+    def director_match(self, user_directors: list[str], rows: np.ndarray | None = None) -> np.ndarray:
+        """1.0, если режиссёр фильма входит в список любимых, иначе 0.0."""
+        director_ids = self.director_ids if rows is None else self.director_ids[rows]
+        return np.isin(director_ids, ids_of(self.director_to_id, user_directors)).astype(np.float64)
+
+    def actors_jaccard_pairs(self, user_actors: list[list[str]], owner: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        actors_jaccard сразу для многих пользователей: j-я пара — пользователь owner[j] и фильм rows[j].
+        Пересечение — поэлементное произведение строк фильмов на строки индикаторов пользователей.
+        """
+        n_cols = self.actors_matrix.shape[1]
+        user_sets = [set(actors) for actors in user_actors]
+        user_ids = []
+        for user_set in user_sets:
+            ids = ids_of(self.actor_to_id, user_set)
+            user_ids.append(np.sort(ids[ids < n_cols]))
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in user_ids], out=indptr[1:])
+        indices = np.concatenate(user_ids) if user_ids else np.zeros(0, dtype=np.int64)
+        users = csr_matrix((np.ones(len(indices), dtype=np.float64), indices, indptr), shape=(len(user_ids), n_cols))
+
+        intersection = np.asarray(self.actors_matrix[rows].multiply(users[owner]).sum(axis=1)).ravel()
+        sizes = np.array([len(user_set) for user_set in user_sets], dtype=np.int64)
+        union = self.actors_count[rows] + sizes[owner] - intersection
+        return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+    def director_match_pairs(self, user_directors: list[list[str]], owner: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """director_match сразу для многих пользователей (пары owner[j], rows[j])."""
+        # пара (пользователь, режиссёр) кодируется одним числом
+        n = max(len(self.director_to_id), int(self.director_ids.max(initial=-1)) + 1) + 1
+        user_keys = [u * n + ids_of(self.director_to_id, directors) for u, directors in enumerate(user_directors)]
+        user_keys = np.concatenate(user_keys) if user_keys else np.zeros(0, dtype=np.int64)
+        return np.isin(owner * n + self.director_ids[rows], user_keys).astype(np.float64)
+
+
+class CatalogMemo:
+    """
+    Объекты, которые строятся один раз на каталог фильмов (индекс людей, модели v1 и v2):
+    get(films) возвращает build(films), построенный для этого же каталога, или строит новый.
+    FilmCatalog не меняется на месте, поэтому узнаётся по самому объекту и держится слабой
+    ссылкой: построенное живёт, пока жив каталог, и освобождается вместе с ним (модель,
+    выведенная из работы после перезагрузки, не остаётся в памяти из-за кэша).
+    Список фильмов — по содержимому: те же объекты Film в том же порядке (замена, вставка
+    или удаление фильма в том же списке дают новую модель; правка полей самого Film не
+    отслеживается); списков помнится не больше size, самые давние вытесняются.
+    """
+
+    def __init__(self, build, size: int = 4):
+        self.build = build
+        self.size = size
+        self._catalogs: weakref.WeakKeyDictionary[FilmCatalog, object] = weakref.WeakKeyDictionary()
+        self._lists: list[tuple[list[Film], object]] = []
+
+    def get(self, films: list[Film] | FilmCatalog):
+        if isinstance(films, FilmCatalog):
+            value = self._catalogs.get(films)
+            if value is None:
+                value = self._catalogs[films] = self.build(films)
+            return value
+        for key, value in self._lists:
+            if len(key) == len(films) and all(a is b for a, b in zip(key, films)):
+                return value
+        value = self.build(films)
+        # список копируется: изменения исходного списка не должны менять ключ
+        self._lists.append((list(films), value))
+        if len(self._lists) > self.size:
+            self._lists.pop(0)
+        return value
+
+
+_people_indexes = CatalogMemo(PeopleIndex)
+
+def people_index_for(films: list[Film]) -> PeopleIndex:
+    """Индекс людей для каталога; для одного и того же каталога строится один раз (CatalogMemo)."""
+    return _people_indexes.get(films)
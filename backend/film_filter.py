@@ -0,0 +1,99 @@
+"""
+Фильтры рекомендаций: «только после 2000», «только из США», «рейтинг от 8».
+
+FilmFilter — сами условия, FilterIndex — индексы каталога, по которым они проверяются
+без перебора фильмов:
+- годы и рейтинги — отсортированные массивы (значение + номер строки), диапазон —
+  два np.searchsorted и срез; фильмы без года/рейтинга (0) в диапазоны не попадают
+- страны — битовые множества фильмов (np.packbits, бит на фильм) по каждой стране;
+  несколько стран — OR множеств, страна сравнивается без учёта регистра
+Результат — маска строк каталога; по ней v3 сужает каталог ещё до отбора кандидатов по описанию.
+"""
+
+import numpy as np
+
+from films_model import FilmCatalog
+
+
+class FilmFilter:
+    """
+    Условия на рекомендуемые фильмы. Границы включительные, None — без границы;
+    countries — фильм снят хотя бы в одной из этих стран.
+    """
+
+    def __init__(self, year_from: int | None = None, year_to: int | None = None,
+                 rating_from: float | None = None, rating_to: float | None = None,
+                 countries: list[str] | None = None):
+        self.year_from = year_from
+        self.year_to = year_to
+        self.rating_from = rating_from
+        self.rating_to = rating_to
+        self.countries = sorted({country.strip().lower() for country in countries}) if countries else None
+
+    def is_empty(self) -> bool:
+        return (self.year_from is None and self.year_to is None and self.rating_from is None
+                and self.rating_to is None and self.countries is None)
+
+    def key(self) -> str:
+        """Строка условий для ключа кэша ответов ("" — фильтра нет)."""
+        if self.is_empty():
+            return ""
+        parts = [self.year_from, self.year_to, self.rating_from, self.rating_to]
+        return "|".join("" if value is None else str(value) for value in parts) + "|" + ",".join(self.countries or [])
+
+
+class FilterIndex:
+    """Индексы каталога для FilmFilter; строятся один раз на каталог."""
+
+    def __init__(self, films: FilmCatalog):
+        self.n = len(films)
+        self.year_rows, self.year_values = self._sorted(np.asarray(films.years))
+        self.rating_rows, self.rating_values = self._sorted(np.asarray(films.ratings))
+
+        # страна -> битовое множество фильмов; названия разного регистра — одна страна
+        codes = np.asarray(films.country_codes)
+        order = np.argsort(codes, kind="stable")
+        film_of = np.repeat(np.arange(self.n), np.diff(films.country_offsets))[order]
+        bounds = np.zeros(len(films.countries) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(films.countries)), out=bounds[1:])
+        self.country_bits: dict[str, np.ndarray] = {}
+        for code, name in enumerate(films.countries.names):
+            if bounds[code] == bounds[code + 1]:
+                continue
+            mask = np.zeros(self.n, dtype=bool)
+            mask[film_of[bounds[code]:bounds[code + 1]]] = True
+            key = name.strip().lower()
+            bits = np.packbits(mask)
+            if key in self.country_bits:
+                bits |= self.country_bits[key]
+            self.country_bits[key] = bits
+
+    @staticmethod
+    def _sorted(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Номера строк с известным значением (не 0) по возрастанию значения и сами значения."""
+        rows = np.flatnonzero(values != 0)
+        order = rows[np.argsort(values[rows], kind="stable")]
+        return order, values[order]
+
+    def _range(self, rows: np.ndarray, values: np.ndarray, low, high) -> np.ndarray:
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        end = len(values) if high is None else np.searchsorted(values, high, side="right")
+        mask = np.zeros(self.n, dtype=bool)
+        mask[rows[start:end]] = True
+        return mask
+
+    def mask(self, film_filter: FilmFilter) -> np.ndarray:
+        """Маска строк каталога, подходящих под film_filter."""
+        mask = np.ones(self.n, dtype=bool)
+        if film_filter.year_from is not None or film_filter.year_to is not None:
+            mask &= self._range(self.year_rows, self.year_values, film_filter.year_from, film_filter.year_to)
+        if film_filter.rating_from is not None or film_filter.rating_to is not None:
+            mask &= self._range(self.rating_rows, self.rating_values, film_filter.rating_from, film_filter.rating_to)
+        if film_filter.countries is not None:
+            bits = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+            for country in film_filter.countries:
+                country_bits = self.country_bits.get(country)
+                if country_bits is not None:
+                    bits |= country_bits
+            mask &= np.unpackbits(bits, count=self.n).astype(bool)
+        return mask
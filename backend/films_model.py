@@ -1,4 +1,12 @@
+import sys
+from collections.abc import Iterable, Iterator, Sequence
+
+import numpy as np
+
+
 class Film:
+    __slots__ = ("title", "year", "country", "actors", "rating", "director", "description")
+
     def __init__(
         self,
         title: str,
@@ -18,3 +26,244 @@ class Film:
         self.description = description
 
 
+def pack_strings(values: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Упаковывает строки в один массив байт UTF-8 и массив смещений длины len(values)+1."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> list[str]:
+    """Обратное к pack_strings."""
+    raw = blob.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+class StringPool:
+    """Словарь строк: каждая разная строка хранится один раз (интернирована), фильмы ссылаются на номер."""
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names: list[str] = [sys.intern(name) for name in names]
+        self.ids: dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+    def code(self, name: str) -> int:
+        """Номер строки (новая строка добавляется в конец)."""
+        code = self.ids.get(name)
+        if code is None:
+            code = len(self.names)
+            name = sys.intern(name)
+            self.names.append(name)
+            self.ids[name] = code
+        return code
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class FilmCatalogBuilder:
+    """
+    Собирает FilmCatalog по частям: фильмами или целыми колонками (например, кусками CSV).
+    Пулы строк общие для всех частей, так что номера режиссёров/стран/актёров сквозные.
+    """
+
+    def __init__(self, directors: StringPool | None = None, countries: StringPool | None = None,
+                 actors: StringPool | None = None):
+        self.titles: list[str] = []
+        self.years: list[np.ndarray] = []
+        self.ratings: list[np.ndarray] = []
+        # пулы можно передать от существующего каталога — тогда номера строк с ним совпадут
+        self.directors = directors if directors is not None else StringPool()
+        self.countries = countries if countries is not None else StringPool()
+        self.actors = actors if actors is not None else StringPool()
+        self.director_codes: list[np.ndarray] = []
+        self.descriptions: list[bytes] = []
+        self.country_codes: list[np.ndarray] = []
+        self.country_counts: list[np.ndarray] = []
+        self.actor_codes: list[np.ndarray] = []
+        self.actor_counts: list[np.ndarray] = []
+
+    @staticmethod
+    def _codes(pool: StringPool, values: list[str]) -> np.ndarray:
+        """Номера строк в пуле (новые строки добавляются в пул)."""
+        ids = pool.ids
+        return np.fromiter((ids[v] if v in ids else pool.code(v) for v in values), dtype=np.int32, count=len(values))
+
+    def add_columns(self, titles: list[str], years, ratings, directors: list[str], descriptions: list[str],
+                    country_flat: list[str], country_counts, actor_flat: list[str], actor_counts):
+        """
+        Добавляет кусок каталога колонками.
+        Списки стран и актёров передаются плоско + сколько элементов у каждого фильма.
+        """
+        self.titles.extend(sys.intern(t) for t in titles)
+        self.years.append(np.asarray(years, dtype=np.int32))
+        self.ratings.append(np.asarray(ratings, dtype=np.float64))
+        self.director_codes.append(self._codes(self.directors, directors))
+        self.descriptions.extend(d.encode("utf-8") for d in descriptions)
+        self.country_codes.append(self._codes(self.countries, country_flat))
+        self.country_counts.append(np.asarray(country_counts, dtype=np.int64))
+        self.actor_codes.append(self._codes(self.actors, actor_flat))
+        self.actor_counts.append(np.asarray(actor_counts, dtype=np.int64))
+
+    def add_films(self, films: Iterable[Film]):
+        films = list(films)
+        self.add_columns(
+            titles=[film.title for film in films],
+            years=[film.year for film in films],
+            ratings=[film.rating for film in films],
+            directors=[film.director for film in films],
+            descriptions=[film.description for film in films],
+            country_flat=[c for film in films for c in film.country],
+            country_counts=[len(film.country) for film in films],
+            actor_flat=[a for film in films for a in film.actors],
+            actor_counts=[len(film.actors) for film in films],
+        )
+
+    @staticmethod
+    def _concat(parts: list[np.ndarray], dtype) -> np.ndarray:
+        return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+
+    @staticmethod
+    def _offsets(counts: list[np.ndarray]) -> np.ndarray:
+        flat = FilmCatalogBuilder._concat(counts, np.int64)
+        offsets = np.zeros(len(flat) + 1, dtype=np.int64)
+        np.cumsum(flat, out=offsets[1:])
+        return offsets
+
+    def build(self) -> "FilmCatalog":
+        description_offsets = np.zeros(len(self.descriptions) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in self.descriptions], out=description_offsets[1:])
+        return FilmCatalog(
+            titles=self.titles,
+            years=self._concat(self.years, np.int32),
+            ratings=self._concat(self.ratings, np.float64),
+            directors=self.directors,
+            director_codes=self._concat(self.director_codes, np.int32),
+            description_bytes=np.frombuffer(b"".join(self.descriptions), dtype=np.uint8),
+            description_offsets=description_offsets,
+            countries=self.countries,
+            country_codes=self._concat(self.country_codes, np.int32),
+            country_offsets=self._offsets(self.country_counts),
+            actors=self.actors,
+            actor_codes=self._concat(self.actor_codes, np.int32),
+            actor_offsets=self._offsets(self.actor_counts),
+        )
+
+
+class FilmCatalog(Sequence):
+    """
+    Каталог фильмов в колоночном виде (struct of arrays) вместо списка объектов Film.
+    - titles — список названий (интернированные строки)
+    - years, ratings — массивы NumPy
+    - director_codes — номер режиссёра в пуле directors
+    - description_bytes + description_offsets — все описания одним массивом байт UTF-8
+    - country_codes/country_offsets, actor_codes/actor_offsets — списки стран и актёров
+      как плоские массивы номеров в пулах countries/actors + смещения по фильмам
+    Одинаковые строки (режиссёры, страны, актёры) хранятся один раз.
+    catalog[i] отдаёт лёгкий объект Film, собранный из колонок, — для API и старого кода.
+    """
+
+    def __init__(self, titles: list[str], years: np.ndarray, ratings: np.ndarray,
+                 directors: StringPool, director_codes: np.ndarray,
+                 description_bytes: np.ndarray, description_offsets: np.ndarray,
+                 countries: StringPool, country_codes: np.ndarray, country_offsets: np.ndarray,
+                 actors: StringPool, actor_codes: np.ndarray, actor_offsets: np.ndarray):
+        self.titles = titles
+        self.years = years
+        self.ratings = ratings
+        self.directors = directors
+        self.director_codes = director_codes
+        self.description_bytes = description_bytes
+        self.description_offsets = description_offsets
+        self.countries = countries
+        self.country_codes = country_codes
+        self.country_offsets = country_offsets
+        self.actors = actors
+        self.actor_codes = actor_codes
+        self.actor_offsets = actor_offsets
+
+    @classmethod
+    def from_films(cls, films: Iterable[Film]) -> "FilmCatalog":
+        """Собирает каталог из обычных объектов Film."""
+        builder = FilmCatalogBuilder()
+        builder.add_films(films)
+        return builder.build()
+
+    def extended(self, films: Iterable[Film]) -> "FilmCatalog":
+        """
+        Новый каталог = этот + films в конце. Номера старых фильмов не меняются.
+        Пулы строк общие (они только дополняются), колонки копируются.
+        """
+        builder = FilmCatalogBuilder(self.directors, self.countries, self.actors)
+        builder.add_films(films)
+        tail = builder.build()
+        return FilmCatalog(
+            titles=self.titles + tail.titles,
+            years=np.concatenate([self.years, tail.years]),
+            ratings=np.concatenate([self.ratings, tail.ratings]),
+            directors=self.directors,
+            director_codes=np.concatenate([self.director_codes, tail.director_codes]),
+            description_bytes=np.concatenate([self.description_bytes, tail.description_bytes]),
+            description_offsets=np.concatenate(
+                [self.description_offsets[:-1], tail.description_offsets + self.description_offsets[-1]]),
+            countries=self.countries,
+            country_codes=np.concatenate([self.country_codes, tail.country_codes]),
+            country_offsets=np.concatenate(
+                [self.country_offsets[:-1], tail.country_offsets + self.country_offsets[-1]]),
+            actors=self.actors,
+            actor_codes=np.concatenate([self.actor_codes, tail.actor_codes]),
+            actor_offsets=np.concatenate(
+                [self.actor_offsets[:-1], tail.actor_offsets + self.actor_offsets[-1]]),
+        )
+
+    def take(self, indices: Iterable[int]) -> "FilmCatalog":
+        """Новый каталог только из фильмов с номерами indices (в этом порядке)."""
+        return FilmCatalog.from_films(self.film(i) for i in indices)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.film(i) for i in range(*index.indices(len(self)))]
+        return self.film(index)
+
+    def __iter__(self) -> Iterator[Film]:
+        for i in range(len(self)):
+            yield self.film(i)
+
+    def film(self, i: int) -> Film:
+        """Объект Film для i-го фильма (строки не копируются, берутся из пулов)."""
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("film index out of range")
+        return Film(
+            title=self.titles[i],
+            year=int(self.years[i]),
+            country=self.country_list(i),
+            actors=self.actor_list(i),
+            rating=float(self.ratings[i]),
+            director=self.directors.names[self.director_codes[i]],
+            description=self.description(i),
+        )
+
+    def description(self, i: int) -> str:
+        start, end = self.description_offsets[i], self.description_offsets[i + 1]
+        return self.description_bytes[start:end].tobytes().decode("utf-8")
+
+    def descriptions(self) -> Iterator[str]:
+        """Все описания по порядку (декодируются по одному — для обучения TF-IDF)."""
+        for i in range(len(self)):
+            yield self.description(i)
+
+    def country_list(self, i: int) -> list[str]:
+        names = self.countries.names
+        return [names[c] for c in self.country_codes[self.country_offsets[i]:self.country_offsets[i + 1]].tolist()]
+
+    def actor_list(self, i: int) -> list[str]:
+        names = self.actors.names
+        return [names[c] for c in self.actor_codes[self.actor_offsets[i]:self.actor_offsets[i + 1]].tolist()]
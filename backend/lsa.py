@@ -0,0 +1,134 @@
+"""
+Плотные эмбеддинги описаний (LSA) для этапа отбора кандидатов по описанию.
+
+Вместо разреженной tfidf_matrix (столбец на каждое слово словаря) фильмы хранятся
+плотной матрицей float32 N×dim: TF-IDF сжимается через TruncatedSVD до dim измерений
+(по умолчанию 256), строки нормируются (L2). Косинус пользователя со всеми фильмами —
+одно произведение матрицы на вектор (BLAS), для пачки пользователей — матрицы на матрицу.
+Включается DESC_SPACE=lsa в recommend_v3. Рекомендации немного отличаются от TF-IDF —
+насколько, показывает python compact_report.py --lsa-dim 256.
+
+Эмбеддинги лучше собрать заранее (иначе SVD обучается при каждом старте)
+
+    python lsa.py [папка] [dim]
+
+В папке: manifest.json (версия модели TF-IDF и dim), vectors.npy (N×dim) и components.npy
+(dim×число слов — базис SVD, по нему переводятся описания фильмов, добавленных на лету).
+Массивы грузятся через np.load(mmap_mode="r"). Как и таблица соседей, эмбеддинги привязаны
+к версии модели: для другой tfidf_matrix или другого LSA_DIM они не подгружаются.
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.decomposition import TruncatedSVD
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+LSA_SEED = 0
+PROJECT_CHUNK = 65536   # сколько строк TF-IDF проецировать за раз (промежуточный результат — float64)
+
+
+def project(tfidf_rows: csr_matrix, components: np.ndarray) -> np.ndarray:
+    """Эмбеддинги строк TF-IDF: проекция на базис SVD (как TruncatedSVD.transform) и нормировка."""
+    vectors = np.empty((tfidf_rows.shape[0], components.shape[0]), dtype=np.float32)
+    for start in range(0, tfidf_rows.shape[0], PROJECT_CHUNK):
+        chunk = np.asarray(tfidf_rows[start:start + PROJECT_CHUNK] @ components.T)
+        vectors[start:start + len(chunk)] = normalize(chunk)
+    return vectors
+
+
+class LSAEmbedding:
+    """
+    vectors — эмбеддинги фильмов N×dim (float32, строки нормированы);
+    components — базис SVD dim×число слов; version — версия модели TF-IDF, по которой обучен.
+    """
+
+    def __init__(self, vectors: np.ndarray, components: np.ndarray, version: str):
+        self.vectors = vectors
+        self.components = components
+        self.version = version
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def transform(self, tfidf_rows: csr_matrix) -> np.ndarray:
+        """Эмбеддинги новых строк TF-IDF."""
+        return project(tfidf_rows, self.components)
+
+    def extended(self, new_vectors: np.ndarray) -> "LSAEmbedding":
+        """Эмбеддинги с дописанными в конец строками new_vectors (базис тот же)."""
+        return LSAEmbedding(np.concatenate([self.vectors, new_vectors]), self.components, self.version)
+
+
+def lsa_dim(shape: tuple[int, int], dim: int) -> int:
+    """Сколько измерений получится у эмбеддингов матрицы shape: SVD не даёт больше, чем строк и слов минус один."""
+    n_rows, n_terms = shape
+    return max(1, min(dim, n_terms - 1, n_rows - 1))
+
+
+def fit_lsa(tfidf_matrix: csr_matrix, dim: int, version: str = "", seed: int = LSA_SEED) -> LSAEmbedding:
+    """Обучает TruncatedSVD по tfidf_matrix и считает эмбеддинги всех фильмов."""
+    svd = TruncatedSVD(n_components=lsa_dim(tfidf_matrix.shape, dim), random_state=seed)
+    components = svd.fit(tfidf_matrix).components_.astype(np.float32)
+    return LSAEmbedding(project(tfidf_matrix, components), components, version)
+
+
+def description_similarity(user_vecs, matrix) -> np.ndarray:
+    """
+    Косинус векторов пользователей (строки user_vecs) со строками matrix.
+    matrix — tfidf_matrix (cosine_similarity, как раньше) или эмбеддинги LSA: их строки
+    уже нормированы, поэтому косинус — одно произведение на нормированные векторы пользователей.
+    """
+    if isinstance(matrix, np.ndarray):
+        return normalize(user_vecs) @ matrix.T
+    return cosine_similarity(user_vecs, matrix)
+
+
+def save_lsa(path: str, embedding: LSAEmbedding):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "vectors.npy"), embedding.vectors)
+    np.save(os.path.join(path, "components.npy"), embedding.components)
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"format_version": FORMAT_VERSION, "model_version": embedding.version,
+                   "n_rows": embedding.vectors.shape[0], "dim": embedding.dim}, f, indent=2)
+
+
+def load_lsa(path: str | None, version: str, dim: int | None = None) -> LSAEmbedding | None:
+    """
+    Эмбеддинги из папки path, если они есть и собраны для этой версии модели
+    и с dim измерениями (None — любыми); иначе None, как у устаревших эмбеддингов.
+    """
+    if not path or not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION or manifest.get("model_version") != version:
+        return None
+    if dim is not None and manifest.get("dim") != dim:
+        return None
+    return LSAEmbedding(np.load(os.path.join(path, "vectors.npy"), mmap_mode="r"),
+                        np.load(os.path.join(path, "components.npy"), mmap_mode="r"), version)
+
+
+if __name__ == "__main__":
+    # эмбеддинги считаются по TF-IDF текущей модели; сам recommend_v3 грузим без LSA и таблицы соседей
+    os.environ["DESC_SPACE"] = "tfidf"
+    os.environ["NEIGHBORS_DIR"] = ""
+    import recommend_v3
+
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else recommend_v3.LSA_DIR
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else recommend_v3.LSA_DIM
+    state = recommend_v3.current_state()
+    started = time.perf_counter()
+    embedding = fit_lsa(state.tfidf_matrix, dim, version=state.version)
+    save_lsa(out_dir, embedding)
+    print(f"Эмбеддинги LSA {embedding.vectors.shape[0]}×{embedding.dim} сохранены в {out_dir} "
+          f"за {time.perf_counter() - started:.1f} с (модель {embedding.version})")
@@ -0,0 +1,254 @@
+"""
+Метрики сервиса в текстовом формате Prometheus (отдаются на GET /metrics).
+
+Счётчики (Counter) и гистограммы (Histogram) копятся в памяти процесса; значения, которые
+и так уже считаются в других местах (кэш ответов, пул), снимаются в момент запроса
+через Sampled. Замер этапа — пара вызовов time.perf_counter() и одна запись в гистограмму
+под блокировкой (около микросекунды), поэтому по умолчанию метрики включены;
+METRICS_ENABLED=0 выключает все замеры.
+
+Этапы расчёта рекомендаций пишутся в recommend_stage_seconds{mode, stage}:
+mode — single (recommend_films) или batch (recommend_films_batch),
+stage — weights, candidates, features, sort; mode=api — этапы в app: cache (локальный кэш
+на event loop) и serialize (сборка JSON ответа).
+Время ожидания в очереди пула — scoring_queue_wait_seconds.
+
+В процессах пула (SCORING_POOL=process) замеры задачи собираются через captured() и
+возвращаются вместе с результатом, а вызывающий процесс записывает их к себе (replay) —
+так этапы расчёта попадают в его /metrics.
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+_registry: list = []
+_by_name: dict[str, object] = {}
+_capture = threading.local()   # .records — список, куда пишутся замеры внутри captured()
+
+
+@contextmanager
+def captured():
+    """Замеры в этом потоке внутри блока не пишутся в метрики, а копятся в отдаваемом списке."""
+    records: list[tuple[str, float, tuple]] = []
+    _capture.records = records
+    try:
+        yield records
+    finally:
+        _capture.records = None
+
+
+def replay(records: list[tuple[str, float, tuple]]):
+    """Записывает замеры, собранные captured() (например, в другом процессе)."""
+    for name, value, labels in records:
+        metric = _by_name[name]
+        if isinstance(metric, Counter):
+            metric.inc(*labels, value=value)
+        else:
+            metric.observe(value, *labels)
+
+
+def _captured(name: str, value: float, labels: tuple) -> bool:
+    records = getattr(_capture, "records", None)
+    if records is None:
+        return False
+    records.append((name, value, labels))
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Растущий счётчик; значения меток передаются позиционно в порядке labelnames."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+        _by_name[name] = self
+
+    def inc(self, *labels, value: float = 1.0):
+        if not METRICS_ENABLED or _captured(self.name, value, labels):
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + value
+
+    def value(self, *labels) -> float:
+        with self._lock:
+            return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}" for labels, v in items]
+        return lines
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как histogram в Prometheus)."""
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS,
+                 labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = labelnames
+        self._values: dict[tuple, list] = {}   # метки -> [счётчики корзин (последняя — +Inf), сумма, количество]
+        self._lock = threading.Lock()
+        _registry.append(self)
+        _by_name[name] = self
+
+    def observe(self, value: float, *labels):
+        if not METRICS_ENABLED or _captured(self.name, value, labels):
+            return
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(labels)
+            if item is None:
+                item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            item[0][bucket] += 1
+            item[1] += value
+            item[2] += 1
+
+    def count(self, *labels) -> int:
+        with self._lock:
+            item = self._values.get(labels)
+            return item[2] if item is not None else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total, n)) for labels, (counts, total, n) in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip((*self.buckets, float("inf")), counts):
+                cumulative += c
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Sampled:
+    """
+    Значение, которое снимается при каждом GET /metrics: fn() возвращает число
+    или словарь {значения меток (tuple): число}. kind — gauge или counter.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, fn, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.fn = fn
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def render(self) -> list[str]:
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}"
+                  for labels, v in sorted(values.items())]
+        return lines
+
+
+def render() -> str:
+    """Все зарегистрированные метрики в текстовом формате Prometheus."""
+    return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+
+
+class StageTimer:
+    """
+    Замер этапов подряд: mark(stage) записывает в histogram время с прошлой отметки
+    (или с создания таймера). labels — значения меток перед stage.
+    """
+
+    __slots__ = ("histogram", "labels", "last")
+
+    def __init__(self, histogram: Histogram, *labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, *self.labels, stage)
+        self.last = now
+
+
+# Метрики расчёта рекомендаций (пишутся в recommend_v3 и app)
+
+STAGE_SECONDS = Histogram("recommend_stage_seconds", "Время этапов расчёта рекомендаций",
+                          labelnames=("mode", "stage"))
+LIKED_FILMS = Histogram("recommend_liked_films", "Сколько любимых фильмов в профиле",
+                        buckets=SIZE_BUCKETS, labelnames=("mode",))
+CANDIDATES = Histogram("recommend_candidates", "Сколько кандидатов оценено на профиль",
+                       buckets=SIZE_BUCKETS, labelnames=("mode",))
+CANDIDATES_TOTAL = Counter("recommend_candidates_total", "Всего оценено кандидатов", ("mode",))
+BATCH_SIZE = Histogram("recommend_batch_profiles", "Профилей в одном вызове recommend_films_batch",
+                       buckets=SIZE_BUCKETS)
+QUEUE_WAIT = Histogram("scoring_queue_wait_seconds", "Сколько задача ждала свободного воркера пула")
+MICROBATCH_SIZE = Histogram("scoring_microbatch_size", "Запросов в одной пачке MicroBatcher",
+                            buckets=SIZE_BUCKETS)
+HTTP_REQUESTS = Counter("http_requests_total", "Запросы к API", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Время ответа API", labelnames=("route",))
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: число запросов и время ответа по маршрутам.
+    Маршрут — шаблон пути (/admin/films/{title}), чтобы меток не было по одной на каждое название;
+    запросы мимо маршрутов считаются как "other".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "other")
+            HTTP_REQUESTS.inc(scope["method"], route, str(status))
+            HTTP_LATENCY.observe(time.perf_counter() - started, route)
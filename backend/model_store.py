@@ -0,0 +1,234 @@
+"""
+Сохранение и загрузка модели v3 в виде артефакта на диске.
+
+Вместо того чтобы при каждом старте воркера заново читать CSV и обучать TfidfVectorizer,
+модель один раз собирается командой
+
+    python model_store.py [путь_к_csv] [папка_артефакта]
+
+и дальше грузится через np.load(mmap_mode="r"): массивы не копируются в память процесса,
+а отображаются из файлов, поэтому несколько воркеров делят одни и те же страницы
+через page cache ОС.
+
+Что лежит в папке артефакта:
+- manifest.json — версия формата, версия модели, размеры, параметры векторайзера
+  (и top_terms компактной модели, см. TFIDF_* в recommend_v3)
+- tfidf_data / tfidf_indices / tfidf_indptr — CSR массивы tfidf_matrix
+- idf и terms — IDF и словарь векторайзера (terms[i] — слово i-го столбца)
+- колонки каталога FilmCatalog как есть: year, rating, коды режиссёров/стран/актёров
+  со смещениями, описания одним массивом байт; строки (названия и пулы имён)
+  упакованы в массив байт UTF-8 + смещения
+TITLE_TO_IDX отдельно не хранится: он однозначно восстанавливается из колонки title.
+Описания после загрузки так и остаются отображёнными из файла.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from films_model import FilmCatalog, StringPool, pack_strings, unpack_strings
+from tokenizer import ANALYZER_NAME, make_vectorizer, tfidf_tokens
+
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+
+
+def vectorizer_params(vectorizer: TfidfVectorizer) -> dict:
+    """
+    Параметры векторайзера, которые можно записать в JSON (callables пропускаются).
+    Анализатор tokenizer.tfidf_tokens записывается по имени ANALYZER_NAME, dtype — по имени типа.
+    """
+    simple = (str, int, float, bool, type(None), list, tuple)
+    params = {}
+    for key, value in vectorizer.get_params().items():
+        if key == "analyzer" and value is tfidf_tokens:
+            params[key] = ANALYZER_NAME
+        if key == "dtype":
+            params[key] = np.dtype(value).name
+        if key == "vocabulary" or not isinstance(value, simple):
+            continue
+        params[key] = list(value) if isinstance(value, tuple) else value
+    return params
+
+
+def vectorizer_from_params(params: dict, vocabulary: dict[str, int]) -> TfidfVectorizer:
+    """
+    Векторайзер по параметрам из manifest. Артефакты, собранные до tokenizer.py
+    (analyzer="word" и список stop_words), собираются как раньше.
+    """
+    params = dict(params)
+    if "dtype" in params:
+        params["dtype"] = np.dtype(params["dtype"]).type
+    if "ngram_range" in params:
+        params["ngram_range"] = tuple(params["ngram_range"])
+    if params.get("analyzer") == ANALYZER_NAME:
+        del params["analyzer"]
+        return make_vectorizer(**params, vocabulary=vocabulary)
+    return TfidfVectorizer(**params, vocabulary=vocabulary)
+
+
+def model_version(arrays: dict[str, np.ndarray]) -> str:
+    """Версия модели — хэш содержимого массивов (одинаковая модель = одинаковая версия)."""
+    digest = hashlib.sha1()
+    for name in sorted(arrays):
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def catalog_arrays(films: FilmCatalog) -> dict[str, np.ndarray]:
+    """Колонки каталога в виде массивов для записи на диск."""
+    arrays = {
+        "year": films.years,
+        "rating": films.ratings,
+        "director_codes": films.director_codes,
+        "description_bytes": films.description_bytes,
+        "description_offsets": films.description_offsets,
+        "country_codes": films.country_codes,
+        "country_offsets": films.country_offsets,
+        "actor_codes": films.actor_codes,
+        "actor_offsets": films.actor_offsets,
+    }
+    for name, values in [("title", films.titles),
+                         ("directors", films.directors.names),
+                         ("countries", films.countries.names),
+                         ("actors", films.actors.names)]:
+        arrays[f"{name}_bytes"], arrays[f"{name}_offsets"] = pack_strings(values)
+    return arrays
+
+
+def catalog_from_arrays(arrays: dict[str, np.ndarray]) -> FilmCatalog:
+    """Обратное к catalog_arrays: числовые колонки и описания остаются отображёнными из файлов."""
+    return FilmCatalog(
+        titles=[sys.intern(t) for t in unpack_strings(arrays["title_bytes"], arrays["title_offsets"])],
+        years=arrays["year"],
+        ratings=arrays["rating"],
+        directors=StringPool(unpack_strings(arrays["directors_bytes"], arrays["directors_offsets"])),
+        director_codes=arrays["director_codes"],
+        description_bytes=arrays["description_bytes"],
+        description_offsets=arrays["description_offsets"],
+        countries=StringPool(unpack_strings(arrays["countries_bytes"], arrays["countries_offsets"])),
+        country_codes=arrays["country_codes"],
+        country_offsets=arrays["country_offsets"],
+        actors=StringPool(unpack_strings(arrays["actors_bytes"], arrays["actors_offsets"])),
+        actor_codes=arrays["actor_codes"],
+        actor_offsets=arrays["actor_offsets"],
+    )
+
+
+def save_model(path: str, films: FilmCatalog, vectorizer: TfidfVectorizer, tfidf_matrix: csr_matrix) -> str:
+    """
+    Записывает артефакт модели в папку path и возвращает версию модели.
+    Пишет во временную папку рядом и потом переименовывает, чтобы читатели
+    никогда не видели наполовину записанный артефакт.
+    """
+    matrix = csr_matrix(tfidf_matrix)
+    terms = [""] * len(vectorizer.vocabulary_)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+
+    arrays: dict[str, np.ndarray] = {
+        "tfidf_data": matrix.data,
+        "tfidf_indices": matrix.indices,
+        "tfidf_indptr": matrix.indptr,
+        "idf": np.asarray(vectorizer.idf_, dtype=np.float64),
+        **catalog_arrays(films),
+    }
+    arrays["terms_bytes"], arrays["terms_offsets"] = pack_strings(terms)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model_version": model_version(arrays),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "n_films": len(films),
+        "n_terms": len(terms),
+        "tfidf_shape": list(matrix.shape),
+        "vectorizer_params": vectorizer_params(vectorizer),
+        "top_terms": getattr(vectorizer, "top_terms_", None),
+    }
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".model-", dir=parent)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    with open(os.path.join(tmp_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    if os.path.exists(path):
+        old_dir = tempfile.mkdtemp(prefix=".model-old-", dir=parent)
+        os.rename(path, os.path.join(old_dir, "model"))
+        os.rename(tmp_dir, path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.rename(tmp_dir, path)
+    return manifest["model_version"]
+
+
+def has_model(path: str | None) -> bool:
+    """Есть ли в папке собранный артефакт."""
+    return bool(path) and os.path.exists(os.path.join(path, MANIFEST))
+
+
+def read_manifest(path: str) -> dict:
+    """Читает manifest.json и проверяет версию формата."""
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Артефакт {path}: формат {manifest.get('format_version')}, ожидается {FORMAT_VERSION}. "
+            "Пересоберите модель: python model_store.py"
+        )
+    return manifest
+
+
+def load_arrays(path: str) -> dict[str, np.ndarray]:
+    """Отображает все массивы артефакта в память (без копирования)."""
+    return {
+        name[:-len(".npy")]: np.load(os.path.join(path, name), mmap_mode="r")
+        for name in os.listdir(path)
+        if name.endswith(".npy")
+    }
+
+
+def load_model(path: str) -> tuple[FilmCatalog, TfidfVectorizer, csr_matrix, dict]:
+    """
+    Загружает артефакт: каталог фильмов, векторайзер (без повторного обучения),
+    tfidf_matrix поверх отображённых в память массивов и manifest.
+    """
+    manifest = read_manifest(path)
+    arrays = load_arrays(path)
+
+    tfidf_matrix = csr_matrix(
+        (arrays["tfidf_data"], arrays["tfidf_indices"], arrays["tfidf_indptr"]),
+        shape=tuple(manifest["tfidf_shape"]),
+        copy=False,
+    )
+
+    terms = unpack_strings(arrays["terms_bytes"], arrays["terms_offsets"])
+    vectorizer = vectorizer_from_params(manifest["vectorizer_params"], {t: i for i, t in enumerate(terms)})
+    vectorizer.idf_ = np.asarray(arrays["idf"])
+    vectorizer.top_terms_ = manifest.get("top_terms")
+
+    films = catalog_from_arrays(arrays)
+    return films, vectorizer, tfidf_matrix, manifest
+
+
+if __name__ == "__main__":
+    # Сборка артефакта: обучаем модель из CSV так же, как при старте v3, и сохраняем
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "data/kinopoisk-top250.csv"
+    out_dir = sys.argv[2] if len(sys.argv) > 2 else "data/model"
+    os.environ["FILMS_CSV"] = csv_path
+    os.environ["MODEL_DIR"] = ""   # не грузить старый артефакт, а обучить заново
+    import recommend_v3
+
+    version = save_model(out_dir, recommend_v3.films, recommend_v3.vectorizer, recommend_v3.tfidf_matrix)
+    print(f"Модель {version} сохранена в {out_dir}: {len(recommend_v3.films)} фильмов")
@@ -0,0 +1,146 @@
+"""
+Таблица соседей фильмов (item-item) для быстрых рекомендаций по одному-двум фильмам.
+
+Для каждого фильма заранее считаются его M ближайших по описанию фильмов
+(в том же порядке, в каком их отобрал бы top_k_by_description) и признаки каждой пары:
+косинус описаний, индекс Жаккара по актёрам, совпадение режиссёра, близость года и рейтинга.
+
+Собирается отдельной командой (после сборки модели)
+
+    python neighbors.py [папка_таблицы] [M]
+
+и хранится на диске массивами N×M (номера int32, совпадение режиссёра uint8, остальные
+признаки float64 — во float32 итоговые баллы после округления иногда расходились
+с обычным расчётом), которые грузятся через np.load(mmap_mode="r"). Таблица привязана к версии модели: если tfidf_matrix другая,
+она не подгружается.
+
+Запрос с одним фильмом превращается в чтение одной строки таблицы и взвешенную сумму.
+Запрос с двумя фильмами берёт кандидатов из объединения их списков вместо всего каталога.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from lsa import description_similarity
+from ranking import top_k_indices
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+FEATURES = {"desc": np.float64, "actors": np.float64, "director": np.uint8,
+            "year": np.float64, "rating": np.float64}   # признак -> тип хранения
+NEIGHBORS_M = 100            # по умолчанию столько же, сколько TOP_K в v3
+MAX_PROFILE = 2              # до скольких любимых фильмов отвечаем по таблице
+
+
+def matrix_version(tfidf_matrix: csr_matrix, manifest: dict | None = None) -> str:
+    """Версия модели, к которой привязана таблица: из manifest артефакта или хэш tfidf_matrix."""
+    if manifest is not None:
+        return manifest["model_version"]
+    digest = hashlib.sha1()
+    for array in (tfidf_matrix.indptr, tfidf_matrix.indices, tfidf_matrix.data):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class NeighborTable:
+    """
+    idx — N×M номера соседей по убыванию похожести описаний;
+    scores — признаки пар (FEATURES), каждый N×M.
+    """
+
+    def __init__(self, idx: np.ndarray, scores: dict[str, np.ndarray], version: str):
+        self.idx = idx
+        self.scores = scores
+        self.version = version
+
+    @property
+    def n_rows(self) -> int:
+        return self.idx.shape[0]
+
+    @property
+    def m(self) -> int:
+        return self.idx.shape[1]
+
+    def covers(self, user_indices: list[int], k: int | None) -> bool:
+        """Можно ли ответить по таблице: профиль маленький, k не больше M, все фильмы есть в таблице."""
+        return (k is not None and k <= self.m and 0 < len(user_indices) <= MAX_PROFILE
+                and all(i < self.n_rows for i in user_indices))
+
+    def lookup(self, i: int) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+        """Соседи фильма i и признаки пар (float64, как в обычном расчёте)."""
+        rows = np.asarray(self.idx[i], dtype=np.int64)
+        return rows, {name: self.scores[name][i].astype(np.float64) for name in FEATURES}
+
+    def merged(self, user_indices: list[int]) -> np.ndarray:
+        """Объединение списков соседей (по возрастанию номера)."""
+        return np.unique(np.concatenate([self.idx[i] for i in user_indices])).astype(np.int64)
+
+
+def build_neighbors(tfidf_matrix: csr_matrix, features, films, m: int = NEIGHBORS_M,
+                    version: str = "", chunk_rows: int | None = None) -> NeighborTable:
+    """
+    Считает таблицу соседей. features — CatalogFeatures из v3, films — каталог той же модели.
+    tfidf_matrix — матрица, по которой модель отбирает по описанию (state.desc_matrix: TF-IDF или эмбеддинги LSA).
+    Похожести считаются кусками по chunk_rows строк, чтобы плотный кусок N×chunk влезал в память.
+    """
+    n = tfidf_matrix.shape[0]
+    m = min(m, n)
+    chunk_rows = chunk_rows or max(1, min(1024, 2 ** 25 // max(n, 1)))
+    idx = np.zeros((n, m), dtype=np.int32)
+    scores = {name: np.zeros((n, m), dtype=dtype) for name, dtype in FEATURES.items()}
+
+    for start in range(0, n, chunk_rows):
+        sims = description_similarity(tfidf_matrix[start:start + chunk_rows], tfidf_matrix)
+        for offset, row_sims in enumerate(sims):
+            i = start + offset
+            rows = top_k_indices(row_sims, m)
+            idx[i] = rows
+            scores["desc"][i] = row_sims[rows]
+            scores["actors"][i] = features.actors_scores(films.actor_list(i), rows)
+            scores["director"][i] = features.director_scores([films.directors.names[films.director_codes[i]]], rows)
+            scores["year"][i] = features.years_scores([int(films.years[i])], rows)
+            scores["rating"][i] = features.ratings_scores([float(films.ratings[i])], rows)
+    return NeighborTable(idx, scores, version)
+
+
+def save_neighbors(path: str, table: NeighborTable):
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "idx.npy"), table.idx)
+    for name in FEATURES:
+        np.save(os.path.join(path, f"{name}.npy"), table.scores[name])
+    with open(os.path.join(path, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump({"format_version": FORMAT_VERSION, "model_version": table.version,
+                   "n_rows": table.n_rows, "m": table.m}, f, indent=2)
+
+
+def load_neighbors(path: str | None, version: str) -> NeighborTable | None:
+    """Таблица из папки path, если она есть и собрана для этой версии модели (matrix_version); иначе None."""
+    if not path or not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+    with open(os.path.join(path, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION or manifest.get("model_version") != version:
+        return None
+    idx = np.load(os.path.join(path, "idx.npy"), mmap_mode="r")
+    scores = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in FEATURES}
+    return NeighborTable(idx, scores, version)
+
+
+if __name__ == "__main__":
+    os.environ["NEIGHBORS_DIR"] = ""   # старую таблицу не грузим — строим заново
+    import recommend_v3
+
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else "data/neighbors"
+    m = int(sys.argv[2]) if len(sys.argv) > 2 else NEIGHBORS_M
+    state = recommend_v3.current_state()
+    started = time.perf_counter()
+    table = build_neighbors(state.desc_matrix, state.features, state.films, m, version=state.version)
+    save_neighbors(out_dir, table)
+    print(f"Таблица соседей {table.n_rows}×{table.m} сохранена в {out_dir} "
+          f"за {time.perf_counter() - started:.1f} с (модель {table.version})")
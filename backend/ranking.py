@@ -0,0 +1,82 @@
+"""
+Общие функции ранжирования для v3: отбор топ-k и округление баллов.
+"""
+
+import heapq
+
+import numpy as np
+
+
+def top_k_indices(scores: np.ndarray, k: int | None) -> np.ndarray:
+    """
+    Индексы k наибольших значений, по убыванию.
+    Порядок как у устойчивой сортировки: при равных значениях меньший индекс раньше.
+    Через argpartition выбираются k победителей, сортируются только они.
+    k=None — отсортировать весь массив.
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    kth = -np.partition(-scores, k - 1)[k - 1]
+    # всё, что строго больше k-го значения, плюс равные ему — с наименьшими индексами
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[: k - len(above)]
+    chosen = np.concatenate([above, ties])
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def top_k_rows(scores: np.ndarray, k: int | None) -> np.ndarray:
+    """
+    top_k_indices для каждой строки матрицы scores сразу: массив (строк, k) индексов столбцов.
+    Порядок тот же: по убыванию, при равных значениях меньший индекс раньше.
+    """
+    n_rows, n = scores.shape
+    if k is None or k >= n:
+        return np.argsort(-scores, axis=1, kind="stable")
+    if k <= 0:
+        return np.empty((n_rows, 0), dtype=np.int64)
+    kth = -np.partition(-scores, k - 1, axis=1)[:, k - 1:k]
+    above = scores > kth
+    ties = scores == kth
+    # из равных k-му значению берём столько первых, сколько не хватает до k
+    need = k - above.sum(axis=1, keepdims=True)
+    chosen = above | (ties & (np.cumsum(ties, axis=1) <= need))
+    cols = np.nonzero(chosen)[1].reshape(n_rows, k)
+    values = np.take_along_axis(scores, cols, axis=1)
+    order = np.argsort(-values, axis=1, kind="stable")
+    return np.take_along_axis(cols, order, axis=1)
+
+
+def top_k_streaming(chunks, k: int) -> np.ndarray:
+    """
+    Потоковый вариант top_k_indices: похожести приходят кусками (start, sims_chunk).
+    В каждом куске отбираются его top-k, затем они проходят через min-кучу размера k.
+    Результат совпадает с top_k_indices по всему массиву.
+    """
+    heap: list[tuple[float, int]] = []   # (значение, -индекс): в корне худший кандидат
+    for start, chunk in chunks:
+        for i in top_k_indices(chunk, k).tolist():
+            item = (float(chunk[i]), -(start + i))
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    heap.sort(reverse=True)
+    return np.array([-neg_idx for _, neg_idx in heap], dtype=np.int64)
+
+
+def round_scores(scores: np.ndarray, ndigits: int = 3) -> np.ndarray:
+    """
+    Округление как у встроенного round().
+    np.round умножает на 10**ndigits, поэтому рядом с половинкой может
+    ошибиться на последнем знаке — такие значения досчитываем через round().
+    """
+    scale = 10.0 ** ndigits
+    scaled = scores * scale
+    rounded = np.round(scaled) / scale
+    frac = np.abs(scaled - np.floor(scaled) - 0.5)
+    for i in np.flatnonzero(frac < 1e-6):
+        rounded[i] = round(float(scores[i]), ndigits)
+    return rounded
@@ -7,13 +7,17 @@
 - сравнение идёт через косинусную близость.
 Остальные признаки считаются проще - по индексу Жаккара или просто по среднему
 
++ словарь и ключевые слова фильмов считаются один раз на каталог (BowModel), а не на каждый запрос;
+  косинус — по пересечению слов пользователя и фильма. Произведения и квадраты здесь целые,
+  поэтому баллы точно те же, что по спискам длины vocab_size
 """
 
 from films_model import Film
 from math import sqrt
-from data_loader import load_films_from_csv
+from data_loader import CatalogMemo, load_catalog, people_index_for
+import tokenizer
 
-films = load_films_from_csv("data/kinopoisk-top250.csv")
+films = load_catalog("data/kinopoisk-top250.csv")
 
 def compare_actors(user_actors: list[str], film_actors: list[str]) -> float:     
     """
@@ -61,42 +65,12 @@ def compare_years(user_years: list[int], film_year: int) -> float:
     return score
 
 
-#Ниже - стоп-слова и стоп-символы для построения словаря
-  
-stop_words = [
-    "и", "в", "во", "не", "что", "он", "на", "я", "с", "со", "как", "а",
-    "то", "все", "она", "так", "его", "но", "да", "ты", "к", "у", "же",
-    "вы", "за", "бы", "по", "только", "ее", "мне", "было", "вот",
-    "от", "меня", "еще", "нет", "о", "из", "ему", "теперь", "когда",
-    "даже", "ну", "вдруг", "ли", "если", "уже", "или", "ни", "быть",
-    "был", "него", "до", "вас", "нибудь", "опять", "уж", "вам", "ведь",
-    "там", "потом", "себя", "ничего", "ей", "может", "они", "тут",
-    "где", "есть", "надо", "ней", "для", "мы", "тебя", "их", "чем",
-    "была", "сам", "чтоб", "без", "будто", "чего", "раз", "тоже",
-    "себе", "под", "будет", "ж", "тогда", "кто", "этот"
-]
-
-stop_symbols = [                                                                                    
-    ".", ",", "!", "?", ":", ";", "-", "—", "(", ")", "[", "]", "{", "}",                    
-    "\"", "'", "«", "»", "…", "/", "\\", "|", "@", "#", "$", "%", "^", "&", 
-    "*", "_", "+", "=", "<", ">", "~", "`"
-]
-
-
 def extract_keywords(description: str) -> set[str]:    
     """
     Берет описание фильма, очищает от знаков и стоп-слов.
     На выходе — множество ключевых слов.
     """                                             
-    description = description.lower()
-    for symbol in stop_symbols:
-        description = description.replace(symbol, "")
-    
-    words = description.split()
-
-    keywords = [word for word in words if word not in stop_words]
-    
-    return set(keywords)
+    return set(tokenizer.keywords(description))
 
 
 def build_vocab(films: list[Film]) -> dict[str, int]:    
@@ -104,11 +78,11 @@ def build_vocab(films: list[Film]) -> dict[str, int]:
     Собирает словарь из всех уникальных слов в описаниях фильмов.
     Каждому слову присваивает свой индекс.
     """                                                                         
-    my_dict = set()
+    my_dict = {}
     for f in films:
-        key_words = extract_keywords(f.description)
-        my_dict = my_dict | set(key_words)
-    my_dict = {value: index for index, value in enumerate(my_dict)}
+        for word in extract_keywords(f.description):
+            if word not in my_dict:
+                my_dict[word] = len(my_dict)
     return my_dict
 
 
@@ -198,14 +172,61 @@ def compare_description(user_vec_dict: dict[int, int], film: Film, vocab: dict[s
     return round((cos_sim), 3)
 
 
+class BowModel:
+    """
+    Bag of words по каталогу, посчитанный один раз:
+    - vocab — как у build_vocab (номера в порядке первого появления слова)
+    - norms — длина вектора каждого фильма: слова фильма — множество, все счётчики равны 1,
+      поэтому длина — корень из числа его слов
+    - postings — для каждого слова номера фильмов, где оно есть
+    """
+
+    def __init__(self, films: list[Film]):
+        keywords = [extract_keywords(film.description) for film in films]
+        self.vocab: dict[str, int] = {}
+        self.postings: list[list[int]] = []
+        self.norms: list[float] = []
+        for i, words in enumerate(keywords):
+            for word in words:
+                word_id = self.vocab.get(word)
+                if word_id is None:
+                    word_id = self.vocab[word] = len(self.vocab)
+                    self.postings.append([])
+                self.postings[word_id].append(i)
+            self.norms.append(sqrt(len(words)))
+
+    def user_vector(self, user_liked_films: list[Film]) -> dict[int, int]:
+        return user_vect(user_liked_films, self.vocab)
+
+    def similarities(self, user_vec_dict: dict[int, int]) -> list[float]:
+        """
+        Косинус вектора пользователя с каждым фильмом каталога (без округления).
+        Скалярное произведение — сумма счётчиков пользователя по общим словам (целое число).
+        """
+        dots = [0] * len(self.norms)
+        for word_id, count in user_vec_dict.items():
+            for i in self.postings[word_id]:
+                dots[i] += count
+        norm_a = sqrt(sum(count ** 2 for count in user_vec_dict.values()))
+        if norm_a == 0:
+            return [0.0] * len(self.norms)
+        return [dot / (norm_a * norm_b) if norm_b != 0 else 0.0 for dot, norm_b in zip(dots, self.norms)]
+
+
+_bow_models = CatalogMemo(BowModel)
+
+def bow_model_for(films: list[Film]) -> BowModel:
+    """Модель BoW для каталога; для одного и того же каталога строится один раз (CatalogMemo)."""
+    return _bow_models.get(films)
+
+
 def recommend_films(user_liked_films: list[Film], films: list[Film]) -> list[tuple[Film, float]]:
     """
     Главная функция: собирает все признаки (жанры, актёры, описание и т.д.)
     и считает итоговый балл для каждого фильма.
     На выходе — список фильмов, отсортированный по убыванию похожести.
     """
-    vocab = build_vocab(films)
-    vocab_size = len(vocab)
+    model = bow_model_for(films)
 
     user_directors = [film.director for film in user_liked_films]
     user_actors = [actor for film in user_liked_films for actor in film.actors]
@@ -215,25 +236,22 @@ def recommend_films(user_liked_films: list[Film], films: list[Film]) -> list[tup
     
 
     recommendations = []
-    user_vec_dict = user_vect(user_liked_films, vocab)
-    films = [film for film in films if film.title not in user_titles]
-    for film in films:
-        director_score = compare_director(user_directors, film.director)
-        actors_score = compare_actors(user_actors, film.actors)
+    description_scores = model.similarities(model.user_vector(user_liked_films))
+    # актёры и режиссёр — сразу для всего каталога по индексу людей
+    people = people_index_for(films)
+    actors_scores = people.actors_jaccard(user_actors).tolist()
+    director_scores = people.director_match(user_directors).tolist()
+    for i, film in enumerate(films):
+        if film.title in user_titles:
+            continue
+        director_score = director_scores[i]
+        actors_score = actors_scores[i]
         rating_score = compare_ratings(user_ratings, film.rating)
         years_score = compare_years(user_years, film.year)
-        description_score = compare_description(user_vec_dict, film, vocab, vocab_size)
+        description_score = round(description_scores[i], 3)
 
         score = round((director_score * 0.15 + actors_score * 0.25
                         + rating_score *0.1  + years_score * 0.1 + description_score * 0.4), 3)
         recommendations.append((film, score))
     sorted_recommendations = sorted(recommendations, key=lambda x: x[1], reverse=True)
     return sorted_recommendations
-
-
-
-
-
-
-
-
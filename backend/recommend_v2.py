@@ -7,14 +7,19 @@
 - тексты фильмов сравниваются по косинусной близости TF-IDF векторов
 
  Остальные признаки аналогичны 1 версии
+
++ словарь, IDF и векторы фильмов считаются один раз на каталог (TfidfModel), а не на каждый запрос;
+  косинус считается по разреженным векторам, но в том же порядке сложения, что и по спискам
+  длины vocab_size, — баллы те же
 """
 
 from math import sqrt, log
 from collections import Counter
 from films_model import Film
-from data_loader import load_films_from_csv
+from data_loader import CatalogMemo, load_catalog, people_index_for
+import tokenizer
 
-films = load_films_from_csv("data/kinopoisk-top250.csv")
+films = load_catalog("data/kinopoisk-top250.csv")
 
 
 def compare_genres(user_genres: list[str], film_genres: list[str]) -> float:      
@@ -75,51 +80,39 @@ def compare_years(user_years: list[int], film_year: int) -> float:
     score = 1.0 - min(diff, MAX_DIFF) / MAX_DIFF
     return score
 
-stop_words = [
-    "и", "в", "во", "не", "что", "он", "на", "я", "с", "со", "как", "а",
-    "то", "все", "она", "так", "его", "но", "да", "ты", "к", "у", "же",
-    "вы", "за", "бы", "по", "только", "ее", "мне", "было", "вот",
-    "от", "меня", "еще", "нет", "о", "из", "ему", "теперь", "когда",
-    "даже", "ну", "вдруг", "ли", "если", "уже", "или", "ни", "быть",
-    "был", "него", "до", "вас", "нибудь", "опять", "уж", "вам", "ведь",
-    "там", "потом", "себя", "ничего", "ей", "может", "они", "тут",
-    "где", "есть", "надо", "ней", "для", "мы", "тебя", "их", "чем",
-    "была", "сам", "чтоб", "без", "будто", "чего", "раз", "тоже",
-    "себе", "под", "будет", "ж", "тогда", "кто", "этот"
-]
-stop_symbols = [                                                                                    
-    ".", ",", "!", "?", ":", ";", "-", "—", "(", ")", "[", "]", "{", "}",                    
-    "\"", "'", "«", "»", "…", "/", "\\", "|", "@", "#", "$", "%", "^", "&", 
-    "*", "_", "+", "=", "<", ">", "~", "`"
-]
 
 def extract_keywords(description: str) -> list[str]:
     """
     Берет описание фильма, очищаю от знаков и стоп-слов.
     На выходе список слов  - не множество, как в 1 версии проекта - (сохраняются повторы, чтобы можно было считать TF).
     """
-    description = description.lower()
-    for symbol in stop_symbols:
-        description = description.replace(symbol, "")
-    
-    words = description.split()
-    keywords = [word for word in words if word not in stop_words]
-    
-    return keywords
+    return list(tokenizer.keywords(description))
 
 
 def build_vocab(films: list[Film]) -> dict[str, int]:    
     """
     Собирает словарь из всех уникальных слов в описаниях фильмов.
-    Каждому слову присваивает свой индекс.
+    Каждому слову присваивает свой индекс (в порядке первого появления — одинаково при каждом запуске).
     """                                                                         
-    my_dict = set()
+    my_dict = {}
     for f in films:
-        key_words = extract_keywords(f.description)
-        my_dict = my_dict | set(key_words)
-    my_dict = {value: index for index, value in enumerate(my_dict)}
+        for word in extract_keywords(f.description):
+            if word not in my_dict:
+                my_dict[word] = len(my_dict)
     return my_dict
 
+def document_frequencies(vocab: dict[str, int], films: list[Film]) -> dict[int, int]:
+    """
+    Для каждого слова словаря — в скольких фильмах оно встретилось (df).
+    Один проход по каталогу: каждое описание разбирается на слова один раз.
+    """
+    df = dict.fromkeys(vocab.values(), 0)
+    for film in films:
+        for word in set(extract_keywords(film.description)):
+            if word in vocab:
+                df[vocab[word]] += 1
+    return df
+
 def compute_idf(vocab: dict[str, int], films: list[Film]) -> dict[int, float]:
     """
     Считает IDF для всех слов словаря.
@@ -129,15 +122,8 @@ def compute_idf(vocab: dict[str, int], films: list[Film]) -> dict[int, float]:
 """
 
     n = len(films)
-    idf_dict = {}
-    for key, value in vocab.items():
-        word_count = 0
-        for film in films:
-            ex_w = set(extract_keywords(film.description))
-            if key in ex_w:
-                word_count+=1
-        idf_dict[value] = log((n + 1) / (word_count + 1)) + 1
-    return idf_dict
+    df = document_frequencies(vocab, films)
+    return {word_id: log((n + 1) / (word_count + 1)) + 1 for word_id, word_count in df.items()}
 
 
 def film_tfidf_vector(film: Film, vocab: dict[str, int], idf_dict: dict[int, float]) -> dict[int, float]:
@@ -224,6 +210,79 @@ def compare_description(user_vec_dict: dict[int, float], film: Film, idf_dict: d
     return round((cos_sim), 3)
 
 
+def sparse_norm(vec_dict: dict[int, float]) -> float:
+    """
+    Длина вектора {id_слова: вес}. Квадраты складываются по возрастанию id —
+    так же, как в cosine_similarity по списку (нули в сумме ничего не меняют).
+    """
+    norm = 0
+    for _, value in sorted(vec_dict.items()):
+        norm += value ** 2
+    return sqrt(norm)
+
+
+class TfidfModel:
+    """
+    TF-IDF, обученный на каталоге один раз (fit), вместо пересчёта на каждый запрос:
+    - vocab и idf — как у build_vocab и compute_idf, но за один проход по описаниям
+    - vectors — разреженный TF-IDF вектор каждого фильма, norms — их длины
+    - postings — для каждого слова список (номер фильма, вес) — по нему скалярные произведения
+      считаются только для фильмов, у которых есть общие с пользователем слова
+    """
+
+    def __init__(self, films: list[Film]):
+        keywords = [extract_keywords(film.description) for film in films]
+        self.vocab: dict[str, int] = {}
+        for words in keywords:
+            for word in words:
+                if word not in self.vocab:
+                    self.vocab[word] = len(self.vocab)
+
+        df = [0] * len(self.vocab)
+        for words in keywords:
+            for word in set(words):
+                df[self.vocab[word]] += 1
+        n = len(films)
+        self.idf: dict[int, float] = {word_id: log((n + 1) / (count + 1)) + 1 for word_id, count in enumerate(df)}
+
+        # те же веса, что у film_tfidf_vector, без повторного разбора описаний
+        self.vectors: list[dict[int, float]] = []
+        for words in keywords:
+            counts = Counter(words)
+            total_words = sum(counts.values())
+            self.vectors.append({self.vocab[word]: count / total_words * self.idf[self.vocab[word]]
+                                 for word, count in counts.items()})
+        self.norms = [sparse_norm(vec) for vec in self.vectors]
+
+        self.postings: list[list[tuple[int, float]]] = [[] for _ in range(len(self.vocab))]
+        for i, vec in enumerate(self.vectors):
+            for word_id, weight in vec.items():
+                self.postings[word_id].append((i, weight))
+
+    def user_vector(self, user_liked_films: list[Film]) -> dict[int, float]:
+        return user_tfidf_vector(user_liked_films, self.vocab, self.idf)
+
+    def similarities(self, user_vec_dict: dict[int, float]) -> list[float]:
+        """
+        Косинус вектора пользователя с каждым фильмом каталога (без округления).
+        Произведения для каждого фильма складываются по возрастанию id слова — как в cosine_similarity.
+        """
+        dots = [0.0] * len(self.vectors)
+        for word_id, value in sorted(user_vec_dict.items()):
+            for i, weight in self.postings[word_id]:
+                dots[i] += value * weight
+        norm_a = sparse_norm(user_vec_dict)
+        if norm_a == 0:
+            return [0.0] * len(self.vectors)
+        return [dot / (norm_a * norm_b) if norm_b != 0 else 0.0 for dot, norm_b in zip(dots, self.norms)]
+
+
+_tfidf_models = CatalogMemo(TfidfModel)
+
+def tfidf_model_for(films: list[Film]) -> TfidfModel:
+    """TF-IDF модель для каталога; для одного и того же каталога строится один раз (CatalogMemo)."""
+    return _tfidf_models.get(films)
+
 
 def recommend_films(user_liked_films: list[Film], films: list[Film]) -> list[tuple[Film, float]]:
     """
@@ -231,8 +290,7 @@ def recommend_films(user_liked_films: list[Film], films: list[Film]) -> list[tup
     и считает итоговый балл для каждого фильма.
     На выходе — список фильмов, отсортированный по убыванию похожести.
     """
-    vocab = build_vocab(films)
-    vocab_size = len(vocab)
+    model = tfidf_model_for(films)
 
     user_directors = [film.director for film in user_liked_films]
     user_actors = [actor for film in user_liked_films for actor in film.actors]
@@ -242,20 +300,22 @@ def recommend_films(user_liked_films: list[Film], films: list[Film]) -> list[tup
     
 
     recommendations = []
-    idf_dict = compute_idf(vocab, films)
-    user_vec_dict = user_tfidf_vector(user_liked_films, vocab, idf_dict)
-    films = [film for film in films if film.title not in user_titles]
-    for film in films:
-        director_score = compare_director(user_directors, film.director)
-        actors_score = compare_actors(user_actors, film.actors)
+    description_scores = model.similarities(model.user_vector(user_liked_films))
+    # актёры и режиссёр — сразу для всего каталога по индексу людей
+    people = people_index_for(films)
+    actors_scores = people.actors_jaccard(user_actors).tolist()
+    director_scores = people.director_match(user_directors).tolist()
+    for i, film in enumerate(films):
+        if film.title in user_titles:
+            continue
+        director_score = director_scores[i]
+        actors_score = actors_scores[i]
         rating_score = compare_ratings(user_ratings, film.rating)
         years_score = compare_years(user_years, film.year)
-        description_score = compare_description(user_vec_dict, film, idf_dict, vocab, vocab_size)
+        description_score = round(description_scores[i], 3)
 
         score = round((director_score * 0.15 + actors_score * 0.25
                         + rating_score *0.1  + years_score * 0.1 + description_score * 0.4), 3)
         recommendations.append((film, score))
     sorted_recommendations = sorted(recommendations, key=lambda x: x[1], reverse=True)
     return sorted_recommendations
-
-
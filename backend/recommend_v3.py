@@ -8,34 +8,121 @@
 Признаки кроме описания считаются как и в предыдущих версиях
 
 + добавлены умные веса и этапы перебора фильмов(сначала по описанию, после по остальным признакам)
++ остальные признаки считаются сразу для всех кандидатов массивами NumPy (CatalogFeatures)
 """
 
-from films_model import Film
-from data_loader import load_films_from_csv
+import hashlib
+import os
+import threading
+from films_model import Film, FilmCatalog
+from model_store import MANIFEST, has_model, load_model
+from ann_index import IVFIndex
+from film_filter import FilmFilter, FilterIndex
+from lsa import LSAEmbedding, description_similarity, fit_lsa, load_lsa, lsa_dim
+from neighbors import NeighborTable, load_neighbors, matrix_version
+from ranking import top_k_indices, top_k_rows, top_k_streaming, round_scores
+from data_loader import load_catalog, ids_of, people_index_for
+from tokenizer import make_vectorizer
+from metrics import StageTimer, STAGE_SECONDS, LIKED_FILMS, CANDIDATES, CANDIDATES_TOTAL, BATCH_SIZE
 from typing import List
-from scipy.sparse import csr_matrix
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 
-films = load_films_from_csv("data/kinopoisk-top250.csv")
-descriptions = [film.description for film in films]
-russian_stop_words = [
-     "и","в","во","не","что","он","на","я","с","со","как","а","то","все","она","так",
-    "его","но","да","ты","к","у","же","вы","за","бы","по","только","ее","мне","было",
-    "вот","от","меня","еще","нет","о","из","ему","теперь","когда","даже","ну","вдруг",
-    "ли","если","уже","или","ни","быть","был","него","до","вас","нибудь","опять","уж",
-    "вам","ведь","там","потом","себя","ничего","ей","может","они","тут","где","есть",
-    "надо","ней","для","мы","тебя","их","чем","была","сам","чтоб","без","будто","чего",
-    "раз","тоже","себе","под","будет","ж","тогда","кто","этот","того","потому","этого",
-    "какой","совсем","ним","здесь","этом","один","почти","мой","тем","чтобы","нее",
-    "кажется","сейчас","были","куда","зачем","всех","никогда","можно","при","наконец",
-    "два","об","другой","хоть","после","над","больше","тот","через","эти","нас","про",
-    "них","какая","много","разве","три","эту","моя","впрочем","хорошо","свою","этой",
-    "перед","иногда","лучше","чуть","том","нельзя","такой","им","более","всегда",
-    "конечно","всю","между"
-]
-vectorizer = TfidfVectorizer(stop_words=russian_stop_words)
-tfidf_matrix = vectorizer.fit_transform(descriptions)
+FILMS_CSV = os.environ.get("FILMS_CSV", "data/kinopoisk-top250.csv")
+MODEL_DIR = os.environ.get("MODEL_DIR", "data/model")
+
+
+def _df_value(value: str) -> int | float:
+    """min_df/max_df как в sklearn: "2" — число описаний, "0.5" — доля описаний."""
+    return float(value) if "." in value else int(value)
+
+
+# Компактная модель (по умолчанию выключена — матрица та же, что у TfidfVectorizer без параметров)
+TFIDF_DTYPE = os.environ.get("TFIDF_DTYPE", "float64")            # float32 — веса вдвое меньше
+TFIDF_MIN_DF = _df_value(os.environ.get("TFIDF_MIN_DF", "1"))     # 2 — без слов из одного описания
+TFIDF_MAX_DF = _df_value(os.environ.get("TFIDF_MAX_DF", "1.0"))   # 0.5 — без слов из половины описаний
+TFIDF_MAX_FEATURES = int(os.environ.get("TFIDF_MAX_FEATURES", "0")) or None   # 0 — словарь без ограничения
+TFIDF_TOP_TERMS = int(os.environ.get("TFIDF_TOP_TERMS", "0")) or None         # 0 — все слова описания
+
+# Пространство для отбора по описанию: "tfidf" — разреженная tfidf_matrix, "lsa" — плотные эмбеддинги (lsa.py)
+DESC_SPACE = os.environ.get("DESC_SPACE", "tfidf")
+LSA_DIM = int(os.environ.get("LSA_DIM", "256"))
+LSA_DIR = os.environ.get("LSA_DIR", "data/lsa")   # собранные заранее эмбеддинги (python lsa.py)
+
+
+def model_source() -> str:
+    """Файл, из которого грузится модель: manifest.json артефакта или CSV."""
+    return os.path.join(MODEL_DIR, MANIFEST) if has_model(MODEL_DIR) else FILMS_CSV
+
+
+def source_stamp() -> tuple | None:
+    """
+    Отметка источника модели: путь, inode, время изменения и размер файла (None — файла нет).
+    Артефакт пересобирается переименованием папки, поэтому у нового manifest.json другой inode.
+    """
+    path = model_source()
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return path, st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def load_initial_model(fresh: bool = False) -> tuple[FilmCatalog, TfidfVectorizer, csr_matrix, dict | None]:
+    """
+    Если артефакт собран (python model_store.py) — берём его без обучения,
+    иначе читаем CSV и обучаем TF-IDF прямо при старте.
+    fresh — перечитать CSV, даже если каталог по этому пути уже загружен (перезагрузка модели).
+    """
+    if has_model(MODEL_DIR):
+        return load_model(MODEL_DIR)
+    films = load_catalog(FILMS_CSV, fresh=fresh)
+    return films, *fit_tfidf(films.descriptions()), None
+
+
+def fit_tfidf(descriptions, dtype: str = TFIDF_DTYPE, min_df: int | float = TFIDF_MIN_DF,
+              max_df: int | float = TFIDF_MAX_DF, max_features: int | None = TFIDF_MAX_FEATURES,
+              top_terms: int | None = TFIDF_TOP_TERMS) -> tuple[TfidfVectorizer, csr_matrix]:
+    """
+    Обучает TF-IDF по описаниям. Параметры по умолчанию — из TFIDF_* окружения:
+    dtype — тип весов матрицы; min_df, max_df, max_features — отсев слов словаря (как в sklearn);
+    top_terms — оставить в каждой строке только столько самых весомых слов.
+    """
+    vectorizer = make_vectorizer(dtype=np.dtype(dtype).type, min_df=min_df, max_df=max_df,
+                                 max_features=max_features)
+    matrix = vectorizer.fit_transform(descriptions)
+    # stop_words_ — все отсеянные слова; нужен только для отладки, а весит как полсловаря
+    vectorizer.stop_words_ = None
+    vectorizer.top_terms_ = top_terms
+    return vectorizer, truncate_rows(matrix, top_terms)
+
+
+def truncate_rows(matrix: csr_matrix, top_terms: int | None) -> csr_matrix:
+    """
+    Оставляет в каждой строке top_terms самых больших весов и снова нормирует строки (L2),
+    чтобы косинус считался как раньше. При равных весах остаются слова с меньшим номером столбца.
+    """
+    if top_terms is None or matrix.nnz == 0 or np.diff(matrix.indptr).max() <= top_terms:
+        return matrix
+    matrix = csr_matrix(matrix)
+    matrix.sort_indices()
+    row_of = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    order = np.lexsort((-matrix.data, row_of))   # внутри строки — по убыванию веса
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - matrix.indptr[row_of[order]]
+    keep = rank < top_terms
+    indptr = np.zeros(matrix.shape[0] + 1, dtype=matrix.indptr.dtype)
+    np.cumsum(np.bincount(row_of[keep], minlength=matrix.shape[0]), out=indptr[1:])
+    truncated = csr_matrix((matrix.data[keep], matrix.indices[keep], indptr), shape=matrix.shape)
+    return normalize(truncated, copy=False)
+
+
+def transform_tfidf(vectorizer: TfidfVectorizer, descriptions: list[str]) -> csr_matrix:
+    """Строки TF-IDF для новых описаний — так же, как при обучении (с тем же top_terms)."""
+    return truncate_rows(vectorizer.transform(descriptions), getattr(vectorizer, "top_terms_", None))
 
 
 
@@ -60,13 +147,16 @@ def compare_director(user_directors: list[str], film_director: str) -> float:
     return score
 
 
+RATING_MAX_DIFF = 3.0
+YEAR_MAX_DIFF = 30
+
 def compare_ratings(user_ratings: list[float], film_rating: float) -> float:   
     """
     Сравнивает средний рейтинг любимых фильмов с рейтингом этого фильма.
     Чем ближе цифры, тем больше балл (максимум = 1).
     Если разница больше 3 баллов — считает совпадение минимальным.
     """     
-    MAX_DIFF = 3.0
+    MAX_DIFF = RATING_MAX_DIFF
     user_avg_rating = sum(user_ratings) / len(user_ratings)
     diff = abs(film_rating - user_avg_rating)
     score = 1.0 - min(diff, MAX_DIFF) / MAX_DIFF
@@ -78,7 +168,7 @@ def compare_years(user_years: list[int], film_year: int) -> float:
     Сравнивает средний год любимых фильмов с годом выхода этого фильма.
     Чем ближе по времени, тем выше балл (от 0 до 1).
     """
-    MAX_DIFF = 30
+    MAX_DIFF = YEAR_MAX_DIFF
     user_avg_year = sum(user_years) / len(user_years)
     diff = abs(film_year - user_avg_year)
     score = 1.0 - min(diff, MAX_DIFF) / MAX_DIFF
@@ -90,10 +180,32 @@ def user_tfidf_vector(user_indices: List[int], tfidf_matrix: csr_matrix) -> csr_
     Берет строки tfidf_matrix по индексам любимых фильмов и усредняю.
     На выходе csr_matrix формы (1, vocab_size).
     .mean(axis=0) возвращает numpy.matrix, поэтому приводит к csr_matrix
+    Для эмбеддингов LSA (плотная матрица) — плотный вектор (1, dim), как у user_tfidf_matrix.
 """
+    if isinstance(tfidf_matrix, np.ndarray):
+        return user_tfidf_matrix([user_indices], tfidf_matrix)
     user_vec = csr_matrix(tfidf_matrix[user_indices].mean(axis=0))
     return user_vec
 
+def user_tfidf_matrix(user_indices: List[List[int]], tfidf_matrix: csr_matrix) -> csr_matrix:
+    """
+    user_tfidf_vector для многих пользователей сразу: строка u — средний вектор пользователя u.
+    Одно произведение разреженной матрицы весов (1/n на фильмах пользователя) на tfidf_matrix;
+    слагаемые идут в том же порядке, что в .mean(axis=0), поэтому векторы совпадают до бита.
+    Для эмбеддингов LSA результат — плотная матрица (пользователи × dim).
+    """
+    indptr = np.zeros(len(user_indices) + 1, dtype=np.int64)
+    np.cumsum([len(indices) for indices in user_indices], out=indptr[1:])
+    columns = np.array([i for indices in user_indices for i in indices], dtype=np.int64)
+    weights = np.concatenate([np.full(len(indices), 1.0 / len(indices), dtype=tfidf_matrix.dtype)
+                              for indices in user_indices])
+    selector = csr_matrix((weights, columns, indptr), shape=(len(user_indices), tfidf_matrix.shape[0]))
+    user_vecs = selector @ tfidf_matrix
+    if isinstance(user_vecs, np.ndarray):
+        return user_vecs
+    user_vecs.sort_indices()
+    return user_vecs
+
 def compare_description(user_vec: csr_matrix, tfidf_matrix: csr_matrix, film_index: int) -> float:
     """
     Считает похожесть по описанию.
@@ -108,20 +220,142 @@ def compare_description(user_vec: csr_matrix, tfidf_matrix: csr_matrix, film_ind
 
 
 TOP_K = 100          # Количество фильмов, отобранных по признаку описания
+SIMS_CHUNK = 65536   # Сколько строк матрицы обрабатывать за раз в потоковом режиме
+
+
+def description_sims_chunks(user_vec: csr_matrix, matrix: csr_matrix, chunk_size: int = SIMS_CHUNK):
+    """Считает косинус с фильмами по кускам строк: отдаёт (start, похожести куска)."""
+    for start in range(0, matrix.shape[0], chunk_size):
+        yield start, description_similarity(user_vec, matrix[start:start + chunk_size]).ravel()
 
-def top_k_by_description(user_indices: List[int], matrix: csr_matrix, k: int = TOP_K):
+
+def top_k_by_description(user_indices: List[int], matrix: csr_matrix, k: int | None = TOP_K,
+                         chunk_size: int | None = None, alive: np.ndarray | None = None):
     """
     Выбирает кандидатов по описанию (TF-IDF).
     Берет средний вектор пользователя и считает косинус со всеми фильмами.
     Возвращает индексы топ-k и массив похожестей (чтобы потом не считать заново).
+    k=None — вернуть весь каталог по убыванию похожести.
+    chunk_size — считать похожести кусками и отбирать топ-k потоково (через кучу).
+    alive — маска живых строк: удалённые фильмы получают -inf и в топ не попадают.
     """
     user_vec = user_tfidf_vector(user_indices, matrix)
-    sims = cosine_similarity(user_vec, matrix).ravel()
-    order = sorted(range(len(sims)), key=lambda i: sims[i], reverse=True)
-    top_idx = order[:min(k, len(order))]
+    if chunk_size is None or k is None:
+        sims = description_similarity(user_vec, matrix).ravel()
+        if alive is not None:
+            sims[~alive] = -np.inf
+        return top_k_indices(sims, k), sims
+
+    sims = np.empty(matrix.shape[0], dtype=np.float64)
+
+    def filled_chunks():
+        for start, chunk in description_sims_chunks(user_vec, matrix, chunk_size):
+            if alive is not None:
+                chunk[~alive[start:start + len(chunk)]] = -np.inf
+            sims[start:start + len(chunk)] = chunk
+            yield start, chunk
+
+    top_idx = top_k_streaming(filled_chunks(), k)
     return top_idx, sims
 
 
+DESC_INDEX = os.environ.get("DESC_INDEX", "exact")   # "exact" или "ivf" (приближённый поиск)
+IVF_LISTS = int(os.environ.get("IVF_LISTS", "0")) or None   # 0 — sqrt(числа фильмов)
+IVF_PROBE = int(os.environ.get("IVF_PROBE", "8"))
+IVF_DIM = int(os.environ.get("IVF_DIM", "128"))
+
+
+def build_retriever(matrix: csr_matrix) -> IVFIndex | None:
+    """ANN-индекс по описаниям, если он включён (DESC_INDEX=ivf); None — точный поиск."""
+    if DESC_INDEX != "ivf":
+        return None
+    return IVFIndex(matrix, n_lists=IVF_LISTS, n_probe=IVF_PROBE, dim=IVF_DIM)
+
+
+def retrieve_by_description(user_indices: List[int], matrix: csr_matrix, k: int | None = TOP_K,
+                            alive: np.ndarray | None = None, retriever: IVFIndex | None = None):
+    """
+    Этап отбора кандидатов по описанию: возвращает (индексы топ-k, их похожести).
+    С retriever кандидаты берутся из ANN-индекса и пересчитываются точно;
+    если каталог маленький, нужен весь каталог (k=None) или кандидатов не хватило — точный поиск.
+    """
+    if retriever is not None and k is not None and matrix.shape[0] >= retriever.MIN_ROWS:
+        user_vec = user_tfidf_vector(user_indices, matrix)
+        rows = retriever.candidates(user_vec)
+        if alive is not None:
+            rows = rows[alive[rows]]
+        if len(rows) >= k:
+            sims = description_similarity(user_vec, matrix[rows]).ravel()
+            best = top_k_indices(sims, k)
+            return rows[best], sims[best]
+
+    top_idx, sims = top_k_by_description(user_indices, matrix, k=k, alive=alive)
+    return top_idx, sims[top_idx]
+
+
+FILTER_SUBSET_FRACTION = 0.8   # под фильтр подходит не больше этой доли каталога — косинус только по подходящим
+
+
+def retrieve_filtered(user_indices: List[int], matrix: csr_matrix, allowed: np.ndarray, k: int | None = TOP_K):
+    """
+    Отбор кандидатов по описанию только среди строк allowed (маска фильтра и живых строк).
+    Подходящих мало — косинус считается по подматрице из них одних (чем уже фильтр, тем дешевле),
+    иначе по всей матрице, а неподходящие получают -inf. Порядок и похожести в обоих случаях те же,
+    что у top_k_by_description по всему каталогу, если выбросить из него неподходящие фильмы.
+    """
+    rows = np.flatnonzero(allowed)
+    if not len(rows):
+        return rows, np.empty(0, dtype=np.float64)
+    if len(rows) <= FILTER_SUBSET_FRACTION * matrix.shape[0]:
+        user_vec = user_tfidf_vector(user_indices, matrix)
+        sims = description_similarity(user_vec, matrix[rows]).ravel()
+        best = top_k_indices(sims, k)
+        return rows[best], sims[best]
+    top_idx, sims = top_k_by_description(user_indices, matrix, k=k, alive=allowed)
+    top_idx = top_idx[allowed[top_idx]]   # подходящих меньше k — лишние строки с -inf
+    return top_idx, sims[top_idx]
+
+
+NEIGHBORS_DIR = os.environ.get("NEIGHBORS_DIR", "data/neighbors")   # "" — не использовать таблицу соседей
+
+
+def retrieve_by_neighbors(user_indices: List[int], state: "ModelState", k: int | None):
+    """
+    Отбор кандидатов по таблице соседей для профиля из одного-двух фильмов.
+    Возвращает (индексы топ-k, их похожести, признаки пар или None) либо None, если таблица не подходит.
+    - один фильм: готовая строка таблицы вместе с признаками пар, ничего не пересчитывается
+      (если в каталог дописаны фильмы, которых нет в таблице, — пересчёт только по ним и топ-k из таблицы)
+    - два фильма: кандидаты — объединение их списков соседей (и дописанных строк),
+      косинус пересчитывается точно только по ним; результат приближённый, как у IVF
+    """
+    table = state.neighbors
+    if table is None or not table.covers(user_indices, k):
+        return None
+    alive = state.alive if state.has_removed else None
+    n_rows = len(state.films)
+
+    if len(user_indices) == 1:
+        rows, pair = table.lookup(user_indices[0])
+        keep = alive[rows] if alive is not None else np.ones(len(rows), dtype=bool)
+        if keep.sum() < k:
+            return None   # живых соседей в таблице меньше k — точный поиск
+        if n_rows == table.n_rows:
+            pair = {name: values[keep][:k] for name, values in pair.items()}
+            return rows[keep][:k], pair["desc"], pair
+        # топ-k среди старых строк известен, дописанные строки пересчитываем точно
+        rows = np.sort(np.concatenate([rows[keep][:k], np.arange(table.n_rows, n_rows)]))
+    else:
+        rows = np.concatenate([table.merged(user_indices), np.arange(table.n_rows, n_rows)])
+    if alive is not None:
+        rows = rows[alive[rows]]
+    if len(rows) < k:
+        return None
+    user_vec = user_tfidf_vector(user_indices, state.desc_matrix)
+    sims = description_similarity(user_vec, state.desc_matrix[rows]).ravel()
+    best = top_k_indices(sims, k)
+    return rows[best], sims[best], None
+
+
 def adapt_weights(base: dict[str, float],user_years: list[int],
                   user_ratings: list[float],user_actors: list[str],) -> dict[str, float]:
     """
@@ -160,14 +394,203 @@ def adapt_weights(base: dict[str, float],user_years: list[int],
     return w
 
 
-TITLE_TO_IDX = {f.title: i for i, f in enumerate(films)}
+class CatalogFeatures:
+    """
+    Признаки каталога (кроме описания) в виде массивов NumPy.
+    Строится один раз по списку фильмов, чтобы при запросе считать баллы
+    сразу для всех кандидатов, а не перебирать фильмы в цикле.
+    - years, ratings — год и рейтинг каждого фильма
+    - title_ids — номер названия (чтобы исключать уже выбранные фильмы)
+    - people — индекс актёров и режиссёров из data_loader
+    """
+
+    def __init__(self, films: FilmCatalog):
+        self.years = films.years.astype(np.float64)
+        self.ratings = films.ratings.astype(np.float64)
+
+        self.title_to_id: dict[str, int] = {}
+        self.title_ids = np.array(
+            [self.title_to_id.setdefault(title, len(self.title_to_id)) for title in films.titles],
+            dtype=np.int64,
+        )
+
+        self.people = people_index_for(films)
+
+    def extended(self, films: FilmCatalog) -> "CatalogFeatures":
+        """
+        Признаки для каталога films, который получен из прежнего дописыванием фильмов в конец:
+        старые строки не пересчитываются, словарь названий копируется и дополняется.
+        """
+        start = len(self.title_ids)
+        new = CatalogFeatures.__new__(CatalogFeatures)
+        new.years = films.years.astype(np.float64)
+        new.ratings = films.ratings.astype(np.float64)
+        new.title_to_id = dict(self.title_to_id)
+        tail = [new.title_to_id.setdefault(title, len(new.title_to_id)) for title in films.titles[start:]]
+        new.title_ids = np.concatenate([self.title_ids, np.array(tail, dtype=np.int64)])
+        new.people = people_index_for(films)
+        return new
+
+    def actors_scores(self, user_actors: list[str], rows: np.ndarray) -> np.ndarray:
+        """Индекс Жаккара по актёрам для строк rows (как compare_actors)."""
+        return self.people.actors_jaccard(user_actors, rows)
+
+    def director_scores(self, user_directors: list[str], rows: np.ndarray) -> np.ndarray:
+        """1.0, если режиссёр фильма входит в список любимых, иначе 0.0."""
+        return self.people.director_match(user_directors, rows)
+
+    def ratings_scores(self, user_ratings: list[float], rows: np.ndarray) -> np.ndarray:
+        """Близость рейтинга к среднему рейтингу любимых (как compare_ratings)."""
+        user_avg_rating = sum(user_ratings) / len(user_ratings)
+        diff = np.abs(self.ratings[rows] - user_avg_rating)
+        return 1.0 - np.minimum(diff, RATING_MAX_DIFF) / RATING_MAX_DIFF
+
+    def years_scores(self, user_years: list[int], rows: np.ndarray) -> np.ndarray:
+        """Близость года к среднему году любимых (как compare_years)."""
+        user_avg_year = sum(user_years) / len(user_years)
+        diff = np.abs(self.years[rows] - user_avg_year)
+        return 1.0 - np.minimum(diff, float(YEAR_MAX_DIFF)) / YEAR_MAX_DIFF
+
+    # Те же признаки для многих пользователей сразу: j-я пара — пользователь owner[j] и фильм rows[j]
+
+    def actors_scores_pairs(self, user_actors: list[list[str]], owner: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        return self.people.actors_jaccard_pairs(user_actors, owner, rows)
+
+    def director_scores_pairs(self, user_directors: list[list[str]], owner: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        return self.people.director_match_pairs(user_directors, owner, rows)
+
+    def ratings_scores_pairs(self, user_ratings: list[list[float]], owner: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        user_avg_rating = np.array([sum(ratings) / len(ratings) for ratings in user_ratings], dtype=np.float64)
+        diff = np.abs(self.ratings[rows] - user_avg_rating[owner])
+        return 1.0 - np.minimum(diff, RATING_MAX_DIFF) / RATING_MAX_DIFF
+
+    def years_scores_pairs(self, user_years: list[list[int]], owner: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        user_avg_year = np.array([sum(years) / len(years) for years in user_years], dtype=np.float64)
+        diff = np.abs(self.years[rows] - user_avg_year[owner])
+        return 1.0 - np.minimum(diff, float(YEAR_MAX_DIFF)) / YEAR_MAX_DIFF
+
+
+class ModelState:
+    """
+    Текущая модель v3 одним объектом: каталог, векторайзер, tfidf_matrix, индексы.
+    Объект не меняется после создания: обновление каталога собирает новый ModelState
+    и подменяет им текущий, поэтому запрос, взявший state в начале, видит согласованные данные.
+    - alive — маска живых строк (удалённые и заменённые фильмы остаются в матрице до переобучения)
+    - title_to_idx — название -> номер живой строки
+    - retriever — ANN-индекс по описаниям (None — точный поиск)
+    - neighbors — таблица соседей (None — нет); строки, дописанные на лету, в ней отсутствуют
+    - filter_index — индексы для фильтров (FilterIndex); строится при первом запросе с фильтром
+    - embedding — эмбеддинги LSA (DESC_SPACE=lsa); тогда отбор по описанию идёт по ним (desc_matrix)
+    - version — версия модели: у обученной — версия матрицы, после каждого изменения каталога — новая
+    - fitted_docs — сколько описаний было при обучении TF-IDF
+    - changed_docs, new_tokens, oov_tokens — сколько изменилось с тех пор (дрейф словаря)
+    """
+
+    def __init__(self, films: FilmCatalog, vectorizer: TfidfVectorizer, tfidf_matrix: csr_matrix,
+                 manifest: dict | None = None, alive: np.ndarray | None = None,
+                 features: CatalogFeatures | None = None, title_to_idx: dict[str, int] | None = None,
+                 retriever: IVFIndex | None = None, neighbors: NeighborTable | None = None,
+                 filter_index: FilterIndex | None = None, embedding: LSAEmbedding | None = None,
+                 version: str | None = None, fitted_docs: int | None = None, changed_docs: int = 0, new_tokens: int = 0, oov_tokens: int = 0):
+        self.films = films
+        self.vectorizer = vectorizer
+        self.tfidf_matrix = tfidf_matrix
+        self.manifest = manifest
+        self.alive = alive if alive is not None else np.ones(len(films), dtype=bool)
+        self.has_removed = not self.alive.all()
+        self.features = features if features is not None else CatalogFeatures(films)
+        if title_to_idx is None:
+            title_to_idx = {title: i for i, title in enumerate(films.titles) if self.alive[i]}
+        self.title_to_idx = title_to_idx
+        self.retriever = retriever
+        self.neighbors = neighbors
+        self._filter_index = filter_index
+        self.embedding = embedding
+        self.version = version if version is not None else matrix_version(tfidf_matrix, manifest)
+        self.fitted_docs = len(films) if fitted_docs is None else fitted_docs
+        self.changed_docs = changed_docs
+        self.new_tokens = new_tokens
+        self.oov_tokens = oov_tokens
+
+    @property
+    def desc_matrix(self):
+        """Матрица для отбора по описанию: tfidf_matrix или плотные эмбеддинги LSA."""
+        return self.embedding.vectors if self.embedding is not None else self.tfidf_matrix
+
+    @property
+    def filter_index(self) -> FilterIndex:
+        if self._filter_index is None:
+            self._filter_index = FilterIndex(self.films)
+        return self._filter_index
+
+    def drift(self) -> dict:
+        """Насколько каталог ушёл от того, на котором обучался TF-IDF."""
+        return {
+            "films": len(self.title_to_idx),
+            "rows": len(self.films),
+            "fitted_docs": self.fitted_docs,
+            "changed_docs": self.changed_docs,
+            "changed_fraction": self.changed_docs / max(self.fitted_docs, 1),
+            "oov_rate": self.oov_tokens / self.new_tokens if self.new_tokens else 0.0,
+        }
 
-def recommend_films(user_liked_films: list[Film], films: list[Film]) -> list[tuple[Film, float]]:
+    def needs_refit(self) -> bool:
+        drift = self.drift()
+        return (drift["changed_fraction"] >= REFIT_CHANGED_FRACTION
+                or (self.new_tokens >= REFIT_MIN_TOKENS and drift["oov_rate"] >= REFIT_OOV_RATE))
+
+
+REFIT_CHANGED_FRACTION = 0.10   # переобучать, если изменилось больше 10% каталога
+REFIT_OOV_RATE = 0.25           # ...или четверть слов новых описаний не входит в словарь
+REFIT_MIN_TOKENS = 500          # (долю новых слов учитываем, только когда слов набралось достаточно)
+
+def build_state(films: FilmCatalog, vectorizer: TfidfVectorizer, tfidf_matrix: csr_matrix,
+                manifest: dict | None = None) -> ModelState:
+    """
+    Свежая модель по обученной матрице (с ANN-индексом, если он включён, и таблицей соседей, если она собрана).
+    DESC_SPACE=lsa — с эмбеддингами LSA: собранными заранее для этой модели или обученными здесь.
+    У такой модели своя версия (ответы другие), и таблица соседей берётся только собранная по эмбеддингам.
+    """
+    version = matrix_version(tfidf_matrix, manifest)
+    embedding = None
+    if DESC_SPACE == "lsa":
+        # собранные с другим LSA_DIM не подходят: обучаем заново
+        embedding = (load_lsa(LSA_DIR, version, lsa_dim(tfidf_matrix.shape, LSA_DIM))
+                     or fit_lsa(tfidf_matrix, LSA_DIM, version))
+        version = f"{version}-lsa{embedding.dim}"
+    desc_matrix = embedding.vectors if embedding is not None else tfidf_matrix
+    return ModelState(films, vectorizer, tfidf_matrix, manifest, retriever=build_retriever(desc_matrix),
+                      neighbors=load_neighbors(NEIGHBORS_DIR, version), embedding=embedding, version=version)
+
+
+_loaded_stamp = source_stamp()   # источник, с которого последний раз грузилась модель (для MODEL_WATCH_SECONDS)
+state = build_state(*load_initial_model())
+
+# Старые имена модуля — всегда указывают на части текущего state
+films = state.films
+vectorizer = state.vectorizer
+tfidf_matrix = state.tfidf_matrix
+model_manifest = state.manifest
+TITLE_TO_IDX = state.title_to_idx
+features = state.features
+
+def recommend_films(user_liked_films: list[Film], films: list[Film], k: int | None = TOP_K,
+                    top_n: int | None = None, state: ModelState | None = None,
+                    film_filter: FilmFilter | None = None) -> list[tuple[Film, float]]:
     """
     Главная функция: собирает все признаки (жанры, актёры, описание и т.д.)
     и считает итоговый балл для каждого фильма.
     На выходе — список фильмов, отсортированный по убыванию похожести.
+    k — сколько кандидатов брать по описанию; None — оценивать весь каталог.
+    top_n — вернуть только первые top_n (без сортировки всех кандидатов).
+    state — модель, по которой считать (по умолчанию текущая); films должен быть state.films.
+    film_filter — рекомендовать только подходящие фильмы: каталог сужается до отбора по описанию,
+    поэтому k кандидатов набирается из подходящих (таблица соседей и IVF при этом не используются).
     """
+    if state is None:
+        state = current_state()
+    features = state.features
+    timer = StageTimer(STAGE_SECONDS, "single")
 
     user_directors = [film.director for film in user_liked_films]
     user_actors = [actor for film in user_liked_films for actor in film.actors]
@@ -176,36 +599,440 @@ def recommend_films(user_liked_films: list[Film], films: list[Film]) -> list[tup
     user_titles = {film.title for film in user_liked_films}
 
 
-    user_indices = [TITLE_TO_IDX[t] for t in user_titles if t in TITLE_TO_IDX]
+    user_indices = [state.title_to_idx[t] for t in user_titles if t in state.title_to_idx]
 
 
     base_w = {"desc": 0.40, "actors": 0.25, "director": 0.15, "year": 0.10, "rating": 0.10}
     w = adapt_weights(base_w, user_years, user_ratings, user_actors)
+    timer.mark("weights")
+
+    alive = state.alive if state.has_removed else None
+    if film_filter is not None and not film_filter.is_empty():
+        allowed = state.filter_index.mask(film_filter)
+        if alive is not None:
+            allowed &= alive
+        found = (*retrieve_filtered(user_indices, state.desc_matrix, allowed, k), None)
+    else:
+        found = retrieve_by_neighbors(user_indices, state, k)
+    if found is not None:
+        top_idx, top_sims, pair = found
+    else:
+        top_idx, top_sims = retrieve_by_description(user_indices, state.desc_matrix, k=k, alive=alive,
+                                                    retriever=state.retriever)
+        pair = None
+
+    # не советуем то, что уже выбрано (и то, что удалено из каталога)
+    rows = np.asarray(top_idx, dtype=np.int64)
+    keep = ~np.isin(features.title_ids[rows], ids_of(features.title_to_id, user_titles))
+    if alive is not None:
+        keep &= alive[rows]
+    # во float64 до весов: при TFIDF_DTYPE=float32 баллы те же, что у recommend_films_batch и таблицы соседей
+    rows, desc_scores = rows[keep], top_sims[keep].astype(np.float64, copy=False)
+    timer.mark("candidates")
+    LIKED_FILMS.observe(len(user_liked_films), "single")
+    CANDIDATES.observe(len(rows), "single")
+    CANDIDATES_TOTAL.inc("single", value=len(rows))
+
+    if pair is None or len(user_indices) != len(user_titles):
+        # признаки пар из таблицы годятся, только если все любимые фильмы — из каталога
+        pair = {
+            "director": features.director_scores(user_directors, rows),
+            "actors": features.actors_scores(user_actors, rows),
+            "rating": features.ratings_scores(user_ratings, rows),
+            "year": features.years_scores(user_years, rows),
+        }
+    else:
+        pair = {name: values[keep] for name, values in pair.items()}
+
+    # порядок слагаемых как в поштучной версии — чтобы баллы совпадали до бита
+    scores = (
+        w["director"] * pair["director"]
+        + w["actors"] * pair["actors"]
+        + w["rating"] * pair["rating"]
+        + w["year"] * pair["year"]
+        + w["desc"] * desc_scores
+    )
+    scores = round_scores(scores)
+    timer.mark("features")
+
+    # устойчивый порядок: при равных баллах сохраняется порядок по описанию
+    order = top_k_indices(scores, top_n)
+    result = [(films[i], score) for i, score in zip(rows[order].tolist(), scores[order].tolist())]
+    timer.mark("sort")
+    return result
+
+
+BATCH_SIMS_BUDGET = 2 ** 24   # сколько похожестей (пользователь × фильм) держать в памяти за раз (~128 МБ)
+
+
+def recommend_films_batch(profiles: list[list[Film]], k: int | None = TOP_K,
+                          top_n: int | list[int | None] | None = None,
+                          state: ModelState | None = None,
+                          film_filters: list[FilmFilter | None] | None = None) -> list[list[tuple[Film, float]]]:
+    """
+    recommend_films для многих пользователей за один вызов; profiles — любимые фильмы каждого.
+    Ответы те же, что у recommend_films с точным поиском по описанию (без IVF и таблицы соседей):
+    - векторы пользователей складываются в одну разреженную матрицу, и похожести описаний
+      для блока пользователей считаются одним произведением матриц
+    - кандидаты всех пользователей лежат в плоских массивах (owner — чей кандидат),
+      признаки, баллы и порядок считаются по ним без цикла по пользователям
+    top_n — одно число для всех или список по пользователям; film_filters — фильтр каждого (или None).
+    Пользователи, у которых ни одного фильма нет в каталоге, и пользователи с фильтром
+    считаются через recommend_films (с фильтром отбор идёт по своей части каталога).
+    """
+    if state is None:
+        state = current_state()
+    features = state.features
+    films = state.films
+    top_ns = list(top_n) if isinstance(top_n, list) else [top_n] * len(profiles)
+    film_filters = film_filters or [None] * len(profiles)
+    results: list[list[tuple[Film, float]] | None] = [None] * len(profiles)
+
+    users, user_indices, liked_titles = [], [], []
+    user_directors, user_actors, user_ratings, user_years = [], [], [], []
+    for u, liked in enumerate(profiles):
+        titles = {film.title for film in liked}
+        indices = [state.title_to_idx[t] for t in titles if t in state.title_to_idx]
+        film_filter = film_filters[u]
+        if not indices or (film_filter is not None and not film_filter.is_empty()):
+            results[u] = recommend_films(liked, films, k=k, top_n=top_ns[u], state=state, film_filter=film_filter)
+            continue
+        users.append(u)
+        user_indices.append(indices)
+        liked_titles.append(titles)
+        user_directors.append([film.director for film in liked])
+        user_actors.append([actor for film in liked for actor in film.actors])
+        user_ratings.append([film.rating for film in liked])
+        user_years.append([film.year for film in liked])
+    if not users:
+        return results
+    timer = StageTimer(STAGE_SECONDS, "batch")
+    BATCH_SIZE.observe(len(users))
+    for liked in user_directors:
+        LIKED_FILMS.observe(len(liked), "batch")
+
+    base_w = {"desc": 0.40, "actors": 0.25, "director": 0.15, "year": 0.10, "rating": 0.10}
+    weights = [adapt_weights(base_w, years, ratings, actors)
+               for years, ratings, actors in zip(user_years, user_ratings, user_actors)]
+    timer.mark("weights")
+
+    # отбор кандидатов по описанию: блоками пользователей, чтобы плотные похожести влезали в память
+    alive = state.alive if state.has_removed else None
+    matrix = state.desc_matrix
+    user_vecs = user_tfidf_matrix(user_indices, matrix)
+    block = max(1, BATCH_SIMS_BUDGET // max(matrix.shape[0], 1))
+    top_rows, top_sims = [], []
+    for start in range(0, len(users), block):
+        sims = description_similarity(user_vecs[start:start + block], matrix)
+        if alive is not None:
+            sims[:, ~alive] = -np.inf
+        top = top_k_rows(sims, k)
+        top_rows.append(top)
+        top_sims.append(np.take_along_axis(sims, top, axis=1))
+    top = np.concatenate(top_rows)
+    rows = top.ravel().astype(np.int64)
+    desc_scores = np.concatenate(top_sims).ravel()
+    owner = np.repeat(np.arange(len(users)), top.shape[1])
+
+    # не советуем то, что уже выбрано (и то, что удалено из каталога)
+    n_titles = len(features.title_to_id) + 1
+    liked_keys = np.concatenate([u * n_titles + ids_of(features.title_to_id, titles)
+                                 for u, titles in enumerate(liked_titles)])
+    keep = ~np.isin(owner * n_titles + features.title_ids[rows], liked_keys)
+    if alive is not None:
+        keep &= alive[rows]
+    rows, owner, desc_scores = rows[keep], owner[keep], desc_scores[keep]
+    timer.mark("candidates")
+    for n in np.bincount(owner, minlength=len(users)).tolist():
+        CANDIDATES.observe(n, "batch")
+    CANDIDATES_TOTAL.inc("batch", value=len(rows))
+
+    def weight(name: str) -> np.ndarray:
+        return np.array([w[name] for w in weights], dtype=np.float64)[owner]
+
+    # порядок слагаемых как в recommend_films — чтобы баллы совпадали до бита
+    scores = (
+        weight("director") * features.director_scores_pairs(user_directors, owner, rows)
+        + weight("actors") * features.actors_scores_pairs(user_actors, owner, rows)
+        + weight("rating") * features.ratings_scores_pairs(user_ratings, owner, rows)
+        + weight("year") * features.years_scores_pairs(user_years, owner, rows)
+        + weight("desc") * desc_scores
+    )
+    scores = round_scores(scores)
+    timer.mark("features")
+
+    # по пользователям, внутри — по убыванию балла; при равных баллах — порядок по описанию
+    order = np.lexsort((np.arange(len(scores)), -scores, owner))
+    bounds = np.zeros(len(users) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owner, minlength=len(users)), out=bounds[1:])
+    ordered_rows, ordered_scores = rows[order].tolist(), scores[order].tolist()
+    for j, u in enumerate(users):
+        start, end = int(bounds[j]), int(bounds[j + 1])
+        if top_ns[u] is not None:
+            end = min(end, start + top_ns[u])
+        results[u] = [(films[i], score) for i, score in zip(ordered_rows[start:end], ordered_scores[start:end])]
+    timer.mark("sort")
+    return results
+
+
+# Обновление каталога на лету (без перезапуска и без переобучения TF-IDF)
+#
+# Новые и изменённые фильмы переводятся в TF-IDF уже обученным векторайзером и дописываются
+# в конец матрицы; старая строка заменённого или удалённого фильма помечается мёртвой (alive).
+# Когда каталог заметно уходит от обученного (needs_refit), в фоне запускается полное
+# переобучение; изменения, пришедшие во время него, записаны в журнал и применяются поверх.
+# Журнал ведётся только пока идёт переобучение — без него он не растёт.
+# Перезагрузка (reload) заменяет модель собранной заново на диске — тоже в фоне.
+
+_update_lock = threading.Lock()
+_journal: list[tuple[str, object]] = []
+_refits_running = 0               # сколько переобучений идёт (пока 0 — журнал не нужен)
+_refit_thread: threading.Thread | None = None
+_reload_thread: threading.Thread | None = None
+_generation = 0                   # растёт с каждой перезагрузкой: переобучение старой модели её не перетрёт
+reload_error: str | None = None   # чем закончилась последняя неудачная перезагрузка
+
+
+def current_state() -> ModelState:
+    """Текущая модель (ссылку достаточно взять один раз на весь запрос)."""
+    return state
+
+
+def _publish(new_state: ModelState):
+    """Подменяет текущую модель (и старые имена модуля) одним присваиванием на каждое имя."""
+    global state, films, vectorizer, tfidf_matrix, model_manifest, TITLE_TO_IDX, features
+    state = new_state
+    films = new_state.films
+    vectorizer = new_state.vectorizer
+    tfidf_matrix = new_state.tfidf_matrix
+    model_manifest = new_state.manifest
+    TITLE_TO_IDX = new_state.title_to_idx
+    features = new_state.features
+
+
+def _count_oov(vectorizer: TfidfVectorizer, descriptions: list[str]) -> tuple[int, int]:
+    """Сколько слов в описаниях и сколько из них нет в словаре векторайзера."""
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    tokens = [token for description in descriptions for token in analyzer(description)]
+    return len(tokens), sum(1 for token in tokens if token not in vocabulary)
+
+
+def _next_version(base: ModelState, op: str, parts: list[str]) -> str:
+    """Версия модели после изменения: одинаковые изменения одной модели дают одинаковую версию."""
+    digest = hashlib.sha1(f"{base.version}:{op}".encode("utf-8"))
+    for part in parts:
+        digest.update(b"\x1f" + part.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _film_key(film: Film) -> str:
+    return "\x1e".join([film.title, str(film.year), str(film.rating), film.director,
+                        ";".join(film.country), ";".join(film.actors), film.description])
+
+
+def _with_added(base: ModelState, new_films: list[Film]) -> ModelState:
+    """Новый state: new_films дописаны в конец, прежние строки с теми же названиями — мёртвые."""
+    descriptions = [film.description for film in new_films]
+    new_rows = transform_tfidf(base.vectorizer, descriptions)
+    new_tokens, oov_tokens = _count_oov(base.vectorizer, descriptions)
+
+    embedding, new_desc = base.embedding, new_rows
+    if embedding is not None:
+        new_desc = embedding.transform(new_rows)
+        embedding = embedding.extended(new_desc)
+
+    films = base.films.extended(new_films)
+    alive = np.concatenate([base.alive, np.ones(len(new_films), dtype=bool)])
+    title_to_idx = dict(base.title_to_idx)
+    for offset, film in enumerate(new_films):
+        old = title_to_idx.get(film.title)
+        if old is not None:
+            alive[old] = False
+        title_to_idx[film.title] = len(base.films) + offset
+
+    return ModelState(
+        films, base.vectorizer, vstack([base.tfidf_matrix, new_rows], format="csr"),
+        manifest=base.manifest, alive=alive, features=base.features.extended(films),
+        title_to_idx=title_to_idx,
+        retriever=base.retriever.extended(new_desc) if base.retriever is not None else None,
+        neighbors=base.neighbors, embedding=embedding,
+        version=_next_version(base, "add", [_film_key(film) for film in new_films]),
+        fitted_docs=base.fitted_docs,
+        changed_docs=base.changed_docs + len(new_films),
+        new_tokens=base.new_tokens + new_tokens, oov_tokens=base.oov_tokens + oov_tokens,
+    )
+
+
+def _with_removed(base: ModelState, titles: list[str]) -> ModelState:
+    """Новый state без фильмов titles (их строки помечаются мёртвыми)."""
+    alive = base.alive.copy()
+    title_to_idx = dict(base.title_to_idx)
+    for title in titles:
+        alive[title_to_idx.pop(title)] = False
+    return ModelState(
+        base.films, base.vectorizer, base.tfidf_matrix, manifest=base.manifest, alive=alive,
+        features=base.features, title_to_idx=title_to_idx, retriever=base.retriever,
+        neighbors=base.neighbors, filter_index=base._filter_index, embedding=base.embedding,
+        version=_next_version(base, "remove", titles),
+        fitted_docs=base.fitted_docs,
+        changed_docs=base.changed_docs + len(titles),
+        new_tokens=base.new_tokens, oov_tokens=base.oov_tokens,
+    )
+
+
+def _apply(base: ModelState, op: str, payload) -> ModelState:
+    if op == "add":
+        return _with_added(base, payload)
+    if op == "update":
+        old_title, film = payload
+        if old_title != film.title:
+            base = _with_removed(base, [old_title])
+        return _with_added(base, [film])
+    return _with_removed(base, payload)
+
+
+def _change(op: str, payload) -> ModelState:
+    """
+    Применяет изменение к текущей модели, во время переобучения записывает его в журнал
+    и при дрейфе планирует переобучение.
+    """
+    with _update_lock:
+        new_state = _apply(state, op, payload)
+        _publish(new_state)
+        if _refits_running:
+            _journal.append((op, payload))
+    if new_state.needs_refit():
+        schedule_refit()
+    return new_state
+
+
+def add_films(new_films: list[Film]) -> ModelState:
+    """
+    Добавляет фильмы в каталог. Фильм с уже существующим названием заменяет прежний.
+    Описания переводятся в TF-IDF текущим словарём (без переобучения).
+    """
+    return _change("add", list(new_films))
+
+
+def update_film(title: str, film: Film) -> ModelState:
+    """Заменяет фильм title на film (название тоже может поменяться)."""
+    if title not in state.title_to_idx:
+        raise KeyError(title)
+    return _change("update", (title, film))
+
+
+def remove_films(titles: list[str]) -> ModelState:
+    """Удаляет фильмы из каталога. KeyError, если какого-то названия нет."""
+    missing = [title for title in titles if title not in state.title_to_idx]
+    if missing:
+        raise KeyError(", ".join(missing))
+    return _change("remove", list(dict.fromkeys(titles)))
+
+
+def refit() -> ModelState:
+    """
+    Полностью переобучает TF-IDF на живых фильмах и подменяет модель.
+    Обучение идёт без блокировки; изменения, пришедшие за это время, берутся из журнала.
+    """
+    global _refits_running
+    with _update_lock:
+        base = state
+        mark = len(_journal)
+        generation = _generation
+        _refits_running += 1
+
+    try:
+        films = base.films.take(np.flatnonzero(base.alive).tolist())
+        fitted = build_state(films, *fit_tfidf(films.descriptions()))
+
+        with _update_lock:
+            if generation != _generation:
+                return state   # пока обучали, модель перезагрузили с диска — переобученная уже не нужна
+            for op, payload in _journal[mark:]:
+                fitted = _apply(fitted, op, payload)
+            _publish(fitted)
+        return fitted
+    finally:
+        with _update_lock:
+            _refits_running -= 1
+            if not _refits_running:
+                _journal.clear()
+
+
+def schedule_refit() -> bool:
+    """Запускает переобучение в фоновом потоке (если оно ещё не идёт). True — если запущено."""
+    global _refit_thread
+    with _update_lock:
+        if _refit_thread is not None and _refit_thread.is_alive():
+            return False
+        _refit_thread = threading.Thread(target=refit, name="tfidf-refit", daemon=True)
+        _refit_thread.start()
+    return True
+
+
+def refit_running() -> bool:
+    return _refit_thread is not None and _refit_thread.is_alive()
+
+
+def reload(prepare=None) -> ModelState:
+    """
+    Заново загружает модель с диска (артефакт MODEL_DIR или CSV, как при старте) и подменяет текущую.
+    Загрузка идёт без блокировки: новые запросы до подмены считаются по прежней модели,
+    а начатые досчитываются по той, что взяли, — прежняя освобождается вместе с последней ссылкой.
+    Изменения каталога через админку, не попавшие на диск, при этом отбрасываются.
+    prepare(new_state) вызывается перед подменой (например, поднять процессы пула на новой модели).
+    Модель той же версии, что текущая, не подменяется.
+    Источник считается загруженным (source_changed() == False) только после удачной загрузки:
+    если файл был недописан и загрузка упала, MODEL_WATCH_SECONDS попробует ещё раз.
+    """
+    global _loaded_stamp, _generation
+    for _ in range(3):
+        stamp = source_stamp()
+        loaded = load_initial_model(fresh=True)
+        if source_stamp() == stamp:
+            break
+    else:
+        raise RuntimeError(f"{model_source()} меняется во время загрузки")
+    new_state = build_state(*loaded)
+    if new_state.version == state.version:
+        _loaded_stamp = stamp
+        return state
+    if prepare is not None:
+        prepare(new_state)
+    with _update_lock:
+        _generation += 1
+        _journal.clear()
+        _publish(new_state)
+        _loaded_stamp = stamp
+    return new_state
+
+
+def _reload_in_background(prepare):
+    global reload_error
+    try:
+        reload(prepare)
+        reload_error = None
+    except Exception as e:   # прежняя модель остаётся; ошибка видна в /admin/model
+        reload_error = f"{type(e).__name__}: {e}"
+
+
+def schedule_reload(prepare=None) -> bool:
+    """Запускает reload в фоновом потоке (если он ещё не идёт). True — если запущен."""
+    global _reload_thread
+    with _update_lock:
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return False
+        _reload_thread = threading.Thread(target=_reload_in_background, args=(prepare,),
+                                          name="model-reload", daemon=True)
+        _reload_thread.start()
+    return True
 
-    top_idx, sims = top_k_by_description(user_indices, tfidf_matrix, k=TOP_K)
-
-    recommendations = []
-    for idx in top_idx:
-        film = films[idx]
-        if film.title in user_titles:
-            continue  # не советуем то, что уже выбрано
-
-        director_score = compare_director(user_directors, film.director)
-        actors_score = compare_actors(user_actors, film.actors)
-        rating_score = compare_ratings(user_ratings, film.rating)
-        years_score = compare_years(user_years, film.year)
-        description_score = float(sims[idx])  
-
-        score = (
-            w["director"] * director_score
-            + w["actors"] * actors_score
-            + w["rating"] * rating_score
-            + w["year"] * years_score
-            + w["desc"] * description_score
-        )
-        recommendations.append((film, round(float(score), 3)))
 
-    sorted_recommendations = sorted(recommendations, key=lambda x: x[1], reverse=True)
-    return sorted_recommendations
+def reload_running() -> bool:
+    return _reload_thread is not None and _reload_thread.is_alive()
 
 
+def source_changed() -> bool:
+    """Источник модели на диске изменился с последней загрузки."""
+    return source_stamp() != _loaded_stamp
@@ -0,0 +1,288 @@
+"""
+Кэш готовых ответов /recommend.
+
+Ключ — нормализованный набор названий без учёта порядка и повторов + top_n,
+плюс версия модели: после изменения каталога или переобучения старые ответы не отдаются.
+Значение — уже закодированный JSON ответа (bytes).
+
+ResultCache — LRU в памяти процесса с ограничениями по числу записей, байтам и времени жизни (TTL)
+и счётчиками попаданий/промахов. Вторым уровнем можно подключить общий кэш (SharedCacheClient),
+чтобы воркеры делили попадания. Общий кэш — отдельный процесс
+
+    python result_cache.py [адрес]
+
+(адрес host:port или путь к unix-сокету, по умолчанию 127.0.0.1:6390), а воркеры находят его
+по переменной окружения RESULT_CACHE_URL. Если общий кэш недоступен, работает только локальный.
+Соединение проверяется общим секретом RESULT_CACHE_AUTHKEY — без него ни кэш, ни клиенты
+не запускаются. По соединению ходят только байты (операция, ключ, ответ), без pickle:
+даже клиент с ключом не может заставить другую сторону выполнить свой код.
+"""
+
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "4096"))                  # записей; 0 — кэш выключен
+RESULT_CACHE_BYTES = int(os.environ.get("RESULT_CACHE_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "600"))                   # секунд; 0 — без срока
+RESULT_CACHE_URL = os.environ.get("RESULT_CACHE_URL", "")                             # общий кэш; "" — нет
+RESULT_CACHE_AUTHKEY = os.environ.get("RESULT_CACHE_AUTHKEY", "").encode("utf-8")    # обязателен для общего кэша
+DEFAULT_ADDRESS = "127.0.0.1:6390"
+
+# Сообщения общего кэша (bytes):
+#   b"g" + ключ                                  -> b"\x01" + ответ | b"\x00" (нет)
+#   b"p" + ttl (double) + длина ключа (uint32) + ключ + ответ -> b"\x01"
+_PUT_HEADER = struct.Struct("<dI")
+_HIT, _MISS = b"\x01", b"\x00"
+
+
+def require_authkey(authkey: bytes) -> bytes:
+    if not authkey:
+        raise RuntimeError("общий кэш ответов требует RESULT_CACHE_AUTHKEY (общий секрет кэша и воркеров)")
+    return authkey
+
+
+def cache_key(titles: list[str], top_n: int, fields: tuple[str, ...] | None = None, filters: str = "") -> str:
+    """
+    Ключ запроса: названия нормализуются, порядок и повторы не важны.
+    fields — набор полей ответа, если отдаются не все (None — все поля);
+    filters — условия фильтра (FilmFilter.key(), "" — без фильтра).
+    """
+    names = sorted({title.strip().lower() for title in titles})
+    key = "\x1f".join([str(top_n), *names])
+    if fields is not None:
+        key += "\x1e" + ",".join(fields)
+    if filters:
+        key += "\x1d" + filters
+    return key
+
+
+def parse_address(url: str):
+    """host:port -> (host, port) для TCP, иначе путь к unix-сокету."""
+    host, sep, port = url.rpartition(":")
+    if sep and port.isdigit():
+        return host or "127.0.0.1", int(port)
+    return url
+
+
+class ResultCache:
+    """
+    LRU-кэш ответов с TTL и ограничением по байтам. Потокобезопасный.
+    version — версия модели: при смене версии все записи сбрасываются.
+    shared — общий кэш второго уровня (None — только локальный).
+    """
+
+    def __init__(self, max_items: int = RESULT_CACHE_SIZE, max_bytes: int = RESULT_CACHE_BYTES,
+                 ttl: float = RESULT_CACHE_TTL, shared: "SharedCacheClient | None" = None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = shared
+        self.version: str | None = None
+        self._items: OrderedDict[str, tuple[float, bytes]] = OrderedDict()   # ключ -> (когда истекает, ответ)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0
+
+    def _check_version(self, version: str):
+        """Под блокировкой: новая версия модели — старые записи больше не нужны."""
+        if version != self.version:
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+            self._bytes = 0
+            self.version = version
+
+    def _drop(self, key: str):
+        _, value = self._items.pop(key)
+        self._bytes -= len(value)
+
+    def get(self, version: str, key: str) -> bytes | None:
+        if not self.enabled:
+            return None
+        value = self.get_local(version, key)
+        if value is not None:
+            return value
+        if self.shared is not None:
+            value = self.shared.get(f"{version}\x1d{key}")
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                self.put_local(version, key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_local(self, version: str, key: str) -> bytes | None:
+        """Только локальный уровень, без обращения к общему кэшу; промах здесь не считается."""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            item = self._items.get(key)
+            if item is not None and item[0] >= now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                self._drop(key)
+        return None
+
+    def put(self, version: str, key: str, value: bytes):
+        if not self.enabled:
+            return
+        self.put_local(version, key, value)
+        if self.shared is not None:
+            self.shared.put(f"{version}\x1d{key}", value, self.ttl)
+
+    def put_local(self, version: str, key: str, value: bytes, ttl: float | None = None):
+        """Запись только в локальный кэш (ttl=None — TTL кэша)."""
+        ttl = self.ttl if ttl is None else ttl
+        if len(value) > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl > 0 else float("inf")
+        with self._lock:
+            self._check_version(version)
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (expires, value)
+            self._bytes += len(value)
+            while len(self._items) > self.max_items or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "items": len(self._items),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "shared": self.shared.stats() if self.shared is not None else None,
+            }
+
+
+class SharedCacheClient:
+    """
+    Клиент общего кэша (процесс serve). Одно соединение на клиента, запросы под блокировкой.
+    Любая ошибка соединения — промах; переподключение не чаще раза в retry_after секунд.
+    """
+
+    def __init__(self, url: str, authkey: bytes = RESULT_CACHE_AUTHKEY, retry_after: float = 5.0):
+        self.address = parse_address(url)
+        self.authkey = require_authkey(authkey)
+        self.retry_after = retry_after
+        self._conn = None
+        self._failed_at = float("-inf")
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    def _call(self, request: bytes) -> bytes | None:
+        with self._lock:
+            if self._conn is None:
+                if time.monotonic() - self._failed_at < self.retry_after:
+                    return None
+                try:
+                    self._conn = Client(self.address, authkey=self.authkey)
+                except (OSError, EOFError, AuthenticationError):
+                    self._failed_at = time.monotonic()
+                    self.errors += 1
+                    return None
+            try:
+                self._conn.send_bytes(request)
+                return self._conn.recv_bytes()
+            except (OSError, EOFError):
+                self._conn.close()
+                self._conn = None
+                self._failed_at = time.monotonic()
+                self.errors += 1
+                return None
+
+    def get(self, key: str) -> bytes | None:
+        response = self._call(b"g" + key.encode("utf-8"))
+        return response[1:] if response is not None and response[:1] == _HIT else None
+
+    def put(self, key: str, value: bytes, ttl: float):
+        key_bytes = key.encode("utf-8")
+        self._call(b"p" + _PUT_HEADER.pack(ttl, len(key_bytes)) + key_bytes + value)
+
+    def stats(self) -> dict:
+        return {"address": str(self.address), "connected": self._conn is not None, "errors": self.errors}
+
+
+def shared_client_from_env() -> SharedCacheClient | None:
+    return SharedCacheClient(RESULT_CACHE_URL) if RESULT_CACHE_URL else None
+
+
+def _handle(request: bytes, store: ResultCache) -> bytes:
+    """Ответ общего кэша на одно сообщение; непонятное сообщение — промах."""
+    op, body = request[:1], request[1:]
+    try:
+        if op == b"g":
+            value = store.get("", body.decode("utf-8"))
+            return _MISS if value is None else _HIT + value
+        if op == b"p":
+            ttl, key_len = _PUT_HEADER.unpack_from(body)
+            key_end = _PUT_HEADER.size + key_len
+            if key_end <= len(body):
+                store.put_local("", body[_PUT_HEADER.size:key_end].decode("utf-8"), body[key_end:], ttl)
+                return _HIT
+    except (struct.error, UnicodeDecodeError):
+        pass
+    return _MISS
+
+
+def _serve_connection(conn, store: ResultCache):
+    """Обслуживает одного клиента; сообщение длиннее max_bytes кэша (с запасом на ключ) — обрыв."""
+    max_length = store.max_bytes + 65536
+    with conn:
+        while True:
+            try:
+                conn.send_bytes(_handle(conn.recv_bytes(max_length), store))
+            except (EOFError, OSError):
+                return
+
+
+def serve(url: str = DEFAULT_ADDRESS, authkey: bytes = RESULT_CACHE_AUTHKEY):
+    """Общий кэш: отдельный процесс, хранит записи в своём ResultCache (версия модели уже в ключе)."""
+    store = ResultCache()
+    with Listener(parse_address(url), authkey=require_authkey(authkey)) as listener:
+        print(f"Общий кэш ответов слушает {url}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue   # клиент с неверным ключом или оборвал соединение
+            threading.Thread(target=_serve_connection, args=(conn, store), daemon=True).start()
+
+
+if __name__ == "__main__":
+    try:
+        serve(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ADDRESS)
+    except RuntimeError as e:
+        sys.exit(str(e))
@@ -0,0 +1,274 @@
+"""
+Пул для тяжёлых расчётов рекомендаций, чтобы они не шли в общем пуле потоков Starlette.
+
+ScoringPool — пул фиксированного размера (потоки или процессы) с ограниченной очередью:
+- одновременно принимается не больше workers + queue_size задач, остальные сразу
+  получают Overloaded (в API — 503), а не ждут все вместе
+- у каждой задачи есть срок (deadline): если он прошёл, пока задача ждала в очереди,
+  она не считается вовсе; если истёк во время ожидания ответа — DeadlineExceeded (в API — 504)
+
+Настройки: SCORING_POOL (thread | process), SCORING_WORKERS, SCORING_QUEUE, SCORING_TIMEOUT (секунд).
+В режиме process каждый процесс держит свою модель (из артефакта model_store — общие страницы
+через mmap), поэтому изменения каталога через админку до них не доходят. Модель, пересобранную
+на диске, процессы получают через restart: новые поднимаются и загружают её заранее,
+прежние доделывают начатые задачи и завершаются.
+
+MicroBatcher (включается MICROBATCH_WINDOW_MS > 0) собирает запросы, пришедшие в течение
+нескольких миллисекунд (но не больше MICROBATCH_MAX), и отправляет их в пул одной задачей,
+чтобы посчитать всех одним произведением матриц.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+from metrics import QUEUE_WAIT, MICROBATCH_SIZE, captured
+
+SCORING_POOL = os.environ.get("SCORING_POOL", "thread")
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", str(os.cpu_count() or 1)))
+SCORING_QUEUE = int(os.environ.get("SCORING_QUEUE", "64"))
+SCORING_TIMEOUT = float(os.environ.get("SCORING_TIMEOUT", "10"))
+MICROBATCH_WINDOW_MS = float(os.environ.get("MICROBATCH_WINDOW_MS", "0"))   # 0 — без микробатчей
+MICROBATCH_MAX = int(os.environ.get("MICROBATCH_MAX", "32"))
+
+
+class Overloaded(Exception):
+    """Очередь пула заполнена — запрос отклоняется сразу."""
+
+
+class DeadlineExceeded(Exception):
+    """Срок запроса истёк (в очереди или во время расчёта)."""
+
+
+class ModelChanged(Exception):
+    """У процесса пула уже другая модель, чем та, по которой запрос начинали считать."""
+
+
+def _call_before_deadline(submitted: float, deadline: float, fn, args):
+    # время — time.time(), а не monotonic: срок сравнивается и в других процессах.
+    # Вместе с результатом возвращается, сколько задача прождала в очереди
+    started = time.time()
+    if started > deadline:
+        raise DeadlineExceeded()
+    return fn(*args), started - submitted
+
+
+class ScoringPool:
+    """
+    Пул фиксированного размера с ограниченной очередью и сроками задач.
+    kind — "thread" или "process"; для процессов fn и аргументы должны передаваться через pickle.
+    """
+
+    def __init__(self, kind: str = SCORING_POOL, workers: int = SCORING_WORKERS,
+                 queue_size: int = SCORING_QUEUE, timeout: float = SCORING_TIMEOUT):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"SCORING_POOL должен быть thread или process, а не {kind!r}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.timeout = timeout
+        self._executor: Executor = self._new_executor()
+        self._lock = threading.Lock()
+        self.pending = 0       # принятые и ещё не завершённые задачи (в очереди и в работе)
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    def _new_executor(self) -> Executor:
+        if self.kind == "thread":
+            return ThreadPoolExecutor(self.workers, thread_name_prefix="scoring")
+        return ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"), initializer=_init_process)
+
+    def _done(self, _future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args, timeout: float | None = None):
+        """
+        Выполняет fn(*args) в пуле и ждёт результат.
+        Overloaded — если очередь заполнена; DeadlineExceeded — если не уложились в timeout
+        (по умолчанию SCORING_TIMEOUT). Слот освобождается, только когда задача реально закончилась.
+        """
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            if self.pending >= self.workers + self.queue_size:
+                self.rejected += 1
+                raise Overloaded()
+            # под блокировкой: restart не закроет пул между выбором и отправкой задачи
+            now = time.time()
+            future = self._executor.submit(_call_before_deadline, now, now + timeout, fn, args)
+            self.pending += 1
+        future.add_done_callback(self._done)
+        try:
+            # при истечении срока ожидание отменяется; ещё не начатая задача убирается из очереди
+            result, waited = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            with self._lock:
+                self.timeouts += 1
+            raise DeadlineExceeded() from None
+        QUEUE_WAIT.observe(waited)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "timeout": self.timeout,
+                "pending": self.pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "restarts": self.restarts,
+            }
+
+    def restart(self, version: str | None = None):
+        """
+        Заменяет процессы пула новыми (для потоков ничего не делает — модель у них общая с сервером).
+        Новые процессы сначала поднимаются и загружают модель, и только потом принимают запросы;
+        прежние доделывают начатые задачи и завершаются. version — какая модель должна оказаться
+        в новых процессах: другая (артефакт успели пересобрать ещё раз) — RuntimeError, пул прежний.
+        """
+        if self.kind != "process":
+            return
+        executor = self._new_executor()
+        # по задаче на процесс, отправленные разом: каждая поднимает свой процесс
+        versions = {future.result() for future in [executor.submit(_model_version) for _ in range(self.workers)]}
+        if version is not None and versions != {version}:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise RuntimeError(f"процессы пула загрузили модель {', '.join(sorted(versions))}, а не {version}")
+        with self._lock:
+            old, self._executor = self._executor, executor
+            self.restarts += 1
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MicroBatcher:
+    """
+    Склеивает одновременные запросы в пачки: первый запрос открывает окно window_ms,
+    пачка уходит в пул, когда окно закрылось или набралось max_size запросов.
+    Если все воркеры пула заняты пачками, закрытое окно ждёт, пока освободится воркер:
+    под нагрузкой пачки сами становятся крупнее.
+    run_batch(items) выполняется в пуле и возвращает по результату (или исключению) на каждый item.
+    Перегрузка пула (Overloaded) достаётся всей пачке, срок (DeadlineExceeded) — каждому запросу свой.
+    """
+
+    def __init__(self, pool: ScoringPool, run_batch, window_ms: float = MICROBATCH_WINDOW_MS,
+                 max_size: int = MICROBATCH_MAX):
+        self.pool = pool
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self._items: list[tuple[object, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._running = 0      # пачек в пуле
+        self.batches = 0
+        self.batched_items = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, item, timeout: float | None = None):
+        """Добавляет item в текущую пачку и ждёт его результат (не дольше timeout)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # ошибку заберёт и тот, кто уже не ждёт (истёк срок), — чтобы asyncio не ругался на потерянную
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._items.append((item, future))
+        if len(self._items) >= self.max_size:
+            self._flush()
+        elif len(self._items) == 1:
+            self._timer = loop.call_later(self.window, self._on_window)
+        timeout = self.pool.timeout if timeout is None else min(timeout, self.pool.timeout)
+        try:
+            # shield: если срок истёк у одного запроса, пачка для остальных не отменяется
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded() from None
+
+    def _on_window(self):
+        self._timer = None
+        if self._running < self.pool.workers:
+            self._flush()
+        # иначе пачка уйдёт, когда закончится одна из идущих (_run)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._items = self._items, []
+        if batch:
+            self.batches += 1
+            self.batched_items += len(batch)
+            MICROBATCH_SIZE.observe(len(batch))
+            self._running += 1
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: list[tuple[object, asyncio.Future]]):
+        try:
+            results = await self.pool.run(self.run_batch, [item for item, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            self._running -= 1
+            if self._items and self._timer is None:
+                self._flush()   # окно уже закрылось, пока воркеры были заняты
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            "batches": self.batches,
+            "avg_batch": self.batched_items / self.batches if self.batches else 0.0,
+        }
+
+
+# Процессный режим: модель загружается в каждом процессе один раз
+
+def _init_process():
+    import recommend_v3  # noqa: F401 — загрузка модели при старте процесса
+
+
+def _model_version() -> str:
+    import recommend_v3
+
+    return recommend_v3.current_state().version
+
+
+def score_titles(titles: list[str], top_n: int | None, film_filter=None,
+                 version: str | None = None) -> tuple[list[tuple[int, float]], list]:
+    """
+    recommend_films в процессе пула по точным названиям из каталога (film_filter — FilmFilter или None).
+    Возвращает (номер строки, балл): фильмы собирает вызывающий процесс из своего каталога, —
+    и замеры расчёта (этапы, кандидаты) для metrics.replay в вызывающем процессе.
+    version — версия модели вызывающего процесса: номера строк имеют смысл только для неё,
+    поэтому при другой модели (пул уже перезапущен) — ModelChanged.
+    """
+    import recommend_v3
+
+    state = recommend_v3.current_state()
+    if version is not None and state.version != version:
+        raise ModelChanged()
+    liked = [state.films[state.title_to_idx[title]] for title in titles]
+    with captured() as records:
+        scored = [(state.title_to_idx[film.title], score)
+                  for film, score in recommend_v3.recommend_films(liked, state.films, top_n=top_n, state=state,
+                                                                  film_filter=film_filter)]
+    return scored, records
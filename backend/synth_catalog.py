@@ -0,0 +1,127 @@
+"""
+Генератор синтетического каталога фильмов в той же схеме CSV, что и data/kinopoisk-top250.csv.
+
+    python synth_catalog.py N out.csv [--seed 0]
+
+Нужен для замеров на больших каталогах (10k, 100k, 1M строк), которых у нас нет.
+Всё берётся из настоящего каталога, чтобы распределения были похожи:
+- описания — слова настоящих описаний с их частотами плюс редкие «придуманные» слова
+  (словарь растёт с размером каталога, как в жизни), длина — как у настоящих описаний
+- режиссёры и актёры — сочетания настоящих имён и фамилий; популярные встречаются чаще
+  (закон Ципфа), поэтому у фильмов есть общие актёры
+- страны, годы и рейтинги — выборка из настоящих значений
+Названия уникальные: настоящее название + " #номер". Один и тот же seed даёт тот же файл.
+Пишется кусками, поэтому и 1M строк не требует держать весь каталог в памяти.
+"""
+
+import argparse
+import csv
+import re
+from collections import Counter
+
+import numpy as np
+
+from data_loader import load_films_from_csv
+
+SOURCE_CSV = "data/kinopoisk-top250.csv"
+CSV_HEADER = ["rating", "movie", "year", "country", "rating_ball", "overview", "director",
+              "screenwriter", "actors", "url_logo"]
+CHUNK_ROWS = 10_000
+SYLLABLES = ["ка", "ро", "ми", "ла", "ст", "ве", "ни", "то", "ру", "ше", "да", "ль", "го", "за", "пе", "ор"]
+
+
+def _zipf_choice(rng: np.random.Generator, n: int, size, a: float = 1.1) -> np.ndarray:
+    """Номера 0..n-1 с вероятностью ~ 1 / (номер + 1)^a: первые встречаются намного чаще."""
+    weights = 1.0 / np.arange(1, n + 1) ** a
+    return rng.choice(n, size=size, p=weights / weights.sum())
+
+
+def _made_up_words(rng: np.random.Generator, n: int) -> list[str]:
+    """n разных «слов» из слогов — редкие слова, которых нет в настоящих описаниях."""
+    words: set[str] = set()
+    while len(words) < n:
+        count = int(rng.integers(2, 5))
+        words.add("".join(SYLLABLES[i] for i in rng.integers(0, len(SYLLABLES), count)))
+    return sorted(words)
+
+
+class CatalogSampler:
+    """Пулы значений из настоящего каталога, из которых собираются синтетические фильмы."""
+
+    def __init__(self, n_rows: int, seed: int = 0, source: str = SOURCE_CSV):
+        self.rng = np.random.default_rng(seed)
+        films = load_films_from_csv(source)
+        self.titles = [film.title for film in films]
+        self.years = np.array([film.year for film in films if film.year], dtype=np.int64)
+        self.ratings = np.array([film.rating for film in films if film.rating], dtype=np.float64)
+        self.countries = [film.country for film in films if film.country]
+        self.lengths = np.array([len(film.description.split()) for film in films if film.description])
+
+        # частые слова — из настоящих описаний по частоте; редкие — придуманные, их больше в большом каталоге
+        counts = Counter(word for film in films for word in re.findall(r"\w+", film.description.lower()))
+        self.words = [word for word, _ in counts.most_common()] + _made_up_words(self.rng, max(1000, n_rows // 5))
+
+        # люди: имена и фамилии настоящих актёров и режиссёров, перемешанные между собой
+        people = [name for film in films for name in [film.director, *film.actors] if name]
+        first = sorted({name.split()[0] for name in people})
+        last = sorted({name.split()[-1] for name in people if len(name.split()) > 1})
+        n_people = max(len(people), n_rows // 2)
+        first_idx = self.rng.integers(0, len(first), n_people)
+        last_idx = self.rng.integers(0, len(last), n_people)
+        self.people = [f"{first[i]} {last[j]}" for i, j in zip(first_idx.tolist(), last_idx.tolist())]
+        self.n_directors = max(50, n_rows // 10)
+
+    def rows(self, start: int, count: int) -> list[list]:
+        """count строк CSV начиная с номера start."""
+        rng = self.rng
+        lengths = rng.choice(self.lengths, count)
+        word_idx = _zipf_choice(rng, len(self.words), int(lengths.sum()))
+        directors = _zipf_choice(rng, self.n_directors, count)
+        n_actors = rng.integers(3, 9, count)
+        actor_idx = _zipf_choice(rng, len(self.people), int(n_actors.sum()), a=0.9)
+        years = rng.choice(self.years, count)
+        ratings = rng.choice(self.ratings, count)
+        title_idx = rng.integers(0, len(self.titles), count)
+        country_idx = rng.integers(0, len(self.countries), count)
+
+        out = []
+        w = a = 0
+        for i in range(count):
+            words = [self.words[j] for j in word_idx[w:w + lengths[i]].tolist()]
+            w += lengths[i]
+            actors = [self.people[j] for j in actor_idx[a:a + n_actors[i]].tolist()]
+            a += n_actors[i]
+            row_no = start + i
+            out.append([
+                row_no,
+                f"{self.titles[title_idx[i]]} #{row_no}",
+                int(years[i]),
+                "; ".join(self.countries[country_idx[i]]),
+                round(float(ratings[i]), 3),
+                " ".join(words).capitalize() + ".",
+                self.people[directors[i]],
+                "",
+                "; ".join(actors),
+                "",
+            ])
+        return out
+
+
+def generate(n_rows: int, path: str, seed: int = 0, source: str = SOURCE_CSV):
+    """Пишет синтетический каталог из n_rows фильмов в path."""
+    sampler = CatalogSampler(n_rows, seed, source)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for start in range(0, n_rows, CHUNK_ROWS):
+            writer.writerows(sampler.rows(start, min(CHUNK_ROWS, n_rows - start)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетический каталог фильмов в схеме kinopoisk-top250.csv")
+    parser.add_argument("n_rows", type=int)
+    parser.add_argument("out", help="куда записать CSV")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.n_rows, args.out, args.seed)
+    print(f"{args.n_rows} фильмов записано в {args.out}")
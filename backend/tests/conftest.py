@@ -0,0 +1,67 @@
+"""
+Общие настройки тестов. Запуск из папки backend:
+
+    python -m pytest -q
+
+Модули бэкенда читают окружение и загружают модель при импорте, поэтому окружение
+задаётся здесь, до их импорта: модель обучается по настоящему CSV на 250 фильмов,
+без артефакта, таблицы соседей и общего кэша — что бы ни было задано у разработчика.
+"""
+
+import os
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BACKEND)   # пути вида data/... в модулях — от папки backend
+sys.path.insert(0, BACKEND)
+
+os.environ.update(
+    FILMS_CSV="data/kinopoisk-top250.csv",
+    MODEL_DIR="",
+    NEIGHBORS_DIR="",
+    DESC_SPACE="tfidf",
+    DESC_INDEX="exact",
+    SCORING_POOL="thread",
+    MICROBATCH_WINDOW_MS="0",
+    RESULT_CACHE_URL="",
+    MODEL_WATCH_SECONDS="0",
+    ADMIN_TOKEN="test-token",
+)
+
+import recommend_v3  # noqa: E402
+
+CSV = os.path.join(BACKEND, "data", "kinopoisk-top250.csv")
+ADMIN = {"X-Admin-Token": "test-token"}
+
+
+@pytest.fixture
+def client():
+    """
+    Клиент API без lifespan: при выходе из него останавливается пул расчёта,
+    а app с пулом один на все тесты.
+    """
+    from fastapi.testclient import TestClient
+
+    import app
+
+    return TestClient(app.app)
+
+
+@pytest.fixture
+def model():
+    """
+    recommend_v3 для теста, который меняет модель (админка, переобучение, перезагрузка):
+    после теста возвращаются исходная модель и источник.
+    """
+    saved = recommend_v3.current_state(), recommend_v3.FILMS_CSV, recommend_v3.MODEL_DIR, recommend_v3._loaded_stamp
+    yield recommend_v3
+    for thread in (recommend_v3._refit_thread, recommend_v3._reload_thread):
+        if thread is not None:
+            thread.join()
+    state, recommend_v3.FILMS_CSV, recommend_v3.MODEL_DIR, recommend_v3._loaded_stamp = saved
+    with recommend_v3._update_lock:
+        recommend_v3._journal.clear()
+        recommend_v3._publish(state)
+    recommend_v3.reload_error = None
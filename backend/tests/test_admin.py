@@ -0,0 +1,61 @@
+from conftest import ADMIN
+
+NEW = "Тестовый фильм"
+
+
+def film_payload(film, **changes) -> dict:
+    payload = {"title": film.title, "year": film.year, "description": film.description, "director": film.director,
+               "actors": film.actors, "country": film.country, "rating": film.rating}
+    return {**payload, **changes}
+
+
+def recommended(client, title: str, top_n: int = 5) -> list[str]:
+    r = client.post("/recommend", json={"liked_titles": [title], "top_n": top_n})
+    assert r.status_code == 200, r.text
+    return [film["title"] for film in r.json()["recommendations"]]
+
+
+def test_admin_requires_token(client):
+    assert client.get("/admin/model").status_code == 401
+    assert client.get("/admin/model", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.get("/admin/model", headers=ADMIN).status_code == 200
+
+
+def test_add_update_remove_then_refit(model, client):
+    base = model.current_state()
+    donor, removed = base.films[0], base.films[1]
+
+    # копия описания, режиссёра и актёров — новый фильм первым в рекомендациях к исходному
+    r = client.post("/admin/films", headers=ADMIN, json=[film_payload(donor, title=NEW)])
+    assert r.status_code == 200
+    assert r.json()["version"] != base.version
+    assert recommended(client, donor.title)[0] == NEW
+
+    r = client.put(f"/admin/films/{NEW.lower()}", headers=ADMIN,
+                   json=film_payload(donor, title=NEW, director="Другой режиссёр", actors=[],
+                                     description="Совсем другое описание про космос и роботов"))
+    assert r.status_code == 200
+    state = model.current_state()
+    assert state.films[state.title_to_idx[NEW]].director == "Другой режиссёр"
+    assert NEW not in recommended(client, donor.title)
+
+    assert client.delete(f"/admin/films/{removed.title}", headers=ADMIN).status_code == 200
+    assert client.post("/recommend", json={"liked_titles": [removed.title]}).status_code == 404
+    assert removed.title not in recommended(client, donor.title, top_n=249)
+    assert client.delete(f"/admin/films/{removed.title}", headers=ADMIN).status_code == 404
+
+    before = model.current_state()
+    assert client.post("/admin/refit", headers=ADMIN).json() == {"started": True}
+    model._refit_thread.join()
+    refitted = model.current_state()
+    assert refitted.version != before.version
+    assert not refitted.has_removed
+    assert len(refitted.films) == 250
+    assert removed.title not in refitted.title_to_idx
+    assert refitted.films[refitted.title_to_idx[NEW]].director == "Другой режиссёр"
+
+    # переобученная модель — та же, что обученная с нуля на том же каталоге
+    fresh = model.build_state(refitted.films, *model.fit_tfidf(refitted.films.descriptions()))
+    liked = [refitted.films[refitted.title_to_idx[donor.title]]]
+    assert ([(film.title, score) for film, score in model.recommend_films(liked, refitted.films, state=refitted)]
+            == [(film.title, score) for film, score in model.recommend_films(liked, fresh.films, state=fresh)])
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import app
+from scoring_pool import ScoringPool
+
+
+@pytest.mark.parametrize("body, detail", [
+    ({"liked_titles": []}, "liked_titles is empty"),
+    ({"liked_titles": ["Матрица"], "top_n": 0}, "top_n must be positive"),
+    ({"liked_titles": ["Матрица"], "top_n": -3}, "top_n must be positive"),
+])
+def test_bad_request(client, body, detail):
+    r = client.post("/recommend", json=body)
+    assert r.status_code == 400
+    assert r.json()["detail"] == detail
+
+
+def test_batch_bad_request_is_a_line_error(client):
+    requests = [{"liked_titles": []}, {"liked_titles": ["Матрица"], "top_n": 0}, {"liked_titles": ["Матрица"]}]
+    r = client.post("/recommend/batch", json={"requests": requests})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0] == {"index": 0, "error": "liked_titles is empty"}
+    assert lines[1] == {"index": 1, "error": "top_n must be positive"}
+    assert len(lines[2]["recommendations"]) == 10
+
+
+@pytest.fixture
+def busy_pool(monkeypatch):
+    """
+    Пул из одного потока, занятого задачей до конца теста; queue_size задаётся в тесте.
+    Ответы не берутся из кэша: у каждого теста свой top_n.
+    """
+    release = threading.Event()
+    started = threading.Event()
+    pools = []
+
+    def make(queue_size: int) -> ScoringPool:
+        pool = ScoringPool("thread", workers=1, queue_size=queue_size, timeout=10)
+        monkeypatch.setattr(app, "scoring_pool", pool)
+
+        def occupy():
+            asyncio.run(pool.run(lambda: started.set() or release.wait()))
+        thread = threading.Thread(target=occupy)
+        thread.start()
+        started.wait()
+        pools.append((pool, thread))
+        return pool
+
+    yield make
+    release.set()
+    for pool, thread in pools:
+        thread.join()
+        pool.shutdown()
+
+
+def test_overloaded(client, busy_pool):
+    pool = busy_pool(queue_size=0)
+    r = client.post("/recommend", json={"liked_titles": ["Матрица"], "top_n": 11})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
+    assert pool.stats()["rejected"] == 1
+
+
+def test_deadline_exceeded(client, busy_pool):
+    pool = busy_pool(queue_size=1)
+    r = client.post("/recommend", json={"liked_titles": ["Матрица"], "top_n": 12},
+                    headers={"X-Request-Timeout": "0.05"})
+    assert r.status_code == 504
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_process_pool_resolves_titles_off_the_event_loop(client, monkeypatch):
+    body = {"liked_titles": ["Матрца", "Интерстеллар"], "top_n": 13}
+    expected = client.post("/recommend", json=body).content
+
+    def off_loop(select):
+        def select_films(titles, state):
+            with pytest.raises(RuntimeError):
+                asyncio.get_running_loop()   # поиск названий не должен блокировать event loop
+            return select(titles, state)
+        return select_films
+
+    pool = ScoringPool("process", workers=1, timeout=60)
+    try:
+        monkeypatch.setattr(app, "scoring_pool", pool)
+        monkeypatch.setattr(app, "select_films_by_titles", off_loop(app.select_films_by_titles))
+        app.result_cache.clear()
+        r = client.post("/recommend", json=body)
+        assert r.status_code == 200
+        assert r.content == expected
+        assert client.post("/recommend", json={"liked_titles": ["нет такого"]}).status_code == 404
+    finally:
+        pool.shutdown()
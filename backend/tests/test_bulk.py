@@ -0,0 +1,53 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bulk_recommend import profile_top_n, read_profiles
+
+
+@pytest.mark.parametrize("value, top_n", [(None, 10), (3, 3), ("3", 3), (5.0, 5)])
+def test_profile_top_n(value, top_n):
+    assert profile_top_n(value, 10) == top_n
+
+
+@pytest.mark.parametrize("value, error", [
+    (0, "top_n must be positive"),
+    ("0", "top_n must be positive"),
+    (-2, "top_n must be positive"),
+    ("abc", "top_n must be an integer"),
+    (2.5, "top_n must be an integer"),
+    (True, "top_n must be an integer"),
+    ([3], "top_n must be an integer"),
+])
+def test_profile_top_n_rejects(value, error):
+    with pytest.raises(ValueError, match=error):
+        profile_top_n(value, 10)
+
+
+def test_read_profiles_keeps_top_n_for_checking(tmp_path):
+    path = tmp_path / "profiles.csv"
+    path.write_text("id,liked_titles,top_n\na,Матрица|Интерстеллар,0\nb,Матрица,\nc,Матрица, x \n", encoding="utf-8")
+    assert [(p["id"], p["liked_titles"], p["top_n"]) for p in read_profiles(str(path))] == [
+        ("a", ["Матрица", "Интерстеллар"], "0"), ("b", ["Матрица"], None), ("c", ["Матрица"], "x")]
+
+
+def test_bad_top_n_is_an_error_line(tmp_path):
+    profiles = [{"id": "zero", "liked_titles": ["Матрица"], "top_n": 0},
+                {"id": "negative", "liked_titles": ["Матрица"], "top_n": -1},
+                {"id": "text", "liked_titles": ["Матрица"], "top_n": "много"},
+                {"id": "ok", "liked_titles": ["Матрца"], "top_n": 3},
+                {"id": "default", "liked_titles": ["Матрица"]}]
+    path = tmp_path / "profiles.jsonl"
+    path.write_text("".join(json.dumps(p, ensure_ascii=False) + "\n" for p in profiles), encoding="utf-8")
+    out = tmp_path / "out"
+    # без артефакта модель обучается один раз во временную папку, как при настоящем запуске
+    subprocess.run([sys.executable, "bulk_recommend.py", str(path), str(out), "--workers", "1", "--top-n", "4"],
+                   check=True, capture_output=True, env=dict(os.environ, MODEL_DIR=str(tmp_path / "no-model")))
+    lines = {line["id"]: line for line in map(json.loads, (out / "part-000000.jsonl").read_text("utf-8").splitlines())}
+    assert lines["zero"]["error"] == lines["negative"]["error"] == "top_n must be positive"
+    assert lines["text"]["error"] == "top_n must be an integer"
+    assert len(lines["ok"]["recommendations"]) == 3
+    assert len(lines["default"]["recommendations"]) == 4
@@ -0,0 +1,82 @@
+import os
+import pickle
+import threading
+import time
+from multiprocessing.connection import Client
+
+import pytest
+
+from result_cache import ResultCache, SharedCacheClient, _handle, cache_key, serve
+
+
+def test_cache_key_ignores_order_case_and_repeats():
+    assert cache_key(["Матрица", "Интерстеллар"], 10) == cache_key([" интерстеллар", "матрица", "Матрица"], 10)
+    assert cache_key(["Матрица"], 10) != cache_key(["Матрица"], 5)
+    assert cache_key(["Матрица"], 10) != cache_key(["Матрица"], 10, ("title",))
+    assert cache_key(["Матрица"], 10) != cache_key(["Матрица"], 10, filters="year>=2000")
+
+
+def test_new_model_version_drops_old_answers():
+    cache = ResultCache(max_items=10)
+    cache.put("v1", "k", b"old")
+    assert cache.get("v1", "k") == b"old"
+    assert cache.get("v2", "k") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_lru_bytes_and_ttl_limits():
+    cache = ResultCache(max_items=2, max_bytes=10)
+    for key in "abc":
+        cache.put("v", key, b"x")
+    assert cache.get("v", "a") is None and cache.get("v", "c") == b"x"
+    cache.put("v", "big", b"x" * 11)   # больше max_bytes — не кэшируется
+    assert cache.get("v", "big") is None
+
+    cache = ResultCache(max_items=10, ttl=0.05)
+    cache.put("v", "k", b"x")
+    time.sleep(0.1)
+    assert cache.get("v", "k") is None
+
+
+def test_shared_cache_requires_authkey():
+    with pytest.raises(RuntimeError, match="RESULT_CACHE_AUTHKEY"):
+        SharedCacheClient("127.0.0.1:6390", authkey=b"")
+    with pytest.raises(RuntimeError, match="RESULT_CACHE_AUTHKEY"):
+        serve("127.0.0.1:6390", authkey=b"")
+
+
+@pytest.fixture
+def shared_url(tmp_path):
+    url = str(tmp_path / "cache.sock")
+    threading.Thread(target=serve, args=(url, b"secret"), daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(url):
+            return url
+        time.sleep(0.01)
+    raise RuntimeError("общий кэш не запустился")
+
+
+def test_workers_share_answers(shared_url):
+    first = ResultCache(max_items=10, shared=SharedCacheClient(shared_url, authkey=b"secret"))
+    second = ResultCache(max_items=10, shared=SharedCacheClient(shared_url, authkey=b"secret"))
+    first.put("v1", "k", b'{"recommendations":[]}')
+    assert second.get("v1", "k") == b'{"recommendations":[]}'
+    assert second.stats()["shared_hits"] == 1
+    assert second.get("v2", "k") is None   # версия модели — часть ключа общего кэша
+
+
+def test_wrong_key_is_a_miss(shared_url):
+    SharedCacheClient(shared_url, authkey=b"secret").put("k", b"value", 60)
+    stranger = SharedCacheClient(shared_url, authkey=b"wrong")
+    assert stranger.get("k") is None
+    assert stranger.stats()["errors"] == 1
+
+
+def test_protocol_does_not_unpickle(shared_url):
+    # сообщение-pickle — просто непонятные байты: промах, а не выполнение кода
+    store = ResultCache(max_items=10)
+    assert _handle(pickle.dumps(("put", "k", b"v")), store) == b"\x00"
+    assert _handle(b"p\x00", store) == b"\x00"
+    with Client(shared_url, authkey=b"secret") as conn:
+        conn.send_bytes(pickle.dumps(("get", "k")))
+        assert conn.recv_bytes() == b"\x00"
@@ -0,0 +1,26 @@
+import csv
+import os
+import shutil
+
+from conftest import CSV
+from data_loader import load_catalog
+
+
+def test_catalog_is_shared_until_the_file_changes(tmp_path):
+    path = str(tmp_path / "films.csv")
+    shutil.copy(CSV, path)
+    catalog = load_catalog(path)
+    assert len(catalog) == 250
+    assert load_catalog(path) is catalog            # v1, v2 и v3 делят одну копию
+    assert load_catalog(path, fresh=True) is not catalog
+
+    catalog = load_catalog(path)
+    with open(CSV, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows[:101])
+    os.utime(path, ns=(1, 1))   # время изменения могло не сдвинуться — отличается хотя бы размер
+    edited = load_catalog(path)
+    assert edited is not catalog
+    assert len(edited) == 100
+
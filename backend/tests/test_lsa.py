@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import recommend_v3
+from lsa import fit_lsa, load_lsa, lsa_dim, save_lsa
+
+
+@pytest.fixture
+def saved(tmp_path):
+    state = recommend_v3.current_state()
+    path = str(tmp_path / "lsa")
+    save_lsa(path, fit_lsa(state.tfidf_matrix, 16, state.version))
+    return path, state
+
+
+def test_load_checks_version_and_dim(saved):
+    path, state = saved
+    assert load_lsa(path, state.version, 16).dim == 16
+    assert load_lsa(path, state.version).dim == 16
+    assert load_lsa(path, state.version, 32) is None   # собраны с другим LSA_DIM
+    assert load_lsa(path, "другая модель", 16) is None
+
+
+def test_dim_is_capped_by_catalog():
+    assert lsa_dim((250, 5000), 256) == 249
+    assert lsa_dim((100_000, 5000), 256) == 256
+
+
+def test_build_state_refits_stale_dim(saved, monkeypatch):
+    path, state = saved
+    monkeypatch.setattr(recommend_v3, "DESC_SPACE", "lsa")
+    monkeypatch.setattr(recommend_v3, "LSA_DIR", path)
+
+    monkeypatch.setattr(recommend_v3, "LSA_DIM", 16)
+    loaded = recommend_v3.build_state(state.films, state.vectorizer, state.tfidf_matrix)
+    assert isinstance(loaded.embedding.vectors, np.memmap)   # взяты собранные
+    assert loaded.version == f"{state.version}-lsa16"
+
+    monkeypatch.setattr(recommend_v3, "LSA_DIM", 32)
+    refitted = recommend_v3.build_state(state.films, state.vectorizer, state.tfidf_matrix)
+    assert refitted.embedding.dim == 32
+    assert refitted.version == f"{state.version}-lsa32"
@@ -0,0 +1,71 @@
+import pytest
+
+import recommend_v3
+from benchmark import sample_profiles
+from recommend_v3 import (TOP_K, adapt_weights, compare_actors, compare_director, compare_ratings,
+                          compare_years, top_k_by_description)
+
+
+def reference(liked, state, k=TOP_K):
+    """Прежняя поштучная версия recommend_films: цикл по кандидатам и compare_* на каждый фильм."""
+    films = state.films
+    user_directors = [film.director for film in liked]
+    user_actors = [actor for film in liked for actor in film.actors]
+    user_ratings = [film.rating for film in liked]
+    user_years = [film.year for film in liked]
+    user_titles = {film.title for film in liked}
+    user_indices = [state.title_to_idx[t] for t in user_titles if t in state.title_to_idx]
+
+    base_w = {"desc": 0.40, "actors": 0.25, "director": 0.15, "year": 0.10, "rating": 0.10}
+    w = adapt_weights(base_w, user_years, user_ratings, user_actors)
+    top_idx, sims = top_k_by_description(user_indices, state.tfidf_matrix, k=k)
+
+    recommendations = []
+    for idx in top_idx:
+        film = films[idx]
+        if film.title in user_titles:
+            continue
+        score = (
+            w["director"] * compare_director(user_directors, film.director)
+            + w["actors"] * compare_actors(user_actors, film.actors)
+            + w["rating"] * compare_ratings(user_ratings, film.rating)
+            + w["year"] * compare_years(user_years, film.year)
+            + w["desc"] * float(sims[idx])
+        )
+        recommendations.append((film.title, round(float(score), 3)))
+    return sorted(recommendations, key=lambda x: x[1], reverse=True)
+
+
+def titles(result):
+    return [(film.title, score) for film, score in result]
+
+
+def profiles(n, seed=0):
+    state = recommend_v3.current_state()
+    return [[state.films[i] for i in profile] for profile in sample_profiles(len(state.films), n, seed)]
+
+
+def test_catalog_is_the_real_csv():
+    assert len(recommend_v3.current_state().films) == 250
+
+
+@pytest.mark.parametrize("k", [TOP_K, None])
+def test_recommend_films_matches_per_film_loop(k):
+    state = recommend_v3.current_state()
+    for liked in profiles(200 if k else 30):
+        assert titles(recommend_v3.recommend_films(liked, state.films, k=k, state=state)) == reference(liked, state, k)
+
+
+def test_top_n_is_prefix_of_full_ranking():
+    state = recommend_v3.current_state()
+    for liked in profiles(50, seed=1):
+        full = titles(recommend_v3.recommend_films(liked, state.films, state=state))
+        assert titles(recommend_v3.recommend_films(liked, state.films, top_n=10, state=state)) == full[:10]
+
+
+def test_batch_matches_single():
+    state = recommend_v3.current_state()
+    batch = profiles(100, seed=2)
+    results = recommend_v3.recommend_films_batch(batch, top_n=10, state=state)
+    for liked, result in zip(batch, results):
+        assert titles(result) == titles(recommend_v3.recommend_films(liked, state.films, top_n=10, state=state))
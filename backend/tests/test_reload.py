@@ -0,0 +1,110 @@
+import csv
+import shutil
+import weakref
+
+import pytest
+
+from conftest import ADMIN, CSV
+from model_store import save_model
+
+
+def write_rows(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_reload_picks_up_edited_csv(model, tmp_path):
+    path = str(tmp_path / "films.csv")
+    shutil.copy(CSV, path)
+    model.FILMS_CSV = path
+    old = model.reload()
+    assert len(old.films) == 250
+    assert not model.source_changed()
+
+    write_rows(path, read_rows(path)[:201])   # заголовок + 200 фильмов
+    assert model.source_changed()
+    new = model.reload()
+    assert new is model.current_state()
+    assert len(new.films) == 200
+    assert new.version != old.version
+    assert not model.source_changed()
+
+
+def test_failed_reload_is_retried(model, tmp_path):
+    path = str(tmp_path / "films.csv")
+    shutil.copy(CSV, path)
+    model.FILMS_CSV = path
+    old = model.reload()
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("movie,year\n")   # недописанный файл: нет нужных колонок
+    with pytest.raises(ValueError):
+        model.reload()
+    assert model.current_state() is old
+    assert model.source_changed()   # наблюдатель попробует ещё раз
+
+    write_rows(path, read_rows(CSV)[:101])
+    assert len(model.reload().films) == 100
+    assert not model.source_changed()
+
+
+def test_retired_model_is_released(model, tmp_path):
+    path = str(tmp_path / "films.csv")
+    write_rows(path, read_rows(CSV)[:241])
+    model.FILMS_CSV = path
+    old = model.reload()
+    model.recommend_films([old.films[0]], old.films, state=old)   # запрос, посчитанный по прежней модели
+    films, people = weakref.ref(old.films), weakref.ref(old.features.people)
+    del old
+
+    write_rows(path, read_rows(CSV)[:201])
+    assert len(model.reload().films) == 200
+    assert films() is None   # ни кэш каталогов, ни индекс людей не держат прежний каталог
+    assert people() is None
+
+
+def save_part(model, path, n):
+    """Артефакт из первых n фильмов текущего каталога (python model_store.py делает то же по CSV)."""
+    films = model.current_state().films.take(list(range(n)))
+    return save_model(path, films, *model.fit_tfidf(films.descriptions()))
+
+
+def test_reload_from_artifact(model, tmp_path):
+    path = str(tmp_path / "model")
+    version = save_part(model, path, 120)
+    model.MODEL_DIR = path
+    assert model.source_changed()
+
+    new = model.reload()
+    assert new is model.current_state()
+    assert len(new.films) == 120
+    assert new.version == version
+    assert not model.source_changed()
+    assert model.reload() is new   # та же версия — модель не подменяется
+
+    # рекомендации по артефакту — те же, что по модели, обученной в памяти
+    trained = model.build_state(new.films, *model.fit_tfidf(new.films.descriptions()))
+    for i in range(0, 120, 7):
+        assert ([(f.title, s) for f, s in model.recommend_films([new.films[i]], new.films, state=new)]
+                == [(f.title, s) for f, s in model.recommend_films([trained.films[i]], trained.films, state=trained)])
+
+
+def test_rebuilt_artifact_reloaded_via_admin(model, client, tmp_path):
+    path = str(tmp_path / "model")
+    save_part(model, path, 120)
+    model.MODEL_DIR = path
+    model.reload()
+
+    version = save_part(model, path, 90)   # пересборка поверх той же папки
+    assert model.source_changed()
+    assert client.post("/admin/reload", headers=ADMIN).json() == {"started": True}
+    model._reload_thread.join()
+    status = client.get("/admin/model", headers=ADMIN).json()
+    assert status["version"] == version
+    assert status["reload_error"] is None
+    assert len(model.current_state().films) == 90
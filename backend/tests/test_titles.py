@@ -0,0 +1,81 @@
+import pytest
+
+import app
+import recommend_v3
+from title_search import TitleIndex, canonical_titles, fold_title, normalize_title, resolve_titles
+
+
+@pytest.fixture(scope="module")
+def index():
+    return TitleIndex(recommend_v3.current_state().films)
+
+
+def title_of(row):
+    return recommend_v3.current_state().films.titles[row]
+
+
+def test_fold_title():
+    assert fold_title("Зелёная  миля!") == fold_title("зеленая миля") == "zelenaya milya"
+    assert fold_title("Матрица") == "matrica"
+
+
+@pytest.mark.parametrize("query, title", [
+    ("Матрица", "Матрица"),
+    ("  матрица ", "Матрица"),
+    ("Матрца", "Матрица"),
+    ("matrica", "Матрица"),
+    ("зелёная миля", "Зеленая миля"),
+    ("Интерстелар", "Интерстеллар"),
+])
+def test_resolve(index, query, title):
+    assert title_of(index.resolve(query, app.TITLE_MATCH_MIN)) == title
+
+
+def test_resolve_unknown(index):
+    assert index.resolve("совсем нет такого фильма", app.TITLE_MATCH_MIN) is None
+
+
+def test_resolve_skips_removed_rows(index):
+    state = recommend_v3.current_state()
+    alive = state.alive.copy()
+    alive[state.title_to_idx["Матрица"]] = False
+    assert index.resolve("Матрица", app.TITLE_MATCH_MIN, alive) is None
+
+
+def test_resolve_titles_dedupes_corrections(index):
+    state = recommend_v3.current_state()
+    exact = {normalize_title(title): i for title, i in state.title_to_idx.items()}
+    resolve = lambda title: index.resolve(title, app.TITLE_MATCH_MIN)
+    titles = canonical_titles(["Матрца", "Матрица", "Интерстеллар", "нет такого"])
+    rows, not_found = resolve_titles(titles, exact, resolve, state.films.titles)
+    assert [title_of(i) for i in rows] == ["Интерстеллар", "Матрица"]
+    assert not_found == ["нет такого"]
+
+    rows, not_found = resolve_titles(["Матрца"], exact, None, state.films.titles)
+    assert rows == [] and not_found == ["Матрца"]
+
+
+def test_recommend_corrects_titles(client):
+    exact = client.post("/recommend", json={"liked_titles": ["Матрица", "Интерстеллар"], "top_n": 5})
+    typos = client.post("/recommend", json={"liked_titles": ["интерстелар", "Матрца", "матрица"], "top_n": 5})
+    assert exact.status_code == typos.status_code == 200
+    assert typos.content == exact.content
+
+
+def test_recommend_exact_titles_only(client, monkeypatch):
+    monkeypatch.setattr(app, "TITLE_MATCH_MIN", 0.0)
+    r = client.post("/recommend", json={"liked_titles": ["Матрца"], "top_n": 5})
+    assert r.status_code == 404
+    assert "похожие: Матрица" in r.json()["detail"]
+
+
+def test_unknown_title_is_404(client):
+    r = client.post("/recommend", json={"liked_titles": ["совсем нет такого фильма"]})
+    assert r.status_code == 404
+    assert r.json()["detail"].startswith("Фильмы не найдены: совсем нет такого фильма")
+
+
+def test_search(client):
+    r = client.get("/films/search", params={"q": "зелёная мил", "limit": 3})
+    assert r.status_code == 200
+    assert r.json()[0]["title"] == "Зеленая миля"
@@ -0,0 +1,233 @@
+"""
+Поиск фильмов по названию: подсказки по началу названия и поиск с опечатками.
+
+Названия приводятся к одному виду (fold_title): нижний регистр, ё = е, кириллица
+транслитерируется латиницей, знаки препинания — пробелы. Так «Матрица», «матрица»
+и «matrica» — одно и то же, а «Interstellar» находит «Интерстеллар».
+
+TitleIndex строится один раз на каталог:
+- prefix — отсортированный массив приведённых названий, начало ищется через bisect
+  (диапазон строк с общим началом — два бинарных поиска)
+- fuzzy — индекс триграмм символов (триграмма -> номера строк по возрастанию):
+  похожесть — коэффициент Дайса по триграммам (2·общие / (свои + чужие)). Кандидаты
+  берутся только из самых редких триграмм запроса (строка, набравшая нужное число общих
+  триграмм, обязательно часто встречается и в них), частые списки лишь проверяются
+  бинарным поиском — длинные списки вроде « и » не склеиваются и не сортируются
+- resolve — название из запроса -> строка каталога: точное совпадение, совпадение после
+  приведения или единственный достаточно похожий фильм
+- resolve_titles — список названий из запроса -> строки каталога по тем же правилам,
+  что в /recommend (им же пользуется офлайн-расчёт bulk_recommend.py)
+"""
+
+import bisect
+import re
+from typing import Callable
+
+import numpy as np
+
+from films_model import FilmCatalog
+
+TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p", "р": "r",
+    "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "c", "ч": "ch", "ш": "sh", "щ": "sch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+_NOT_WORD = re.compile(r"[^\w\n]+")
+
+
+def fold_titles(titles: list[str]) -> list[str]:
+    """
+    Названия в виде для поиска: латиница без регистра, слова через один пробел.
+    Все названия обрабатываются одной строкой — replace по буквам на ней быстрее,
+    чем str.translate по каждому названию.
+    """
+    text = "\n".join(title.replace("\n", " ") for title in titles).lower()
+    for letter, latin in TRANSLIT.items():
+        text = text.replace(letter, latin)
+    text = _NOT_WORD.sub(" ", text.replace("_", " "))
+    return [line.strip(" ") for line in text.split("\n")]
+
+
+def fold_title(title: str) -> str:
+    return fold_titles([title])[0]
+
+
+def trigrams(folded: str) -> set[str]:
+    """Триграммы символов; пробелы по краям — чтобы начало и конец слова тоже учитывались."""
+    padded = f" {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """Индексы названий каталога для подсказок и поиска с опечатками."""
+
+    def __init__(self, films: FilmCatalog):
+        self.films = films
+        folded = fold_titles(films.titles)
+        n = len(folded)
+
+        order = sorted(range(n), key=folded.__getitem__)
+        self.keys = [folded[i] for i in order]
+        self.key_rows = np.asarray(order, dtype=np.int32)
+
+        # триграммы всех названий разом: символы нумеруются по алфавиту каталога,
+        # триграмма — число (a * K + b) * K + c, строки названий разделены переводом строки
+        chars = np.frombuffer("".join(f" {key} \n" for key in folded).encode("utf-32-le"), dtype=np.uint32)
+        counts = np.bincount(chars)
+        present = np.flatnonzero(counts)
+        self.alphabet = {chr(code): i for i, code in enumerate(present.tolist())}
+        lookup = np.zeros(len(counts), dtype=np.int64)
+        lookup[present] = np.arange(len(present))
+        k = len(present)
+        letters, newline = lookup[chars], chars == ord("\n")
+        codes = (letters[:-2] * k + letters[1:-1]) * k + letters[2:]
+        owner = np.cumsum(newline)[:-2] - newline[:-2]
+        valid = ~(newline[:-2] | newline[1:-1] | newline[2:])
+
+        # списки строк по триграммам одним массивом: строки триграммы gram_codes[j] —
+        # gram_rows[gram_starts[j]:gram_starts[j + 1]], по возрастанию, без повторов.
+        # Пара (триграмма, строка) — одно число, так что хватает одной сортировки
+        pairs = codes[valid] * max(n, 1) + owner[valid]
+        pairs.sort()
+        pairs = pairs[np.diff(pairs, prepend=-1) != 0]
+        codes, rows = np.divmod(pairs, max(n, 1))
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        self.gram_codes = codes[starts]
+        self.gram_starts = np.append(starts, len(codes))
+        self.gram_rows = rows.astype(np.int32)
+        self.gram_counts = np.bincount(rows, minlength=n).astype(np.int32)
+
+    def _postings(self, grams: set[str]) -> list[np.ndarray]:
+        """Списки строк для триграмм запроса (триграммы, которых нет в каталоге, пропускаются)."""
+        k = len(self.alphabet)
+        codes = []
+        for gram in grams:
+            letters = [self.alphabet.get(ch) for ch in gram]
+            if None not in letters:
+                codes.append((letters[0] * k + letters[1]) * k + letters[2])
+        codes = np.asarray(codes, dtype=np.int64)
+        pos = np.searchsorted(self.gram_codes, codes)
+        found = pos < len(self.gram_codes)
+        found[found] = self.gram_codes[pos[found]] == codes[found]
+        return [self.gram_rows[self.gram_starts[j]:self.gram_starts[j + 1]] for j in pos[found]]
+
+    def exact(self, query: str, alive: np.ndarray | None = None) -> list[int]:
+        """Строки, название которых после приведения совпадает с query."""
+        key = fold_title(query)
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_right(self.keys, key, lo)
+        return self._alive(self.key_rows[lo:hi], alive).tolist()
+
+    def prefix(self, query: str, limit: int, alive: np.ndarray | None = None) -> list[int]:
+        """Строки, чьё название начинается с query; больше limit — берутся с лучшим рейтингом."""
+        key = fold_title(query)
+        if not key:
+            return []
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + "\U0010ffff", lo)
+        rows = self._alive(self.key_rows[lo:hi], alive)
+        if len(rows) > limit:
+            ratings = -np.asarray(self.films.ratings)[rows]
+            top = np.argpartition(ratings, limit - 1)[:limit]
+            rows = rows[top[np.argsort(ratings[top], kind="stable")]]
+        else:
+            rows = rows[np.argsort(-np.asarray(self.films.ratings)[rows], kind="stable")]
+        return rows.tolist()
+
+    def fuzzy(self, query: str, limit: int, min_score: float,
+              alive: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """Строки с похожестью названия не ниже min_score (Дайс по триграммам, 0..1), лучшие первыми."""
+        grams = trigrams(fold_title(query))
+        lists = self._postings(grams)
+        if not lists or min_score <= 0:
+            return []
+        m = len(grams)
+        # похожесть 2 * shared / (m + g) >= min_score при g >= shared требует
+        # shared >= min_score * m / (2 - min_score)
+        need = max(1, int(np.ceil(min_score * m / (2 - min_score) - 1e-9)))
+        if need > len(lists):
+            return []
+        # у такой строки из (len(lists) - need + hits) самых редких списков найдётся хотя бы
+        # hits: кандидаты — строки, набравшие столько в редких списках, частые списки
+        # лишь проверяются бинарным поиском
+        hits = (need + 1) // 2
+        lists.sort(key=len)
+        rare = len(lists) - need + hits
+        rows = np.concatenate(lists[:rare])
+        rows.sort()
+        starts = np.flatnonzero(np.diff(rows, prepend=-1))
+        shared = np.diff(starts, append=len(rows))
+        keep = shared >= hits
+        candidates, shared = rows[starts[keep]], shared[keep]
+        if alive is not None:
+            keep = alive[candidates]
+            candidates, shared = candidates[keep], shared[keep]
+        for rows in lists[rare:]:
+            pos = np.searchsorted(rows, candidates)
+            pos[pos == len(rows)] = 0
+            shared += rows[pos] == candidates
+
+        scores = 2 * shared / (m + self.gram_counts[candidates])
+        keep = np.flatnonzero(scores >= min_score)
+        keep = keep[np.lexsort((candidates[keep], -scores[keep]))][:limit]
+        return [(int(candidates[i]), float(scores[i])) for i in keep]
+
+    def search(self, query: str, limit: int, min_score: float, alive: np.ndarray | None = None) -> list[int]:
+        """Подсказки: сначала названия, начинающиеся с query, затем похожие."""
+        rows = self.prefix(query, limit, alive)
+        if len(rows) < limit:
+            seen = set(rows)
+            rows += [row for row, _ in self.fuzzy(query, limit, min_score, alive) if row not in seen][:limit - len(rows)]
+        return rows
+
+    def resolve(self, title: str, min_score: float, alive: np.ndarray | None = None) -> int | None:
+        """
+        Строка каталога для названия из запроса: совпадение после приведения или
+        единственный лучший похожий фильм; неоднозначно или ничего похожего — None.
+        """
+        rows = self.exact(title, alive)
+        if len(rows) == 1:
+            return rows[0]
+        if rows:
+            return None
+        matches = self.fuzzy(title, 2, min_score, alive)
+        if not matches or (len(matches) > 1 and matches[0][1] == matches[1][1]):
+            return None
+        return matches[0][0]
+
+    @staticmethod
+    def _alive(rows: np.ndarray, alive: np.ndarray | None) -> np.ndarray:
+        return rows[alive[rows]] if alive is not None else rows
+
+
+def normalize_title(title: str) -> str:
+    return title.strip().lower()
+
+
+def canonical_titles(titles: list[str]) -> list[str]:
+    """Названия без повторов и в одном порядке — чтобы ответ зависел только от набора."""
+    return [title for _, title in sorted({normalize_title(title): title for title in titles}.items())]
+
+
+def resolve_titles(titles: list[str], exact: dict[str, int], resolve: Callable[[str], int | None] | None,
+                   catalog_titles: list[str]) -> tuple[list[int], list[str]]:
+    """
+    Строки каталога для названий из запроса и названия, которые не нашлись.
+    exact — normalize_title(название) -> строка; не нашлось как есть — resolve(название)
+    (обычно TitleIndex.resolve; None — только точные названия). Исправленные названия
+    могли совпасть с другими — тогда строки без повторов и в том же порядке, что у canonical_titles.
+    """
+    rows, not_found, corrected = [], [], False
+    for title in titles:
+        idx = exact.get(normalize_title(title))
+        if idx is None and resolve is not None:
+            idx = resolve(title)
+            corrected = corrected or idx is not None
+        if idx is None:
+            not_found.append(title)
+        else:
+            rows.append(idx)
+    if corrected:
+        rows = sorted(set(rows), key=lambda i: normalize_title(catalog_titles[i]))
+    return rows, not_found
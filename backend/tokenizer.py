@@ -0,0 +1,90 @@
+"""
+Разбор описаний на слова — общий для всех версий рекомендательной системы.
+
+- keywords — слова для v1 и v2: нижний регистр, без знаков из STOP_SYMBOLS
+  (знак просто удаляется: «что-то» -> «чтото»), деление по пробелам, без BOW_STOP_WORDS
+- tfidf_tokens — слова для TfidfVectorizer в v3: как токенизатор sklearn по умолчанию
+  (слова из двух и больше букв/цифр, нижний регистр), без RUSSIAN_STOP_WORDS
+
+Правила у версий разные (так считались их баллы, менять их — менять рекомендации),
+а реализация одна: знаки удаляются одним заранее скомпилированным регулярным выражением
+вместо replace на каждый знак (str.translate на кириллице в разы медленнее), слова v3 тоже
+находит одно скомпилированное выражение, стоп-слова лежат во frozenset, а не в списке.
+
+TOKEN_CACHE_SIZE > 0 включает кэш разбора (LRU по тексту описания): при переобучении
+и повторных загрузках одни и те же описания не разбираются заново. По умолчанию выключен —
+на большом каталоге кэш на все описания занимает много памяти.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "0"))   # описаний; 0 — без кэша
+
+# v1, v2
+BOW_STOP_WORDS = frozenset([
+    "и", "в", "во", "не", "что", "он", "на", "я", "с", "со", "как", "а",
+    "то", "все", "она", "так", "его", "но", "да", "ты", "к", "у", "же",
+    "вы", "за", "бы", "по", "только", "ее", "мне", "было", "вот",
+    "от", "меня", "еще", "нет", "о", "из", "ему", "теперь", "когда",
+    "даже", "ну", "вдруг", "ли", "если", "уже", "или", "ни", "быть",
+    "был", "него", "до", "вас", "нибудь", "опять", "уж", "вам", "ведь",
+    "там", "потом", "себя", "ничего", "ей", "может", "они", "тут",
+    "где", "есть", "надо", "ней", "для", "мы", "тебя", "их", "чем",
+    "была", "сам", "чтоб", "без", "будто", "чего", "раз", "тоже",
+    "себе", "под", "будет", "ж", "тогда", "кто", "этот",
+])
+STOP_SYMBOLS = ".,!?:;-—()[]{}\"'«»…/\\|@#$%^&*_+=<>~`"
+
+# v3
+RUSSIAN_STOP_WORDS = frozenset([
+    "и","в","во","не","что","он","на","я","с","со","как","а","то","все","она","так",
+    "его","но","да","ты","к","у","же","вы","за","бы","по","только","ее","мне","было",
+    "вот","от","меня","еще","нет","о","из","ему","теперь","когда","даже","ну","вдруг",
+    "ли","если","уже","или","ни","быть","был","него","до","вас","нибудь","опять","уж",
+    "вам","ведь","там","потом","себя","ничего","ей","может","они","тут","где","есть",
+    "надо","ней","для","мы","тебя","их","чем","была","сам","чтоб","без","будто","чего",
+    "раз","тоже","себе","под","будет","ж","тогда","кто","этот","того","потому","этого",
+    "какой","совсем","ним","здесь","этом","один","почти","мой","тем","чтобы","нее",
+    "кажется","сейчас","были","куда","зачем","всех","никогда","можно","при","наконец",
+    "два","об","другой","хоть","после","над","больше","тот","через","эти","нас","про",
+    "них","какая","много","разве","три","эту","моя","впрочем","хорошо","свою","этой",
+    "перед","иногда","лучше","чуть","том","нельзя","такой","им","более","всегда",
+    "конечно","всю","между",
+])
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")   # token_pattern TfidfVectorizer по умолчанию
+ANALYZER_NAME = "tokenizer.tfidf_tokens"       # так анализатор записан в артефакте модели
+
+_DROP_SYMBOLS = re.compile("[" + re.escape(STOP_SYMBOLS) + "]")
+
+
+def _keywords(text: str) -> tuple[str, ...]:
+    return tuple(word for word in _DROP_SYMBOLS.sub("", text.lower()).split() if word not in BOW_STOP_WORDS)
+
+
+def _tfidf_tokens(text: str) -> tuple[str, ...]:
+    return tuple(word for word in TOKEN_PATTERN.findall(text.lower()) if word not in RUSSIAN_STOP_WORDS)
+
+
+if TOKEN_CACHE_SIZE > 0:
+    _keywords = lru_cache(maxsize=TOKEN_CACHE_SIZE)(_keywords)
+    _tfidf_tokens = lru_cache(maxsize=TOKEN_CACHE_SIZE)(_tfidf_tokens)
+
+
+def keywords(text: str) -> tuple[str, ...]:
+    """Слова описания для v1 и v2 (с повторами, в порядке текста)."""
+    return _keywords(text)
+
+
+def tfidf_tokens(text: str) -> tuple[str, ...]:
+    """Слова описания для TF-IDF в v3 (анализатор TfidfVectorizer)."""
+    return _tfidf_tokens(text)
+
+
+def make_vectorizer(**params) -> TfidfVectorizer:
+    """TfidfVectorizer для v3 с анализатором tfidf_tokens; params — остальные параметры (vocabulary и т.п.)."""
+    return TfidfVectorizer(analyzer=tfidf_tokens, **params)
+
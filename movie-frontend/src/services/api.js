@@ -41,6 +41,18 @@ export async function getRandomFilms(limit = 30) {
   }
 }
 
+// Поиск фильмов по названию (подсказки при вводе, опечатки допускаются)
+export async function searchFilms(query, limit = 10) {
+  if (!query?.trim()) return [];
+  try {
+    const res = await http.get("/films/search", { params: { q: query, limit } });
+    return Array.isArray(res.data) ? res.data : [];
+  } catch (e) {
+    console.error("Ошибка при поиске фильмов:", e);
+    return [];
+  }
+}
+
 // Рекомендации на основе выбранных фильмов
 export async function getRecommendations(likedTitles, topN = 10) {
   try {